@@ -1,15 +1,24 @@
 import gradio as gr
-import google.genai as genai
-import tempfile
 import re
 
-from gtts import gTTS
-from config.config import MODEL_NAME, client
-from services.crop_service import retrieve_crop_info
-from services.fertilizer_service import retrieve_fertilizer_info
-from services.crop_rotation_service import retrieve_crop_rotation_info
-from services.location_service import get_location_from_ip
-from services.weather_service import get_weather_by_location
+from config.config import MODEL_NAME, CROP_TRANSLATE_FALLBACK, get_client
+from services.catalog import get_snapshot, start_catalog_listener
+from services.context_service import gather_context
+from services.crop_context import format_rotations
+from services.crop_matcher import find_crops
+from services.intent_router import route, is_confident, answer_from_data
+from services.conversation_service import split_history, record_prompt, record_response
+from services import answer_cache
+from services.llm_limiter import LLMOverloaded, llm_slot
+from services.location_service import client_ip_from_request
+from services.session_store import cap_messages
+from services.tts_service import text_to_speech
+from utils.metrics import span
+
+
+# ---------------- Crop Catalog ----------------
+get_snapshot()
+start_catalog_listener()
 
 
 # ---------------- Gemini Model ----------------
@@ -23,7 +32,8 @@ LANG_TEXT = {
         "question_placeholder": "How should I grow rice?",
         "language_label": "Language",
         "submit": "Submit",
-        "missing_crop": "Please mention the crop name so I can help you."
+        "missing_crop": "Please mention the crop name so I can help you.",
+        "busy": "KrishiSahay is busy right now. Please ask again in a few seconds."
     },
     "Hindi": {
         "title": "कृषि सहाय 🌾",
@@ -31,20 +41,12 @@ LANG_TEXT = {
         "question_placeholder": "धान की खेती कैसे करें?",
         "language_label": "भाषा",
         "submit": "जमा करें",
-        "missing_crop": "कृपया फसल का नाम बताएं ताकि मैं आपकी मदद कर सकूं।"
+        "missing_crop": "कृपया फसल का नाम बताएं ताकि मैं आपकी मदद कर सकूं।",
+        "busy": "कृषि सहाय अभी व्यस्त है। कृपया कुछ सेकंड बाद फिर से पूछें।"
     }
 }
 
 
-# ---------------- Text → Speech ----------------
-def text_to_speech(text, language):
-    lang_code = "hi" if language == "Hindi" else "en"
-    tts = gTTS(text=text, lang=lang_code)
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
-    tts.save(tmp.name)
-    return tmp.name
-
-
 # ---------------- Clean text for audio ----------------
 def clean_text_for_audio(text):
     # Replace ranges like "60-75" with "60 to 75"
@@ -61,26 +63,7 @@ def clean_text_for_audio(text):
     return text.strip()
 
 
-# ---------------- Intent Detection ----------------
-def is_weather_question(text):
-    keywords = [
-        "weather", "rain", "rainfall", "temperature", "climate",
-        "forecast", "tomorrow", "next",
-        "मौसम", "बारिश", "तापमान", "जलवायु", "कल"
-    ]
-    return any(k in text.lower() for k in keywords)
-
-
-def is_planting_question(text):
-    keywords = [
-        "can i plant", "can i grow", "should i sow",
-        "planting", "sowing",
-        "क्या मैं बो सकता", "क्या उगाना ठीक है", "बुवाई"
-    ]
-    return any(k in text.lower() for k in keywords)
-
-
-# ---------------- Hindi → English (crop detection only) ----------------
+# ---------------- Hindi → English (opt-in crop detection fallback) ----------------
 def translate_to_english(text):
     prompt = f"""
 Translate the following farmer question to simple English.
@@ -89,33 +72,43 @@ Only return the translated text.
 TEXT:
 {text}
 """
-    response = client.models.generate_content(model=MODEL_NAME, contents=prompt)
+    with llm_slot():
+        response = get_client().models.generate_content(model=MODEL_NAME, contents=prompt)
     return response.text.strip().lower()
 
 
 # ---------------- Crop Detection ----------------
 def detect_crop_from_text(text, chat_history, language):
+    # Only the recent turns within the history token budget are scanned
     combined_text = text
-    for msg in reversed(chat_history):
+    for msg in reversed(split_history(chat_history)[1]):
         if msg["role"] == "user":
             combined_text += " " + msg["content"]
 
-    if language == "Hindi":
-        combined_text = translate_to_english(combined_text)
-
-    combined_text = combined_text.lower()
+    # Local lexicon lookup (English, Hindi and romanized names), no model call
+    crops = find_crops(combined_text)
+    if crops:
+        return crops[0]
+
+    # Translating the question with Gemini is an explicit opt-in
+    if language == "Hindi" and CROP_TRANSLATE_FALLBACK:
+        try:
+            crops = find_crops(translate_to_english(text))
+        except LLMOverloaded:
+            crops = []
+        if crops:
+            return crops[0]
+    return None
 
-    crops = [
-        "rice", "wheat", "maize", "barley", "sorghum",
-        "pearl millet", "potato", "banana", "cotton",
-        "sugarcane", "groundnut", "mustard",
-        "soybean", "tomato", "onion"
-    ]
 
-    for crop in crops:
-        if crop in combined_text:
-            return crop
-    return None
+# ---------------- Chat State ----------------
+def remember_turn(chat_history, question, answer):
+    """Append a turn to the Gradio chat state, capped like server sessions"""
+    messages, _ = cap_messages(chat_history + [
+        {"role": "user", "content": question},
+        {"role": "assistant", "content": answer}
+    ])
+    return messages
 
 
 # ---------------- Cards ----------------
@@ -140,7 +133,13 @@ def format_rotation_card(text):
 
 
 # ---------------- Core Logic ----------------
-def krishi_sahay(question, language, chat_history):
+def krishi_sahay(question, language, chat_history, request: gr.Request = None):
+    client_ip = None
+    if request is not None:
+        client_ip = client_ip_from_request(
+            request.headers.get("x-forwarded-for"),
+            request.client.host if request.client else None
+        )
 
     # Initial loading
     yield (
@@ -152,22 +151,32 @@ def krishi_sahay(question, language, chat_history):
         gr.update(visible=False)
     )
 
-    planting_intent = is_planting_question(question)
+    intent = route(question)
 
     # -------- WEATHER ONLY --------
-    if not planting_intent and is_weather_question(question):
-        location = get_location_from_ip()
-        weather_text, weather_data = None, None
-
-        if location:
-            weather_text, weather_data = get_weather_by_location(location, language)
+    # Weather asked about a crop ("can I sow wheat if it rains?") goes to the crop flow
+    if is_confident(intent, "weather") and not find_crops(question):
+        context = gather_context(None, language, client_ip, stages=("weather",))
+        weather_text, weather_data = context.get("weather", (None, None))
 
         response_text = weather_text or "Weather data not available."
 
-        chat_history += [
-            {"role": "user", "content": question},
-            {"role": "assistant", "content": response_text}
-        ]
+        chat_history = remember_turn(chat_history, question, response_text)
+
+        weather_card = (
+            gr.update(value=format_weather_card(weather_data), visible=True)
+            if weather_data else gr.update(visible=False)
+        )
+
+        # Show the text right away; the audio follows once synthesized
+        yield (
+            gr.update(visible=False),
+            chat_history,
+            None,
+            chat_history,
+            weather_card,
+            gr.update(visible=False)
+        )
 
         audio_path = text_to_speech(clean_text_for_audio(response_text), language)
 
@@ -176,8 +185,7 @@ def krishi_sahay(question, language, chat_history):
             chat_history,
             audio_path,
             chat_history,
-            gr.update(value=format_weather_card(weather_data), visible=True)
-            if weather_data else gr.update(visible=False),
+            weather_card,
             gr.update(visible=False)
         )
         return
@@ -186,10 +194,7 @@ def krishi_sahay(question, language, chat_history):
     crop_name = detect_crop_from_text(question, chat_history, language)
 
     if not crop_name:
-        chat_history += [
-            {"role": "user", "content": question},
-            {"role": "assistant", "content": LANG_TEXT[language]["missing_crop"]}
-        ]
+        chat_history = remember_turn(chat_history, question, LANG_TEXT[language]["missing_crop"])
 
         yield (
             gr.update(visible=False),
@@ -201,14 +206,38 @@ def krishi_sahay(question, language, chat_history):
         )
         return
 
-    crop_context = retrieve_crop_info(crop_name, language)
-    fertilizer_context = retrieve_fertilizer_info(crop_name)
-    rotation_context = retrieve_crop_rotation_info(crop_name, language)
+    # -------- PRICE / FERTILIZER / ROTATION FROM DATA --------
+    data_answer, _ = answer_from_data(intent, crop_name, language, client_ip)
+    if data_answer:
+        chat_history = remember_turn(chat_history, question, data_answer)
+
+        yield (
+            gr.update(visible=False),
+            chat_history,
+            None,
+            chat_history,
+            gr.update(visible=False),
+            gr.update(visible=False)
+        )
 
-    location = get_location_from_ip()
-    weather_text, weather_data = None, None
-    if location:
-        weather_text, weather_data = get_weather_by_location(location, language)
+        audio_path = text_to_speech(clean_text_for_audio(data_answer), language)
+
+        yield (
+            gr.update(visible=False),
+            chat_history,
+            audio_path,
+            chat_history,
+            gr.update(visible=False),
+            gr.update(visible=False)
+        )
+        return
+
+    # One CropContext from the catalog snapshot; location and weather are fetched in parallel
+    context = gather_context(crop_name, language, client_ip)
+    crop = context.get("crop")
+    crop_context = crop.for_model() if crop else "Crop data not available."
+    rotation_context = format_rotations(crop.rotations, language) if crop and crop.rotations else None
+    weather_text, weather_data = context.get("weather", (None, None))
 
     language_instruction = (
         "Respond in simple Hindi using farmer-friendly language."
@@ -231,9 +260,6 @@ RULES:
 CROP DATA:
 {crop_context}
 
-FERTILIZER DATA:
-{fertilizer_context}
-
 WEATHER CONDITIONS:
 {weather_text if weather_text else "Weather data not available."}
 
@@ -241,13 +267,49 @@ QUESTION:
 {question}
 """
 
-    response = client.models.generate_content(model=MODEL_NAME, contents=prompt)
-    response_text = response.text.strip()
+    # The prompt carries no chat history, so repeated questions can reuse answers
+    def generate():
+        record_prompt(prompt)
+        with llm_slot(), span("llm"):
+            response = get_client().models.generate_content(model=MODEL_NAME, contents=prompt)
+        record_response(response.text)
+        return response.text.strip()
+
+    answer_key = answer_cache.make_key(question, crop_name, language, weather_data)
+    try:
+        response_text = answer_cache.get_or_generate(answer_key, generate)
+    except LLMOverloaded:
+        chat_history = remember_turn(chat_history, question, LANG_TEXT[language]["busy"])
+        yield (
+            gr.update(visible=False),
+            chat_history,
+            None,
+            chat_history,
+            gr.update(visible=False),
+            gr.update(visible=False)
+        )
+        return
+
+    chat_history = remember_turn(chat_history, question, response_text)
 
-    chat_history += [
-        {"role": "user", "content": question},
-        {"role": "assistant", "content": response_text}
-    ]
+    weather_card = (
+        gr.update(value=format_weather_card(weather_data), visible=True)
+        if weather_data else gr.update(visible=False)
+    )
+    rotation_card = (
+        gr.update(value=format_rotation_card(rotation_context), visible=True)
+        if rotation_context else gr.update(visible=False)
+    )
+
+    # Show the text right away; the audio follows once synthesized
+    yield (
+        gr.update(visible=False),
+        chat_history,
+        None,
+        chat_history,
+        weather_card,
+        rotation_card
+    )
 
     audio_path = text_to_speech(clean_text_for_audio(response_text), language)
 
@@ -256,10 +318,8 @@ QUESTION:
         chat_history,
         audio_path,
         chat_history,
-        gr.update(value=format_weather_card(weather_data), visible=True)
-        if weather_data else gr.update(visible=False),
-        gr.update(value=format_rotation_card(rotation_context), visible=True)
-        if rotation_context else gr.update(visible=False)
+        weather_card,
+        rotation_card
     )
 
 
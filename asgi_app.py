@@ -0,0 +1,364 @@
+"""ASGI entry point serving web_app's pages and API on asyncio.
+
+Routes, request and response bodies match web_app.py (both front ends
+build on services.ask_service), but outbound I/O is awaited instead of
+holding a thread per request: Gemini through the client's aio interface,
+weather and IP geolocation through one shared httpx.AsyncClient, and
+session-store reads and writes (SQLite/Postgres) and the answer cache's
+SQLite tier in worker threads. The catalog is an in-memory snapshot,
+loaded at startup, so crop, fertilizer and rotation lookups do not block.
+Run it under uvicorn:
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000 --workers 2 --limit-concurrency 500
+
+or `python asgi_app.py`, which uses ASGI_MAX_CONCURRENCY.
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+from jinja2 import Environment, FileSystemLoader
+from starlette.applications import Starlette
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware import Middleware
+from starlette.responses import FileResponse, HTMLResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Match, Mount, Route
+from starlette.staticfiles import StaticFiles
+
+from config.config import ASGI_MAX_CONCURRENCY, MODEL_NAME, TTS_SPOOL_DIR, get_client
+from services import answer_cache
+from services.context_service import gather_context_async
+from services.conversation_service import record_prompt, record_response
+from services.intent_router import answer_from_data_async, route
+from services.llm_limiter import LLMOverloaded, llm_slot_async
+from services.location_service import client_ip_from_request
+from services.session_store import append_turn
+from services.tts_service import get_audio_status, is_audio_filename
+from utils import metrics
+from utils.aio import close_http_client
+from utils.metrics import span
+from services.ask_service import (
+    REQUEST_ID, answer_batch, audio_fields, batch_error, compose_prompt, detect_crop, ndjson_line,
+    resolve_session, sse_event,
+)
+from services.catalog import get_snapshot, start_catalog_listener
+from services.crop_matcher import get_crop_matcher
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+AUDIO_POLL_SECONDS = 0.25
+
+# index.html uses Flask's url_for('static', filename=...)
+templates = Environment(loader=FileSystemLoader(os.path.join(BASE_DIR, 'templates')), autoescape=True)
+templates.globals['url_for'] = lambda endpoint, filename: f'/static/{filename}'
+
+
+class RequestMetrics:
+    """ASGI middleware doing what web_app's before/after_request hooks do:
+    request IDs, the in-flight gauge, request latency and the request log"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        incoming = Headers(scope=scope).get('x-request-id', '')
+        request_id = metrics.start_request(incoming if REQUEST_ID.match(incoming) else None)
+        started = time.perf_counter()
+        endpoint = endpoint_name(scope)
+        spans = metrics.current_spans()
+        status = 500
+        metrics.REQUESTS_IN_FLIGHT.inc(endpoint=endpoint)
+
+        async def send_with_request_id(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                MutableHeaders(scope=message).append('X-Request-ID', request_id)
+            await send(message)
+
+        try:
+            # Returns once the whole body, including a stream, has been sent
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.REQUESTS_IN_FLIGHT.dec(endpoint=endpoint)
+            metrics.REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, status=status)
+            if endpoint not in ('static', 'prometheus_metrics'):
+                metrics.log_event(
+                    'request',
+                    method=scope['method'],
+                    path=scope['path'],
+                    status=status,
+                    duration_ms=round(elapsed * 1000, 1),
+                    spans=metrics.request_spans(spans),
+                )
+
+
+def endpoint_name(scope):
+    """Route name for a request (the same names as web_app's Flask endpoints)"""
+    for candidate in routes:
+        match, _ = candidate.matches(scope)
+        if match == Match.FULL:
+            return candidate.name
+    return 'unknown'
+
+
+async def direct_answer(question, language, crop_found, client_ip):
+    """Template answer for confident structured questions, or None"""
+    answer, _ = await answer_from_data_async(route(question), crop_found, language, client_ip)
+    return answer
+
+
+async def build_prompt(question, language, session, crop_found, client_ip):
+    """ask_service.build_prompt with the context gathered on the event loop"""
+    context = await gather_context_async(crop_found, language, client_ip)
+    return compose_prompt(question, language, session, crop_found, context)
+
+
+async def stream_answer(prompt):
+    """ask_service.stream_answer on the event loop"""
+    record_prompt(prompt)
+    parts = []
+    started = time.perf_counter()
+    with span('llm'):
+        async for chunk in await get_client().aio.models.generate_content_stream(model=MODEL_NAME, contents=prompt):
+            if chunk.text:
+                if not parts:
+                    metrics.STAGE_SECONDS.observe(time.perf_counter() - started, stage='llm_first_token')
+                parts.append(chunk.text)
+                yield chunk.text
+    record_response(''.join(parts))
+
+
+async def admitted_stream(prompt):
+    """stream_answer holding an admission slot until the stream ends"""
+    async with llm_slot_async():
+        async for chunk in stream_answer(prompt):
+            yield chunk
+
+
+async def started_stream(chunks):
+    """ask_service.started_stream for async iterators"""
+    chunks = aiter(chunks)
+    try:
+        first = await anext(chunks)
+    except StopAsyncIteration:
+        first = None
+
+    async def replay():
+        if first is not None:
+            yield first
+        async for chunk in chunks:
+            yield chunk
+
+    return replay()
+
+
+async def read_question(request):
+    """(question, language, session_id, session, client_ip) for an ask request"""
+    data = await request.json()
+    question = data.get('question', '').strip()
+    language = data.get('language', 'English')
+    if not question:
+        return question, language, None, None, None
+    session_id, session = await asyncio.to_thread(resolve_session, data, question)
+    client_ip = client_ip_from_request(
+        request.headers.get('X-Forwarded-For'), request.client.host if request.client else None
+    )
+    return question, language, session_id, session, client_ip
+
+
+def overloaded_response(error):
+    """503 telling the client when to retry a request shed by admission control"""
+    return JSONResponse(
+        {'error': 'The assistant is busy right now. Please try again shortly.', 'retry_after': error.retry_after},
+        status_code=503,
+        headers={'Retry-After': str(error.retry_after)},
+    )
+
+
+async def index(request):
+    """Serve the main page"""
+    return HTMLResponse(templates.get_template('index.html').render())
+
+
+async def ask_question(request):
+    """API endpoint to process farmer questions"""
+    try:
+        question, language, session_id, session, client_ip = await read_question(request)
+        if not question:
+            return JSONResponse({'error': 'Question cannot be empty'}, status_code=400)
+
+        # Structured questions are answered from service data; the rest go to Gemini
+        crop_found = detect_crop(question)
+        answer = await direct_answer(question, language, crop_found, client_ip)
+        if answer is None:
+            prompt, answer_key = await build_prompt(question, language, session, crop_found, client_ip)
+
+            async def generate():
+                record_prompt(prompt)
+                async with llm_slot_async():
+                    with span('llm'):
+                        response = await get_client().aio.models.generate_content(model=MODEL_NAME, contents=prompt)
+                record_response(response.text)
+                return response.text
+
+            if answer_key:
+                answer = await answer_cache.get_or_generate_async(answer_key, generate)
+            else:
+                answer = await generate()
+
+        await asyncio.to_thread(append_turn, session_id, session, question, answer)
+        return JSONResponse({'answer': answer, 'session_id': session_id, **audio_fields(answer, language)})
+
+    except LLMOverloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return JSONResponse({'error': f'Error processing request: {str(e)}'}, status_code=500)
+
+
+async def ask_question_stream(request):
+    """Stream the answer as Server-Sent Events while Gemini generates it
+    (the same events as web_app's /api/ask/stream)"""
+    try:
+        question, language, session_id, session, client_ip = await read_question(request)
+        if not question:
+            return JSONResponse({'error': 'Question cannot be empty'}, status_code=400)
+
+        crop_found = detect_crop(question)
+        cached = await direct_answer(question, language, crop_found, client_ip)
+        prompt, answer_key = (None, None)
+        if cached is None:
+            prompt, answer_key = await build_prompt(question, language, session, crop_found, client_ip)
+            if answer_key:
+                cached = await answer_cache.lookup_async(answer_key)
+
+        chunks = None
+        if cached is None:
+            # Only the request that starts a model call waits for admission;
+            # joining an identical question already streaming needs no slot
+            if answer_key:
+                chunks = answer_cache.stream_or_join_async(answer_key, lambda: admitted_stream(prompt))
+            else:
+                chunks = admitted_stream(prompt)
+            chunks = await started_stream(chunks)
+
+    except LLMOverloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return JSONResponse({'error': f'Error processing request: {str(e)}'}, status_code=500)
+
+    async def generate():
+        parts = []
+        try:
+            if cached is not None:
+                await asyncio.to_thread(append_turn, session_id, session, question, cached)
+                yield sse_event('token', {'text': cached})
+                yield sse_event('done', {'answer': cached, 'session_id': session_id, **audio_fields(cached, language)})
+                return
+
+            async for text in chunks:
+                parts.append(text)
+                yield sse_event('token', {'text': text})
+            answer = ''.join(parts)
+            await asyncio.to_thread(append_turn, session_id, session, question, answer)
+            yield sse_event('done', {'answer': answer, 'session_id': session_id, **audio_fields(answer, language)})
+        except Exception as e:
+            yield sse_event('error', {'error': f'Error processing request: {str(e)}'})
+
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+async def ask_batch(request):
+    """Answer many questions at once (SMS/IVR gateways) as NDJSON; see web_app.ask_batch.
+    The batch runs on its own worker threads, which the stream is read from."""
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    error = batch_error(data)
+    if error:
+        return JSONResponse({'error': error[0]}, status_code=error[1])
+    return StreamingResponse(
+        (ndjson_line(result) for result in answer_batch(data['questions'])),
+        media_type='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+async def prometheus_metrics(request):
+    """Prometheus scrape endpoint"""
+    return Response(metrics.render(), media_type='text/plain; version=0.0.4')
+
+
+async def audio_status(request):
+    """Report whether an answer's audio is ready; ?wait=N long-polls up to N
+    seconds without holding a thread"""
+    job_id = request.path_params['job_id']
+    try:
+        wait = min(float(request.query_params.get('wait', 0)), 30)
+    except ValueError:
+        wait = 0
+    deadline = time.monotonic() + wait
+    status = get_audio_status(job_id)
+    while status and status['status'] in ('queued', 'running', 'pending') and time.monotonic() < deadline:
+        await asyncio.sleep(AUDIO_POLL_SECONDS)
+        status = get_audio_status(job_id)
+    if status is None:
+        return JSONResponse({'error': 'Unknown audio job'}, status_code=404)
+
+    filename = status.pop('filename', None)
+    if filename:
+        status['audio_url'] = f'/audio/{filename}'
+    return JSONResponse(status)
+
+
+async def serve_audio(request):
+    """Serve audio files from the TTS audio store only"""
+    filename = request.path_params['filename']
+    path = os.path.join(TTS_SPOOL_DIR, filename)
+    if not is_audio_filename(filename) or not os.path.isfile(path):
+        return JSONResponse({'error': 'Audio not found'}, status_code=404)
+    return FileResponse(path, media_type='audio/mpeg')
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Load the crop catalog and crop-name matcher before serving (in each
+    # uvicorn worker) and keep them fresh
+    await asyncio.to_thread(get_snapshot)
+    await asyncio.to_thread(get_crop_matcher)
+    start_catalog_listener()
+    yield
+    await close_http_client()
+
+
+routes = [
+    Route('/', index),
+    Route('/api/ask', ask_question, methods=['POST']),
+    Route('/api/ask/stream', ask_question_stream, methods=['POST']),
+    Route('/api/ask/batch', ask_batch, methods=['POST']),
+    Route('/metrics', prometheus_metrics),
+    Route('/audio/status/{job_id}', audio_status),
+    Route('/audio/{filename}', serve_audio),
+    Mount('/static', app=StaticFiles(directory=os.path.join(BASE_DIR, 'static')), name='static'),
+]
+
+app = Starlette(routes=routes, middleware=[Middleware(RequestMetrics)], lifespan=lifespan)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(
+        'asgi_app:app',
+        host=os.getenv('HOST', '127.0.0.1'),
+        port=int(os.getenv('PORT', '5000')),
+        limit_concurrency=ASGI_MAX_CONCURRENCY,
+    )
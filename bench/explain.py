@@ -0,0 +1,89 @@
+"""Check with EXPLAIN that every hot query can be served by an index.
+
+    DATABASE_URL=postgresql://... python -m bench.explain
+
+Applies migrations, then plans each query in HOT_QUERIES (the prepared
+ones through EXPLAIN EXECUTE, as the app runs them) with sequential scans
+disabled for the transaction. The fixture tables are small enough that
+the planner would rightly pick a sequential scan, so the check is whether
+an index *can* be used: a Seq Scan on one of the listed relations means
+none applies. Exits with status 1 if any query fails the check; bench.run
+runs it after seeding --database-url.
+
+Requests never query the catalog tables directly: they read the in-memory
+snapshot, which SNAPSHOT_QUERY loads at startup and on every catalog
+change. That query reads every crop, fertilizer link and rotation anyway,
+so only its joins are checked: each fertilizer and each next crop must be
+found through its primary key. The name and rotation indexes of migration
+5 serve the fertilizer triggers, the catalog sync and cascading deletes,
+not queries the app runs, so they are not listed here.
+"""
+import sys
+
+from psycopg2 import sql
+
+from config.database import PREPARED_STATEMENTS, db_connection, ensure_prepared
+from config.migrations import apply_migrations
+from services import session_store  # noqa: F401  registers the chat_session_* statements
+from services.catalog import SNAPSHOT_QUERY
+
+# (label, tables or aliases that must not be read sequentially, prepared statement name or SQL, params)
+HOT_QUERIES = [
+    ("session load", ("chat_sessions",), "chat_session_load", ("bench-session", 7200)),
+    ("session save", ("chat_sessions",), "chat_session_save", ("bench-session", "{}")),
+    ("session delete", ("chat_sessions",), "chat_session_delete", ("bench-session",)),
+    ("session purge", ("chat_sessions",), "chat_session_purge", (7200,)),
+    ("catalog snapshot joins", ("f", "next"), SNAPSHOT_QUERY, ()),
+]
+
+
+def scans(plan):
+    """(node type, table, alias, index) for every scan node in an EXPLAIN (FORMAT JSON) plan"""
+    found = []
+    if "Relation Name" in plan or "Index Name" in plan:
+        found.append((plan["Node Type"], plan.get("Relation Name"), plan.get("Alias"), plan.get("Index Name")))
+    for child in plan.get("Plans", ()):
+        found.extend(scans(child))
+    return found
+
+
+def explain(cur, query, params):
+    if query in PREPARED_STATEMENTS and ensure_prepared(cur, query):
+        placeholders = sql.SQL(", ").join(sql.Placeholder() * len(params))
+        cur.execute(
+            sql.SQL("EXPLAIN (FORMAT JSON) EXECUTE {} ({})").format(sql.Identifier(query), placeholders),
+            params,
+        )
+    else:
+        cur.execute("EXPLAIN (FORMAT JSON) " + PREPARED_STATEMENTS.get(query, query), params or None)
+    return cur.fetchone()[0][0]["Plan"]
+
+
+def check_indexes():
+    """[(label, ok, scans)] for HOT_QUERIES"""
+    results = []
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SET LOCAL enable_seqscan = off")
+        for label, relations, query, params in HOT_QUERIES:
+            found = scans(explain(cur, query, params))
+            ok = not any(
+                node == "Seq Scan" and (table in relations or alias in relations)
+                for node, table, alias, _ in found
+            )
+            results.append((label, ok, found))
+    return results
+
+
+if __name__ == "__main__":
+    apply_migrations()
+    failed = 0
+    for label, ok, found in check_indexes():
+        described = ", ".join(
+            node + (f" on {table}" if table else "") + (f" {alias}" if alias and alias != table else "")
+            + (f" using {index}" if index else "")
+            for node, table, alias, index in found
+        )
+        print(f"{'ok  ' if ok else 'FAIL'} {label:22} {described}")
+        failed += not ok
+    sys.exit(1 if failed else 0)
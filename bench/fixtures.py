@@ -0,0 +1,142 @@
+"""Seed a scratch Postgres database with a deterministic crop catalog.
+
+The catalog holds the fallback crops plus `extra_crops` synthetic ones,
+with fertilizers and rotations for each, so benchmark runs exercise the
+database path rather than the FALLBACK_* data. Run against a throwaway
+database only: the catalog tables are truncated first.
+
+    DATABASE_URL=postgresql://... python -m bench.fixtures --extra-crops 200
+
+With --sheets DIR it writes the same crops and fertilizers as CSV files
+laid out like the Google Sheets instead, for services.catalog_sync:
+
+    python -m bench.fixtures --sheets /tmp/sheets
+    CROP_SHEET_URL=/tmp/sheets/crops.csv FERTILIZER_SHEET_URL=/tmp/sheets/fertilizers.csv \
+        python -m services.catalog_sync
+"""
+import argparse
+import csv
+import os
+import random
+
+from config.database import db_connection
+from config.migrations import apply_migrations
+from services.crop_lexicon import CROP_LEXICON
+from services.crop_service import FALLBACK_CROPS
+
+FERTILIZERS = [
+    ("Urea", "Nitrogen", "46% N", "Tillering", 6),
+    ("DAP", "Phosphate", "18% N, 46% P2O5", "Sowing", 27),
+    ("MOP", "Potash", "60% K2O", "Sowing", 17),
+    ("Zinc Sulphate", "Micronutrient", "21% Zn", "Vegetative", 45),
+    ("SSP", "Phosphate", "16% P2O5, 11% S", "Sowing", 10),
+    ("NPK 10:26:26", "Complex", "10% N, 26% P2O5, 26% K2O", "Sowing", 30),
+    ("Ammonium Sulphate", "Nitrogen", "21% N, 24% S", "Top dressing", 14),
+    ("Vermicompost", "Organic", "1.5% N, 1% P, 1% K", "Land preparation", 8),
+]
+CROP_HEADERS = [
+    "Crop Name", "Crop Name Hi", "Crop Type", "Description", "Description Hi",
+    "Suitable Climate", "Suitable Soil", "Ideal Temperature Celsius",
+    "Water Requirement", "Growing Season", "Price Per Kg INR",
+]
+FERTILIZER_HEADERS = [
+    "Fertilizer Name", "Type", "Nutrients", "Application Stage", "Price Per Kg INR", "Used For Crops",
+]
+SEASONS = ["Kharif (June-October)", "Rabi (October-March)", "Zaid (March-June)"]
+
+
+def catalog_rows(extra_crops, seed=0):
+    """(crops, fertilizers, rotations) rows for the fixture"""
+    rng = random.Random(seed)
+    crops = []
+    for crop in FALLBACK_CROPS.values():
+        crops.append((
+            crop["name"], crop["name_hi"], crop["type"], crop["description"], crop["description_hi"],
+            crop["climate"], crop["soil"], crop["temp"], crop["water"], crop["season"], crop["price"],
+        ))
+    known = {row[0].lower() for row in crops}
+    for name, aliases in CROP_LEXICON.items():
+        if name not in known:
+            crops.append((
+                name.title(), aliases[0], "Field crop", f"{name.title()} grown across India.",
+                f"{aliases[0]} की खेती पूरे भारत में होती है।", "Tropical", "Loamy",
+                "20-30°C", "500-800 mm", rng.choice(SEASONS), rng.randint(15, 90),
+            ))
+    for i in range(extra_crops):
+        crops.append((
+            f"Benchcrop {i:04d}", f"बेंचफसल {i:04d}", "Synthetic", "Synthetic crop for load tests.",
+            "लोड परीक्षण के लिए फसल।", "Tropical", "Loamy", "20-30°C", "600 mm",
+            rng.choice(SEASONS), rng.randint(10, 120),
+        ))
+
+    names = [row[0] for row in crops]
+    fertilizers = [
+        fertilizer + (", ".join(rng.sample(names, min(len(names), max(3, len(names) // 3)))),)
+        for fertilizer in FERTILIZERS
+    ]
+    rotations = []
+    for name in names:
+        for next_crop in rng.sample(names, 2):
+            if next_crop != name:
+                rotations.append((
+                    name, next_crop, rng.choice(SEASONS), "Breaks the pest cycle.",
+                    "Improves soil nitrogen.", "Reduces disease carry-over.",
+                    rng.choice([15, 20, 30, 45]), "Prepare the field after harvest.",
+                ))
+    return crops, fertilizers, rotations
+
+
+def seed_catalog(extra_crops=100, seed=0):
+    """Apply migrations and replace the catalog with fixture rows; returns row counts"""
+    apply_migrations()
+    crops, fertilizers, rotations = catalog_rows(extra_crops, seed)
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("TRUNCATE crop_rotation_plan, crop_fertilizers, fertilizers, crops RESTART IDENTITY")
+        cur.executemany("""
+            INSERT INTO crops (crop_name, crop_name_hi, crop_type, description, description_hi,
+                               suitable_climate, suitable_soil, ideal_temperature_celsius,
+                               water_requirement, growing_season, price_per_kg_inr)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, crops)
+        cur.executemany("""
+            INSERT INTO fertilizers (fertilizer_name, type, nutrients, application_stage,
+                                     price_per_kg_inr, used_for_crops)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, fertilizers)
+        cur.executemany("""
+            INSERT INTO crop_rotation_plan (current_crop_id, next_crop_id, recommended_season,
+                                            rotation_reason, soil_nutrient_effect, pest_disease_benefit,
+                                            recommended_gap_days, special_precautions)
+            SELECT c1.crop_id, c2.crop_id, %s, %s, %s, %s, %s, %s
+            FROM crops c1, crops c2
+            WHERE c1.crop_name = %s AND c2.crop_name = %s
+        """, [row[2:] + row[:2] for row in rotations])
+    return {"crops": len(crops), "fertilizers": len(fertilizers), "rotations": len(rotations)}
+
+
+def write_sheet_fixtures(directory, extra_crops=100, seed=0):
+    """Write crops.csv and fertilizers.csv as published by the sheets; returns their paths"""
+    crops, fertilizers, _ = catalog_rows(extra_crops, seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for name, headers, rows in (("crops", CROP_HEADERS, crops), ("fertilizers", FERTILIZER_HEADERS, fertilizers)):
+        path = os.path.join(directory, f"{name}.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(headers)
+            writer.writerows(rows)
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--extra-crops", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sheets", metavar="DIR", help="write sheet CSVs here instead of seeding Postgres")
+    args = parser.parse_args()
+    if args.sheets:
+        print(write_sheet_fixtures(args.sheets, args.extra_crops, args.seed))
+    else:
+        print(seed_catalog(args.extra_crops, args.seed))
@@ -0,0 +1,358 @@
+"""Offline load test for web_app.py.
+
+Starts local stubs for Gemini, OpenWeather, IP geolocation and gTTS (see
+bench/stubs.py), optionally seeds a scratch Postgres catalog, runs the
+app in a subprocess and drives /api/ask (or /api/ask/stream) at a fixed
+concurrency. Reports client-side p50/p95/p99 and throughput plus the
+per-stage breakdown from the app's /metrics, and writes everything to a
+JSON file so runs can be compared between commits:
+
+    python -m bench.run --requests 500 --concurrency 16
+    python -m bench.run --database-url postgresql://localhost/bench_scratch
+    python -m bench.run --compare bench/results/<old>.json
+"""
+import argparse
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from bench.stubs import StubSettings, start_stub_server, stub_environment
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUESTIONS = [
+    ("How should I grow rice in clay soil?", "English"),
+    ("What is the price of wheat?", "English"),
+    ("Which fertilizer is best for maize?", "English"),
+    ("What should I grow after cotton?", "English"),
+    ("Why are my sugarcane leaves turning yellow?", "English"),
+    ("What is the weather today?", "English"),
+    ("How much water does potato need?", "English"),
+    ("When should I sow mustard?", "English"),
+    ("धान की खेती कैसे करें?", "Hindi"),
+    ("गेहूं का भाव क्या है?", "Hindi"),
+    ("कपास में कौन सा कीट लगता है?", "Hindi"),
+    ("मक्का के बाद कौन सी फसल लगाएं?", "Hindi"),
+]
+
+METRIC_LINE = re.compile(r'^(krishisahay_\w+?)(_sum|_count|_bucket)?(?:\{(.*)\})? (\S+)$')
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def parse_metrics(text):
+    """{(name, suffix, labels): value} from Prometheus text output"""
+    samples = {}
+    for line in text.splitlines():
+        match = METRIC_LINE.match(line)
+        if match:
+            name, suffix, labels, value = match.groups()
+            samples[(name, suffix or "", labels or "")] = float(value)
+    return samples
+
+
+def _label(labels, name):
+    match = re.search(rf'{name}="([^"]*)"', labels)
+    return match.group(1) if match else ""
+
+
+def stage_breakdown(before, after):
+    """Per-stage count, mean and bucketed p95 for the samples taken during the run"""
+    def delta(key):
+        return after.get(key, 0.0) - before.get(key, 0.0)
+
+    stages = {}
+    for (name, suffix, labels) in after:
+        if name != "krishisahay_stage_seconds" or suffix != "_count":
+            continue
+        stage = _label(labels, "stage")
+        count = delta((name, "_count", labels))
+        if count <= 0:
+            continue
+        total = delta((name, "_sum", labels))
+        p95 = None
+        buckets = sorted(
+            (float(_label(l, "le")), delta((n, s, l)))
+            for (n, s, l) in after
+            if n == name and s == "_bucket" and _label(l, "stage") == stage and _label(l, "le") != "+Inf"
+        )
+        for bound, cumulative in buckets:
+            if cumulative >= 0.95 * count:
+                p95 = bound * 1000
+                break
+        stages[stage] = {
+            "count": int(count),
+            "mean_ms": round(total / count * 1000, 2),
+            "p95_ms_at_most": p95,
+        }
+    return dict(sorted(stages.items()))
+
+
+def counter_deltas(before, after, name, label):
+    """{label value: increase during the run} for one counter"""
+    deltas = {}
+    for key, value in after.items():
+        if key[0] != name:
+            continue
+        increase = int(value - before.get(key, 0.0))
+        if increase > 0:
+            label_value = _label(key[2], label)
+            deltas[label_value] = deltas.get(label_value, 0) + increase
+    return deltas
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def start_app(env, port, server="wsgi", timeout=60):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "bench.serve", str(port), server],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("web_app exited during startup")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/metrics", timeout=1).status_code == 200:
+                return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("web_app did not start in time")
+
+
+class LoadGenerator:
+    def __init__(self, base_url, endpoint, questions, seed):
+        self.url = f"{base_url}/api/ask/stream" if endpoint == "stream" else f"{base_url}/api/ask"
+        self.stream = endpoint == "stream"
+        self.questions = questions
+        self.seed = seed
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def request(self, i):
+        """Send request number i; returns (seconds, first_byte_seconds, ok)"""
+        rng = random.Random(self.seed * 1_000_003 + i)
+        question, language = rng.choice(self.questions)
+        headers = {"X-Forwarded-For": f"49.{rng.randint(32, 47)}.{rng.randint(0, 255)}.10"}
+        started = time.perf_counter()
+        first = None
+        try:
+            response = self._session().post(
+                self.url, json={"question": question, "language": language},
+                headers=headers, stream=self.stream, timeout=120,
+            )
+            ok = response.status_code == 200
+            if self.stream:
+                body = b""
+                for chunk in response.iter_content(chunk_size=None):
+                    if first is None:
+                        first = time.perf_counter() - started
+                    body += chunk
+                ok = ok and b"event: done" in body
+            else:
+                response.content
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - started
+        return elapsed, first if first is not None else elapsed, ok
+
+    def run(self, count, concurrency, offset=0):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(self.request, range(offset, offset + count)))
+        return results, time.perf_counter() - started
+
+
+def summarize(results, wall_seconds):
+    latencies = [r[0] * 1000 for r in results if r[2]]
+    first_bytes = [r[1] * 1000 for r in results if r[2]]
+    errors = sum(1 for r in results if not r[2])
+
+    def pct(values):
+        return {
+            "p50": round(percentile(values, 50), 2) if values else None,
+            "p95": round(percentile(values, 95), 2) if values else None,
+            "p99": round(percentile(values, 99), 2) if values else None,
+            "mean": round(sum(values) / len(values), 2) if values else None,
+            "max": round(max(values), 2) if values else None,
+        }
+
+    return {
+        "requests": len(results),
+        "errors": errors,
+        "error_rate": round(errors / len(results), 4) if results else 0.0,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(len(results) / wall_seconds, 2) if wall_seconds else None,
+        "latency_ms": pct(latencies),
+        "first_byte_ms": pct(first_bytes),
+    }
+
+
+def compare(current, previous):
+    """Print how the headline numbers moved relative to an earlier result file"""
+    print(f"\nCompared with {previous.get('commit')} ({previous.get('timestamp')}):")
+    rows = [("throughput_rps", current["client"]["throughput_rps"], previous["client"]["throughput_rps"])]
+    for p in ("p50", "p95", "p99"):
+        rows.append((f"latency {p} ms", current["client"]["latency_ms"][p], previous["client"]["latency_ms"][p]))
+    for stage, stats in current["stages"].items():
+        old = previous.get("stages", {}).get(stage)
+        if old:
+            rows.append((f"{stage} mean ms", stats["mean_ms"], old["mean_ms"]))
+    for name, new, old in rows:
+        if new is None or not old:
+            continue
+        print(f"  {name:28} {old:>10} -> {new:>10}  ({(new - old) / old * 100:+.1f}%)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test for web_app.py")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=20, help="requests sent before measuring")
+    parser.add_argument("--endpoint", choices=("ask", "stream"), default="ask")
+    parser.add_argument("--server", choices=("wsgi", "asgi"), default="wsgi",
+                        help="web_app.py on a threaded WSGI server, or asgi_app.py on uvicorn")
+    parser.add_argument("--questions", help="JSON file of [question, language] pairs")
+    parser.add_argument("--seed", type=int, default=0)
+    for service, latency in (("gemini", 0.8), ("weather", 0.15), ("geo", 0.1), ("tts", 1.0)):
+        parser.add_argument(f"--{service}-latency", type=float, default=latency, help="seconds (mean)")
+        parser.add_argument(f"--{service}-error-rate", type=float, default=0.0)
+    parser.add_argument("--database-url", help="scratch Postgres to seed and use (catalog tables are truncated)")
+    parser.add_argument("--no-seed", action="store_true", help="use --database-url as is")
+    parser.add_argument("--extra-crops", type=int, default=100, help="synthetic crops in the fixture")
+    parser.add_argument("--answer-cache", action="store_true", help="leave the LLM answer cache enabled")
+    parser.add_argument("--output", help="result file (default bench/results/<commit>-<time>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args(argv)
+
+    questions = QUESTIONS
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as f:
+            questions = [tuple(q) for q in json.load(f)]
+
+    settings = StubSettings(
+        latencies={"gemini": args.gemini_latency, "weather": args.weather_latency, "geo": args.geo_latency},
+        error_rates={"gemini": args.gemini_error_rate, "weather": args.weather_error_rate,
+                     "geo": args.geo_error_rate},
+        seed=args.seed,
+    )
+    stub_server, stub_url = start_stub_server(settings)
+
+    env = dict(os.environ)
+    env.update(stub_environment(stub_url))
+    env.update({
+        "BENCH_TTS_LATENCY": str(args.tts_latency),
+        "BENCH_TTS_ERROR_RATE": str(args.tts_error_rate),
+        "TTS_SPOOL_DIR": os.path.join(ROOT, "bench", "results", "tts_spool"),
+        "PYTHONHASHSEED": str(args.seed),
+    })
+    if not args.answer_cache:
+        env["ANSWER_CACHE_TTL"] = "0"
+    if args.database_url:
+        env["DATABASE_URL"] = args.database_url
+        if not args.no_seed:
+            print("Seeding fixture catalog:", subprocess.check_output(
+                [sys.executable, "-m", "bench.fixtures", "--extra-crops", str(args.extra_crops),
+                 "--seed", str(args.seed)],
+                cwd=ROOT, env=env, text=True,
+            ).strip().splitlines()[-1])
+            # Hot queries must be able to use an index (see bench/explain.py)
+            check = subprocess.run([sys.executable, "-m", "bench.explain"], cwd=ROOT, env=env,
+                                   capture_output=True, text=True)
+            print(check.stdout, end="")
+            if check.returncode:
+                sys.exit("Index check failed: " + (check.stderr.strip().splitlines() or ["see above"])[-1])
+    else:
+        # Without a database the app serves its built-in fallback catalog
+        env.pop("DATABASE_URL", None)
+
+    port = free_port()
+    app = start_app(env, port, args.server)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        load = LoadGenerator(base_url, args.endpoint, questions, args.seed)
+        if args.warmup:
+            load.run(args.warmup, args.concurrency, offset=-args.warmup)
+        before = parse_metrics(requests.get(f"{base_url}/metrics", timeout=10).text)
+        results, wall = load.run(args.requests, args.concurrency)
+        after = parse_metrics(requests.get(f"{base_url}/metrics", timeout=10).text)
+    finally:
+        app.terminate()
+        app.wait(timeout=10)
+        stub_server.shutdown()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "database_url")},
+        "database": bool(args.database_url),
+        "client": summarize(results, wall),
+        "stages": stage_breakdown(before, after),
+        "fallbacks": counter_deltas(before, after, "krishisahay_fallbacks_total", "kind"),
+        "stage_errors": counter_deltas(before, after, "krishisahay_stage_errors_total", "stage"),
+        "llm_rejections": counter_deltas(before, after, "krishisahay_llm_rejections_total", "reason"),
+        "stub_calls": settings.calls,
+    }
+
+    output = args.output or os.path.join(
+        ROOT, "bench", "results", f"{report['commit']}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    client = report["client"]
+    print(f"{client['requests']} requests, {client['errors']} errors, "
+          f"{client['throughput_rps']} req/s at concurrency {args.concurrency}")
+    print("latency ms:", client["latency_ms"])
+    if args.endpoint == "stream":
+        print("first byte ms:", client["first_byte_ms"])
+    for stage, stats in report["stages"].items():
+        print(f"  {stage:18} n={stats['count']:<6} mean={stats['mean_ms']:>9} ms  p95<={stats['p95_ms_at_most']}")
+    if report["fallbacks"]:
+        print("fallbacks:", report["fallbacks"])
+    if report["llm_rejections"]:
+        print("LLM requests shed:", report["llm_rejections"])
+    print("results written to", output)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+    return report
+
+
+if __name__ == "__main__":
+    main()
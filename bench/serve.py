@@ -0,0 +1,19 @@
+"""Serve the app for benchmarks: web_app.py on a threaded WSGI server (no
+debugger or reloader), or asgi_app.py on uvicorn.
+
+    python -m bench.serve PORT [wsgi|asgi]
+"""
+import sys
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5050
+    mode = sys.argv[2] if len(sys.argv) > 2 else "wsgi"
+    if mode == "asgi":
+        import uvicorn
+        from config.config import ASGI_MAX_CONCURRENCY
+        uvicorn.run("asgi_app:app", host="127.0.0.1", port=port, log_level="warning",
+                    limit_concurrency=ASGI_MAX_CONCURRENCY)
+    else:
+        from werkzeug.serving import run_simple
+        import web_app
+        run_simple("127.0.0.1", port, web_app.app, threaded=True)
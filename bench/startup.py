@@ -0,0 +1,131 @@
+"""Startup benchmark: import time per module and time to the first served request.
+
+    python -m bench.startup
+    python -m bench.startup --server asgi --budget-ms 1500
+
+Import times come from `python -X importtime -c "import web_app"` (or
+asgi_app): the modules imported directly by the entry point, by
+cumulative time, and the slowest modules by their own time. Time to first
+request runs from spawning the server to the first 200 from GET /; the
+first question (POST /api/ask against the local stubs) also pays for
+anything imported lazily, such as google.genai. Exits with status 1 when
+the time to first request is over the budget.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import requests
+
+from bench.run import ROOT, free_port
+from bench.stubs import StubSettings, start_stub_server, stub_environment
+
+ENTRY_MODULES = {"wsgi": "web_app", "asgi": "asgi_app"}
+
+
+def import_times(module, env):
+    """[(name, depth, self_ms, cumulative_ms)] in the order -X importtime reports them.
+
+    Raises RuntimeError with the interpreter's error output if the import fails.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        errors = "\n".join(line for line in result.stderr.splitlines() if not line.startswith("import time:"))
+        raise RuntimeError(f"import {module} failed:\n{errors}")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append((name.strip(), depth, int(self_us) / 1000, int(cumulative_us) / 1000))
+    return rows
+
+
+def first_request(server, env, timeout=60):
+    """(ms to the first 200 from GET /, ms for the first /api/ask answer)"""
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "bench.serve", str(port), server],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError("server exited during startup")
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError("server did not start in time")
+            try:
+                if requests.get(f"{base_url}/", timeout=1).status_code == 200:
+                    break
+            except requests.RequestException:
+                time.sleep(0.01)
+        ready_ms = (time.perf_counter() - started) * 1000
+
+        asked = time.perf_counter()
+        response = requests.post(
+            f"{base_url}/api/ask", json={"question": "Why are my rice leaves turning yellow?"}, timeout=60
+        )
+        response.raise_for_status()
+        return ready_ms, (time.perf_counter() - asked) * 1000
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Startup time of the web app")
+    parser.add_argument("--server", choices=("wsgi", "asgi"), default="wsgi")
+    parser.add_argument("--budget-ms", type=float, default=1000, help="time to first served request")
+    parser.add_argument("--top", type=int, default=12, help="modules listed per table")
+    parser.add_argument("--database-url", help="load the catalog from this database instead of the fallback")
+    args = parser.parse_args(argv)
+
+    stub_server, stub_url = start_stub_server(
+        StubSettings(latencies={"gemini": 0.05, "weather": 0.01, "geo": 0.01})
+    )
+    env = dict(os.environ)
+    env.update(stub_environment(stub_url))
+    env["BENCH_TTS_LATENCY"] = "0"
+    if args.database_url:
+        env["DATABASE_URL"] = args.database_url
+    else:
+        env.pop("DATABASE_URL", None)
+    module = ENTRY_MODULES[args.server]
+
+    try:
+        rows = import_times(module, env)
+    except RuntimeError as e:
+        stub_server.shutdown()
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    total = next((cumulative for name, depth, _, cumulative in rows if name == module and depth == 0), None)
+    print(f"import {module}: {total:.1f} ms")
+    print("\nImported by the entry point (cumulative ms):")
+    direct = [row for row in rows if row[1] == 1]
+    for name, _, _, cumulative in sorted(direct, key=lambda row: -row[3])[:args.top]:
+        print(f"  {cumulative:9.1f}  {name}")
+    print("\nSlowest modules (self ms):")
+    for name, _, own, _ in sorted(rows, key=lambda row: -row[2])[:args.top]:
+        print(f"  {own:9.1f}  {name}")
+
+    try:
+        ready_ms, ask_ms = first_request(args.server, env)
+    finally:
+        stub_server.shutdown()
+    status = "within" if ready_ms <= args.budget_ms else "OVER"
+    print(f"\nTime to first served request: {ready_ms:.0f} ms ({status} the {args.budget_ms:.0f} ms budget)")
+    print(f"First question (includes lazy imports and a 50 ms stub model call): {ask_ms:.0f} ms")
+    if ready_ms > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
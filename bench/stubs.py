@@ -0,0 +1,162 @@
+"""Local stand-ins for the external services used by web_app.py.
+
+One threaded HTTP server answers like Gemini (generateContent and
+streamGenerateContent), OpenWeather and an IP geolocation provider, each
+with its own latency and error rate. `fake_synthesize` replaces gTTS via
+TTS_SYNTHESIZER and reads its latency from BENCH_TTS_LATENCY and
+BENCH_TTS_ERROR_RATE.
+"""
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+ANSWER = (
+    "Sow the seeds after the first good rain and keep the field moist but not waterlogged. "
+    "Apply the recommended fertilizer in two splits and watch for pests in the early weeks. "
+    "Harvest when the grains are hard and golden for the best market price."
+)
+CITIES = ["Pune", "Nagpur", "Lucknow", "Patna", "Jaipur", "Bhopal", "Ludhiana", "Indore"]
+
+
+class StubSettings:
+    """Latency (seconds, mean) and error rate (0-1) for each stubbed service"""
+
+    def __init__(self, latencies=None, error_rates=None, seed=0, stream_chunks=8):
+        self.latencies = {"gemini": 0.8, "weather": 0.15, "geo": 0.1}
+        self.latencies.update(latencies or {})
+        self.error_rates = {"gemini": 0.0, "weather": 0.0, "geo": 0.0}
+        self.error_rates.update(error_rates or {})
+        self.stream_chunks = stream_chunks
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = {name: 0 for name in self.latencies}
+
+    def delay(self, service, share=1.0):
+        """Sleep for a jittered share of the service's latency"""
+        with self._lock:
+            jitter = self._random.uniform(0.5, 1.5)
+        time.sleep(self.latencies[service] * share * jitter)
+
+    def should_fail(self, service):
+        with self._lock:
+            self.calls[service] += 1
+            return self._random.random() < self.error_rates[service]
+
+
+def _gemini_response(text):
+    return {
+        "candidates": [{
+            "content": {"role": "model", "parts": [{"text": text}]},
+            "finishReason": "STOP",
+            "index": 0,
+        }],
+        "usageMetadata": {"promptTokenCount": 0, "candidatesTokenCount": len(text.split())},
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    settings = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _fail(self, service):
+        self.settings.delay(service, share=0.5)
+        self._send_json(503, {"error": {"code": 503, "message": f"{service} stub error", "status": "UNAVAILABLE"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        path = urlparse(self.path).path
+        if ":streamGenerateContent" in path:
+            self._stream_gemini()
+        elif ":generateContent" in path:
+            if self.settings.should_fail("gemini"):
+                return self._fail("gemini")
+            self.settings.delay("gemini")
+            self._send_json(200, _gemini_response(ANSWER))
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _stream_gemini(self):
+        if self.settings.should_fail("gemini"):
+            return self._fail("gemini")
+        words = ANSWER.split(" ")
+        chunks = self.settings.stream_chunks
+        size = max(len(words) // chunks, 1)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for i in range(0, len(words), size):
+            self.settings.delay("gemini", share=1.0 / chunks)
+            text = " ".join(words[i:i + size]) + " "
+            self.wfile.write(f"data: {json.dumps(_gemini_response(text))}\r\n\r\n".encode("utf-8"))
+            self.wfile.flush()
+        self.close_connection = True
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path.startswith("/weather"):
+            if self.settings.should_fail("weather"):
+                return self._fail("weather")
+            self.settings.delay("weather")
+            self._send_json(200, {
+                "main": {"temp": 28.4, "humidity": 62},
+                "wind": {"speed": 3.1},
+                "weather": [{"description": "scattered clouds"}],
+            })
+        elif path.startswith("/geo"):
+            if self.settings.should_fail("geo"):
+                return self._fail("geo")
+            self.settings.delay("geo")
+            city = CITIES[zlib.crc32(path.encode()) % len(CITIES)]
+            self._send_json(200, {"city": city, "country_name": "India"})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+
+def start_stub_server(settings, host="127.0.0.1", port=0):
+    """Serve the stubs on a daemon thread; returns (server, base_url)"""
+    handler = type("StubHandler", (_Handler,), {"settings": settings})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="bench-stubs", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def stub_environment(base_url):
+    """Environment variables pointing web_app.py at the stubs"""
+    return {
+        "GEMINI_API_KEY": "bench",
+        "GEMINI_BASE_URL": base_url,
+        "WEATHER_API_KEY": "bench",
+        "WEATHER_API_URL": f"{base_url}/weather",
+        "LOCATION_PROVIDERS": f"{base_url}/geo/{{ip}}",
+        "TTS_SYNTHESIZER": "bench.stubs:fake_synthesize",
+    }
+
+
+def fake_synthesize(text, language, path):
+    """Stand-in for gTTS with configurable latency and error rate"""
+    latency = float(os.getenv("BENCH_TTS_LATENCY", "1.0"))
+    if random.random() < float(os.getenv("BENCH_TTS_ERROR_RATE", "0")):
+        time.sleep(latency / 2)
+        raise RuntimeError("TTS stub error")
+    time.sleep(latency * random.uniform(0.5, 1.5))
+    with open(path, "wb") as f:
+        f.write(b"ID3" + text.encode("utf-8")[:256])
@@ -1,6 +1,7 @@
 import os
+import tempfile
+import threading
 from dotenv import load_dotenv
-import google.genai as genai
 
 # Load environment variables from .env file
 load_dotenv()
@@ -10,14 +11,156 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 DATABASE_URL = os.getenv("DATABASE_URL")
 WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")
 
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY not set")
-
-client = genai.Client(api_key=GEMINI_API_KEY)
+# GEMINI_BASE_URL points the client at another endpoint (e.g. the benchmark stubs)
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
 MODEL_NAME = "gemini-2.5-flash"
 
-CROP_SHEET_URL = "https://docs.google.com/spreadsheets/d/e/2PACX-1vS1yndkdYpEMG1I1EqynWazYsyLRW3jbvoupsRChjctGozkQPN_Vd5amo47m661gIXp9paKVqh7UD3S/pub?gid=1555082969&single=true&output=csv"
-FERTILIZER_SHEET_URL = "https://docs.google.com/spreadsheets/d/e/2PACX-1vSOo4fVG3L1011RtB9bcQbmC9jPQivbwZQ9lA8mK3-ajO75J1I-EUCL5ZJcx0MQ3DNxEEPgrV136qov/pub?gid=1216712628&single=true&output=csv"
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The shared Gemini client. google.genai is imported and the client
+    built on first use, so importing config (and the services) is cheap
+    and works without GEMINI_API_KEY."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if not GEMINI_API_KEY:
+                    raise ValueError("GEMINI_API_KEY not set")
+                import google.genai as genai
+                if GEMINI_BASE_URL:
+                    _client = genai.Client(
+                        api_key=GEMINI_API_KEY, http_options=genai.types.HttpOptions(base_url=GEMINI_BASE_URL)
+                    )
+                else:
+                    _client = genai.Client(api_key=GEMINI_API_KEY)
+    return _client
+
+
+def _reset_client_after_fork():
+    global _client, _client_lock
+    _client = None
+    _client_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_client_after_fork)
+
+CROP_SHEET_URL = os.getenv("CROP_SHEET_URL", "https://docs.google.com/spreadsheets/d/e/2PACX-1vS1yndkdYpEMG1I1EqynWazYsyLRW3jbvoupsRChjctGozkQPN_Vd5amo47m661gIXp9paKVqh7UD3S/pub?gid=1555082969&single=true&output=csv")
+FERTILIZER_SHEET_URL = os.getenv("FERTILIZER_SHEET_URL", "https://docs.google.com/spreadsheets/d/e/2PACX-1vSOo4fVG3L1011RtB9bcQbmC9jPQivbwZQ9lA8mK3-ajO75J1I-EUCL5ZJcx0MQ3DNxEEPgrV136qov/pub?gid=1216712628&single=true&output=csv")
 
 WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")
 ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
+
+# In-memory catalog snapshot: reload interval and Postgres NOTIFY channel
+CATALOG_TTL_SECONDS = int(os.getenv("CATALOG_TTL_SECONDS", "600"))
+CATALOG_NOTIFY_CHANNEL = os.getenv("CATALOG_NOTIFY_CHANNEL", "krishi_catalog_changed")
+# Catalog sync (python -m services.catalog_sync) keeps the sheets as Feather
+# files here; they are also the catalog while the database is unreachable
+CATALOG_CACHE_DIR = os.getenv("CATALOG_CACHE_DIR", os.path.join(tempfile.gettempdir(), "krishisahay_catalog"))
+CATALOG_SYNC_TIMEOUT = float(os.getenv("CATALOG_SYNC_TIMEOUT", "30"))
+
+# Database connection pool
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+DB_POOL_WAIT_TIMEOUT = float(os.getenv("DB_POOL_WAIT_TIMEOUT", "5"))
+# Idle connections older than this (seconds) are checked with SELECT 1 before reuse
+DB_HEALTHCHECK_AFTER = float(os.getenv("DB_HEALTHCHECK_AFTER", "30"))
+# Run hot queries as server-side prepared statements; turn off behind a
+# transaction-pooling proxy (e.g. PgBouncer) that does not keep them per client
+DB_PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", "true").lower() in ("1", "true", "yes")
+
+# IP geolocation: optional comma-separated provider URL templates containing "{ip}"
+LOCATION_PROVIDERS = [u.strip() for u in os.getenv("LOCATION_PROVIDERS", "").split(",") if u.strip()]
+LOCATION_TIMEOUT = float(os.getenv("LOCATION_TIMEOUT", "3"))
+LOCATION_CACHE_SIZE = int(os.getenv("LOCATION_CACHE_SIZE", "10000"))
+LOCATION_CACHE_TTL = int(os.getenv("LOCATION_CACHE_TTL", "86400"))
+LOCATION_NEGATIVE_TTL = int(os.getenv("LOCATION_NEGATIVE_TTL", "300"))
+# Reverse proxies in front of the app that append to X-Forwarded-For; the
+# client address is taken that many entries from the right (0 = ignore the header)
+TRUSTED_PROXY_COUNT = int(os.getenv("TRUSTED_PROXY_COUNT", "1"))
+
+# OpenWeather: responses are fresh for WEATHER_CACHE_TTL seconds, then served
+# stale for up to WEATHER_STALE_TTL more while being refreshed in the background
+WEATHER_API_URL = os.getenv("WEATHER_API_URL", "https://api.openweathermap.org/data/2.5/weather")
+WEATHER_TIMEOUT = float(os.getenv("WEATHER_TIMEOUT", "5"))
+WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", "1000"))
+WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", "600"))
+WEATHER_STALE_TTL = int(os.getenv("WEATHER_STALE_TTL", "1800"))
+WEATHER_NEGATIVE_TTL = int(os.getenv("WEATHER_NEGATIVE_TTL", "60"))
+
+# Prompt context gathering: per-stage deadlines and an overall budget (seconds)
+CONTEXT_MAX_WORKERS = int(os.getenv("CONTEXT_MAX_WORKERS", "32"))
+CONTEXT_BUDGET_SECONDS = float(os.getenv("CONTEXT_BUDGET_SECONDS", "4"))
+CONTEXT_STAGE_TIMEOUTS = {
+    "crop": float(os.getenv("CONTEXT_TIMEOUT_CROP", "1")),
+    "location": float(os.getenv("CONTEXT_TIMEOUT_LOCATION", "3")),
+    "weather": float(os.getenv("CONTEXT_TIMEOUT_WEATHER", "4")),
+}
+
+# Background text-to-speech worker pool
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "4"))
+TTS_MAX_QUEUE = int(os.getenv("TTS_MAX_QUEUE", "100"))
+TTS_JOB_HISTORY = int(os.getenv("TTS_JOB_HISTORY", "1000"))
+# Longest ?wait long-poll on /audio/status in web_app.py, which holds a server
+# thread for it; asgi_app.py allows 30 seconds without holding one
+AUDIO_STATUS_MAX_WAIT = float(os.getenv("AUDIO_STATUS_MAX_WAIT", "5"))
+# Content-addressed audio store for synthesized answers
+TTS_SPOOL_DIR = os.getenv("TTS_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "krishisahay_tts"))
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+# Optional "module:function" replacing gTTS, called as fn(text, language, path)
+TTS_SYNTHESIZER = os.getenv("TTS_SYNTHESIZER", "")
+
+# LLM answer cache (ANSWER_CACHE_DB enables a SQLite tier shared by workers)
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "5000"))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "21600"))
+ANSWER_CACHE_DB = os.getenv("ANSWER_CACHE_DB", "")
+ANSWER_CACHE_DB_MAX_ROWS = int(os.getenv("ANSWER_CACHE_DB_MAX_ROWS", "50000"))
+ANSWER_CACHE_FUZZY = os.getenv("ANSWER_CACHE_FUZZY", "false").lower() in ("1", "true", "yes")
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.85"))
+
+# Conversation history in prompts: recent turns kept verbatim up to
+# HISTORY_TOKEN_BUDGET approximate tokens, older turns summarized
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1200"))
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "300"))
+HISTORY_SUMMARY_CACHE_SIZE = int(os.getenv("HISTORY_SUMMARY_CACHE_SIZE", "2000"))
+
+# Server-side chat sessions: SESSION_BACKEND is "memory", "sqlite" (SESSION_DB)
+# or "postgres" (chat_sessions table); sessions expire after SESSION_IDLE_TTL
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+SESSION_DB = os.getenv("SESSION_DB", os.path.join(tempfile.gettempdir(), "krishisahay_sessions.db"))
+SESSION_IDLE_TTL = int(os.getenv("SESSION_IDLE_TTL", "7200"))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", "40"))
+SESSION_MAX_CHARS = int(os.getenv("SESSION_MAX_CHARS", "16000"))
+
+# Ask Gemini to translate Hindi questions when the local crop lexicon finds no crop
+CROP_TRANSLATE_FALLBACK = os.getenv("CROP_TRANSLATE_FALLBACK", "false").lower() in ("1", "true", "yes")
+
+# Questions routed to a structured intent at or above this confidence are
+# answered from service data without calling the model
+INTENT_MIN_CONFIDENCE = float(os.getenv("INTENT_MIN_CONFIDENCE", "0.6"))
+
+# ASGI mode (asgi_app.py): connections served at once before uvicorn answers
+# 503, and the shared outbound HTTP connection pool for weather/geolocation
+ASGI_MAX_CONCURRENCY = int(os.getenv("ASGI_MAX_CONCURRENCY", "500"))
+ASYNC_HTTP_MAX_CONNECTIONS = int(os.getenv("ASYNC_HTTP_MAX_CONNECTIONS", "100"))
+
+# Gemini admission control per model: concurrent calls, call starts per second
+# (token bucket; 0 disables it) with bursts up to LLM_BURST, and a wait queue of
+# LLM_MAX_QUEUE requests that are turned away with 503 after LLM_QUEUE_TIMEOUT
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_RATE_PER_SECOND = float(os.getenv("LLM_RATE_PER_SECOND", "10"))
+LLM_BURST = int(os.getenv("LLM_BURST", "20"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "200"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))
+# Server processes sharing the budgets above: each gets its share of the
+# concurrency, rate and burst (gunicorn.conf.py sets this from its worker count)
+LLM_PROCESS_COUNT = int(os.getenv("LLM_PROCESS_COUNT", "1"))
+
+# /api/ask/batch (SMS/IVR gateways): questions accepted per request, and
+# questions of one batch answered at the same time
+ASK_BATCH_MAX_QUESTIONS = int(os.getenv("ASK_BATCH_MAX_QUESTIONS", "100"))
+ASK_BATCH_CONCURRENCY = int(os.getenv("ASK_BATCH_CONCURRENCY", "8"))
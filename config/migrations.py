@@ -0,0 +1,192 @@
+"""Versioned schema migrations for the KrishiSahay database.
+
+Run with ``python -m config.migrations``. Each migration runs in its own
+transaction and is recorded in ``schema_migrations``; already applied
+versions are skipped, so the command is safe to run on every deploy.
+"""
+from psycopg2 import sql
+
+from .config import CATALOG_NOTIFY_CHANNEL
+from .database import db_connection
+
+MIGRATIONS = [
+    (1, "catalog tables", """
+        CREATE TABLE IF NOT EXISTS crops (
+            crop_id SERIAL PRIMARY KEY,
+            crop_name TEXT NOT NULL,
+            crop_name_hi TEXT,
+            crop_type TEXT,
+            description TEXT,
+            description_hi TEXT,
+            suitable_climate TEXT,
+            suitable_soil TEXT,
+            ideal_temperature_celsius TEXT,
+            water_requirement TEXT,
+            growing_season TEXT,
+            price_per_kg_inr NUMERIC
+        );
+
+        CREATE TABLE IF NOT EXISTS fertilizers (
+            fertilizer_id SERIAL PRIMARY KEY,
+            fertilizer_name TEXT NOT NULL,
+            type TEXT,
+            nutrients TEXT,
+            application_stage TEXT,
+            price_per_kg_inr NUMERIC,
+            used_for_crops TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS crop_rotation_plan (
+            rotation_id SERIAL PRIMARY KEY,
+            current_crop_id INTEGER NOT NULL REFERENCES crops (crop_id) ON DELETE CASCADE,
+            next_crop_id INTEGER NOT NULL REFERENCES crops (crop_id) ON DELETE CASCADE,
+            recommended_season TEXT,
+            rotation_reason TEXT,
+            soil_nutrient_effect TEXT,
+            pest_disease_benefit TEXT,
+            recommended_gap_days INTEGER,
+            special_precautions TEXT
+        );
+    """),
+    (2, "crop fertilizer association", """
+        CREATE TABLE IF NOT EXISTS crop_fertilizers (
+            crop_id INTEGER NOT NULL REFERENCES crops (crop_id) ON DELETE CASCADE,
+            fertilizer_id INTEGER NOT NULL REFERENCES fertilizers (fertilizer_id) ON DELETE CASCADE,
+            PRIMARY KEY (crop_id, fertilizer_id)
+        );
+
+        CREATE INDEX IF NOT EXISTS crop_fertilizers_fertilizer_id_idx
+            ON crop_fertilizers (fertilizer_id);
+
+        -- Backfill from the comma-separated used_for_crops text
+        INSERT INTO crop_fertilizers (crop_id, fertilizer_id)
+        SELECT DISTINCT c.crop_id, f.fertilizer_id
+        FROM fertilizers f
+        CROSS JOIN LATERAL unnest(string_to_array(f.used_for_crops, ',')) AS u (crop_name)
+        JOIN crops c ON lower(c.crop_name) = lower(trim(u.crop_name))
+        ON CONFLICT DO NOTHING;
+
+        -- Keep the association in step when used_for_crops is edited directly
+        CREATE OR REPLACE FUNCTION sync_crop_fertilizers() RETURNS trigger AS $$
+        BEGIN
+            DELETE FROM crop_fertilizers WHERE fertilizer_id = NEW.fertilizer_id;
+            INSERT INTO crop_fertilizers (crop_id, fertilizer_id)
+            SELECT DISTINCT c.crop_id, NEW.fertilizer_id
+            FROM unnest(string_to_array(NEW.used_for_crops, ',')) AS u (crop_name)
+            JOIN crops c ON lower(c.crop_name) = lower(trim(u.crop_name))
+            ON CONFLICT DO NOTHING;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS fertilizers_sync_crop_fertilizers ON fertilizers;
+        CREATE TRIGGER fertilizers_sync_crop_fertilizers
+            AFTER INSERT OR UPDATE OF used_for_crops ON fertilizers
+            FOR EACH ROW EXECUTE FUNCTION sync_crop_fertilizers();
+
+        -- ...and pick up fertilizers that already list a newly added crop
+        CREATE OR REPLACE FUNCTION sync_crop_fertilizers_for_crop() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO crop_fertilizers (crop_id, fertilizer_id)
+            SELECT DISTINCT NEW.crop_id, f.fertilizer_id
+            FROM fertilizers f
+            CROSS JOIN LATERAL unnest(string_to_array(f.used_for_crops, ',')) AS u (crop_name)
+            WHERE lower(trim(u.crop_name)) = lower(NEW.crop_name)
+            ON CONFLICT DO NOTHING;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS crops_sync_crop_fertilizers ON crops;
+        CREATE TRIGGER crops_sync_crop_fertilizers
+            AFTER INSERT OR UPDATE OF crop_name ON crops
+            FOR EACH ROW EXECUTE FUNCTION sync_crop_fertilizers_for_crop();
+    """),
+    # The channel name comes from the environment, so it is quoted as a literal
+    (3, "catalog change notifications", sql.SQL("""
+        CREATE OR REPLACE FUNCTION notify_catalog_changed() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify({channel}, TG_TABLE_NAME);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS crops_notify_catalog_changed ON crops;
+        CREATE TRIGGER crops_notify_catalog_changed
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON crops
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_catalog_changed();
+
+        DROP TRIGGER IF EXISTS fertilizers_notify_catalog_changed ON fertilizers;
+        CREATE TRIGGER fertilizers_notify_catalog_changed
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON fertilizers
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_catalog_changed();
+
+        DROP TRIGGER IF EXISTS crop_fertilizers_notify_catalog_changed ON crop_fertilizers;
+        CREATE TRIGGER crop_fertilizers_notify_catalog_changed
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON crop_fertilizers
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_catalog_changed();
+
+        DROP TRIGGER IF EXISTS crop_rotation_plan_notify_catalog_changed ON crop_rotation_plan;
+        CREATE TRIGGER crop_rotation_plan_notify_catalog_changed
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON crop_rotation_plan
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_catalog_changed();
+    """).format(channel=sql.Literal(CATALOG_NOTIFY_CHANNEL))),
+    (4, "chat sessions", """
+        CREATE TABLE IF NOT EXISTS chat_sessions (
+            session_id TEXT PRIMARY KEY,
+            data JSONB NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+
+        CREATE INDEX IF NOT EXISTS chat_sessions_updated_at_idx ON chat_sessions (updated_at);
+    """),
+    (5, "catalog lookup indexes", """
+        -- Crops are matched case-insensitively by name (fertilizer triggers,
+        -- catalog sync, per-crop lookups)
+        CREATE INDEX IF NOT EXISTS crops_lower_crop_name_idx ON crops (lower(crop_name));
+        CREATE INDEX IF NOT EXISTS fertilizers_lower_fertilizer_name_idx ON fertilizers (lower(fertilizer_name));
+
+        -- Rotation lookups by either crop, and ON DELETE CASCADE from crops
+        CREATE INDEX IF NOT EXISTS crop_rotation_plan_current_crop_id_idx ON crop_rotation_plan (current_crop_id);
+        CREATE INDEX IF NOT EXISTS crop_rotation_plan_next_crop_id_idx ON crop_rotation_plan (next_crop_id);
+    """),
+]
+
+# Arbitrary key for pg_advisory_xact_lock so concurrent deploys apply migrations once
+MIGRATION_LOCK_ID = 746120
+
+
+def applied_versions(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+
+def apply_migrations():
+    """Apply pending migrations in version order and return the versions applied"""
+    applied = []
+    for version, name, statements in MIGRATIONS:
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+            if version in applied_versions(cur):
+                continue
+            cur.execute(statements)
+            cur.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                (version, name),
+            )
+        applied.append(version)
+        print(f"Applied migration {version}: {name}")
+    return applied
+
+
+if __name__ == "__main__":
+    if not apply_migrations():
+        print("Database schema is up to date.")
@@ -0,0 +1,83 @@
+"""Gunicorn settings for serving web_app.py in production.
+
+    gunicorn web_app:app
+
+The app is imported once in the master (preload_app), so the imported
+libraries, the catalog snapshot, the crop-name matcher and the compiled
+intent patterns are shared with every worker copy-on-write. Each worker
+opens its own database pool, HTTP sessions and SQLite connections after
+fork (see the os.register_at_fork hooks next to each of them) and starts
+its own catalog listener in post_fork. The master never serves requests,
+so thread pools have no threads yet when workers are forked.
+
+State that lives in a worker is not seen by the others:
+
+- Chat sessions: with more than one worker, SESSION_BACKEND defaults to
+  "sqlite" instead of "memory", and an explicit "memory" is refused.
+- Audio jobs: a queued job leaves a marker in the shared TTS_SPOOL_DIR,
+  so a status poll that reaches another worker reports "pending" until
+  the audio file appears there.
+- Gemini admission control: each worker gets 1/workers of
+  LLM_MAX_CONCURRENCY, LLM_RATE_PER_SECOND and LLM_BURST (at least one
+  call in flight and a burst of one each), so the server as a whole stays
+  within them. The wait queue, LLM_MAX_QUEUE, is per worker.
+- /metrics: each worker keeps its own counters and a scrape reaches
+  whichever worker accepts it. Scrape with WEB_CONCURRENCY=1 per
+  container, or treat the numbers as a sample of one worker.
+
+Send HUP for a graceful restart of the workers. Preloaded code is not
+re-imported on HUP; to deploy new code send USR2 (start a new master)
+and then WINCH and QUIT to the old one.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+
+# Read when the app is preloaded, which happens after this file runs;
+# on_starting checks the final worker count (-w may override this one)
+if workers > 1:
+    os.environ.setdefault("SESSION_BACKEND", "sqlite")
+
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+preload_app = True
+
+# Recycle workers after this many requests (jittered so they do not all restart at once)
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "5000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "500"))
+
+# Gemini answers can take a while; workers get this long to finish in-flight requests on reload
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+
+def on_starting(server):
+    from config.config import SESSION_BACKEND
+    from services.llm_limiter import set_process_count
+
+    # Workers fork after this and create their limiters on first use
+    set_process_count(server.cfg.workers)
+    if server.cfg.workers > 1 and SESSION_BACKEND == "memory":
+        raise SystemExit(
+            f"SESSION_BACKEND=memory keeps chat sessions in one worker; use sqlite or postgres "
+            f"with {server.cfg.workers} workers, or run a single worker"
+        )
+
+
+def when_ready(server):
+    # The app imports google.genai lazily; import it here so every worker
+    # shares it instead of paying for it on its first question
+    import google.genai  # noqa: F401
+
+    # Objects created while loading the app live for the whole process;
+    # keep the cyclic GC from writing to (and so copying) their pages in workers
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from services.catalog import start_catalog_listener
+    start_catalog_listener()
@@ -0,0 +1,316 @@
+"""Cache of LLM answers for frequently repeated farmer questions.
+
+Answers are keyed by the normalized question, the detected crop, the
+language and a coarse weather bucket. Lookups go to an in-memory LRU
+tier first and then to an optional SQLite tier (ANSWER_CACHE_DB) shared
+by worker processes. With ANSWER_CACHE_FUZZY enabled, questions whose
+MinHash signatures are close enough to a cached one (same crop,
+language and weather bucket) reuse its answer too.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple, OrderedDict
+
+from config.config import (
+    ANSWER_CACHE_SIZE,
+    ANSWER_CACHE_TTL,
+    ANSWER_CACHE_DB,
+    ANSWER_CACHE_DB_MAX_ROWS,
+    ANSWER_CACHE_FUZZY,
+    ANSWER_CACHE_SIMILARITY,
+)
+from utils.cache import AsyncSingleFlight, AsyncStreamFlight, StreamFlight, TTLCache, SingleFlight
+from utils.metrics import CACHE_LOOKUPS, log_event
+
+AnswerKey = namedtuple("AnswerKey", ["exact", "partition", "signature"])
+
+_WORD = re.compile(r"[\wऀ-ॿ]+")
+
+# MinHash: NUM_HASHES signatures split into BANDS bands for LSH bucketing
+NUM_HASHES = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_HASHES // BANDS
+# Universal hash family h(x) = (a*x + b) mod p standing in for random permutations
+_PRIME = (1 << 61) - 1
+_COEFFS = [
+    (int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % _PRIME or 1,
+     int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % _PRIME)
+    for i in range(NUM_HASHES)
+]
+
+
+def normalize_question(question):
+    return " ".join(_WORD.findall(question.lower()))
+
+
+def weather_bucket(weather):
+    """Coarse weather class: 5 °C temperature steps, 25% humidity steps, condition"""
+    if not weather:
+        return "none"
+    try:
+        temp = int(float(weather["temp"]) // 5 * 5)
+        humidity = int(float(weather["humidity"]) // 25 * 25)
+    except (KeyError, TypeError, ValueError):
+        return "none"
+    condition = str(weather.get("desc", "")).split(" ")[-1]
+    return f"{temp}c/{humidity}h/{condition}"
+
+
+def _shingles(text, size=3):
+    text = f" {text} "
+    return {text[i:i + size] for i in range(max(len(text) - size + 1, 1))}
+
+
+def minhash(text):
+    values = [
+        int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+        for s in _shingles(text)
+    ]
+    return tuple(min((a * v + b) % _PRIME for v in values) for a, b in _COEFFS)
+
+
+def similarity(a, b):
+    return sum(x == y for x, y in zip(a, b)) / NUM_HASHES
+
+
+def make_key(question, crop, language, weather):
+    normalized = normalize_question(question)
+    partition = f"{language}|{crop or '-'}|{weather_bucket(weather)}"
+    exact = hashlib.sha256(f"{partition}|{normalized}".encode("utf-8")).hexdigest()
+    signature = minhash(normalized) if ANSWER_CACHE_FUZZY else None
+    return AnswerKey(exact, partition, signature)
+
+
+class _NearDuplicateIndex:
+    """LSH index from MinHash bands to cached exact keys, per partition"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._signatures = OrderedDict()  # exact -> (partition, signature)
+        self._buckets = {}  # (partition, band, band_hash) -> set of exact keys
+        self._lock = threading.Lock()
+
+    def _bands(self, partition, signature):
+        for band in range(BANDS):
+            rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+            yield (partition, band, hash(rows))
+
+    def add(self, key):
+        with self._lock:
+            if key.exact in self._signatures:
+                self._signatures.move_to_end(key.exact)
+                return
+            self._signatures[key.exact] = (key.partition, key.signature)
+            for bucket in self._bands(key.partition, key.signature):
+                self._buckets.setdefault(bucket, set()).add(key.exact)
+            while len(self._signatures) > self.maxsize:
+                old, (partition, signature) = self._signatures.popitem(last=False)
+                for bucket in self._bands(partition, signature):
+                    members = self._buckets.get(bucket)
+                    if members:
+                        members.discard(old)
+                        if not members:
+                            del self._buckets[bucket]
+
+    def nearest(self, key):
+        """Most similar cached key in the same partition above the threshold"""
+        with self._lock:
+            candidates = set()
+            for bucket in self._bands(key.partition, key.signature):
+                candidates |= self._buckets.get(bucket, set())
+            best, best_score = None, ANSWER_CACHE_SIMILARITY
+            for exact in candidates:
+                score = similarity(key.signature, self._signatures[exact][1])
+                if score >= best_score:
+                    best, best_score = exact, score
+            return best
+
+
+class _SQLiteTier:
+    """Answers persisted in SQLite so they survive restarts and are shared by workers"""
+
+    def __init__(self, path, max_rows):
+        self.path = path
+        self.max_rows = max_rows
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS answers (
+                    key TEXT PRIMARY KEY,
+                    answer TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def reset_connections(self):
+        """Forget connections inherited across fork; SQLite connections must
+        not be used by two processes"""
+        self._local = threading.local()
+
+    def get(self, key):
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            row = conn.execute(
+                "SELECT answer FROM answers WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row:
+                conn.execute("UPDATE answers SET last_used = ? WHERE key = ?", (now, key))
+        return row[0] if row else None
+
+    def set(self, key, answer, ttl):
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO answers (key, answer, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, answer, now + ttl, now),
+            )
+            conn.execute("DELETE FROM answers WHERE expires_at <= ?", (now,))
+            conn.execute("""
+                DELETE FROM answers WHERE key IN (
+                    SELECT key FROM answers ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_rows,))
+
+
+_memory = TTLCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL)
+_disk = _SQLiteTier(ANSWER_CACHE_DB, ANSWER_CACHE_DB_MAX_ROWS) if ANSWER_CACHE_DB else None
+_index = _NearDuplicateIndex(ANSWER_CACHE_SIZE) if ANSWER_CACHE_FUZZY else None
+_flight = SingleFlight("answer")
+_async_flight = AsyncSingleFlight("answer")
+_streams = StreamFlight("answer")
+_async_streams = AsyncStreamFlight("answer")
+if _disk is not None:
+    os.register_at_fork(after_in_child=_disk.reset_connections)
+
+
+def _get_exact(exact):
+    """(answer, "hit" | "disk_hit"), or (None, None)"""
+    answer = _memory.get(exact)
+    if answer is not None:
+        return answer, "hit"
+    if _disk is not None:
+        try:
+            answer = _disk.get(exact)
+        except sqlite3.Error as e:
+            log_event("answer_cache_error", operation="get", error=str(e))
+            return None, None
+        if answer is not None:
+            _memory.set(exact, answer)
+            return answer, "disk_hit"
+    return None, None
+
+
+def lookup(key):
+    """Cached answer for key, or None"""
+    answer, result = _get_exact(key.exact)
+    if answer is None and _index is not None:
+        similar = _index.nearest(key)
+        if similar:
+            answer, result = _get_exact(similar)
+            result = result and "fuzzy_hit"
+    CACHE_LOOKUPS.inc(cache="answer", result=result or "miss")
+    return answer
+
+
+async def lookup_async(key):
+    """lookup for the event loop; the SQLite tier is read on a worker thread"""
+    if _disk is None:
+        return lookup(key)
+    return await asyncio.to_thread(lookup, key)
+
+
+async def store_async(key, answer):
+    """store for the event loop; the SQLite tier is written on a worker thread"""
+    if _disk is None:
+        return store(key, answer)
+    await asyncio.to_thread(store, key, answer)
+
+
+def store(key, answer):
+    if not answer:
+        return
+    _memory.set(key.exact, answer)
+    if _index is not None:
+        _index.add(key)
+    if _disk is not None:
+        try:
+            _disk.set(key.exact, answer, ANSWER_CACHE_TTL)
+        except sqlite3.Error as e:
+            log_event("answer_cache_error", operation="set", error=str(e))
+
+
+def get_or_generate(key, generate):
+    """Return the cached answer for key, or call generate() once for all
+    concurrent callers asking the same question and cache its result"""
+    answer = lookup(key)
+    if answer is not None:
+        return answer
+
+    def load():
+        answer = generate()
+        store(key, answer)
+        return answer
+
+    return _flight.do(key.exact, load)
+
+
+async def get_or_generate_async(key, generate):
+    """get_or_generate for the ASGI app; generate is a coroutine function"""
+    answer = await lookup_async(key)
+    if answer is not None:
+        return answer
+
+    async def load():
+        answer = await generate()
+        await store_async(key, answer)
+        return answer
+
+    return await _async_flight.do(key.exact, load)
+
+
+def stream_or_join(key, generate_chunks):
+    """Text chunks of the answer for key from generate_chunks(), a generator.
+
+    Callers asking the same question while it is being streamed join that
+    generation instead of starting their own, so only the first caller's
+    generate_chunks() runs (and takes an admission slot); the complete
+    answer is cached.
+    """
+    def produce():
+        parts = []
+        for chunk in generate_chunks():
+            parts.append(chunk)
+            yield chunk
+        store(key, "".join(parts))
+
+    return _streams.stream(key.exact, produce)
+
+
+def stream_or_join_async(key, generate_chunks):
+    """stream_or_join for the ASGI app; generate_chunks is an async generator
+    function and the chunks are returned as an async iterator"""
+    async def produce():
+        parts = []
+        async for chunk in generate_chunks():
+            parts.append(chunk)
+            yield chunk
+        await store_async(key, "".join(parts))
+
+    return _async_streams.stream(key.exact, produce)
@@ -0,0 +1,426 @@
+"""Request handling shared by the Flask (web_app.py) and ASGI (asgi_app.py)
+front ends: sessions, prompts, template answers, audio jobs and batches.
+
+Nothing here depends on a web framework or starts background work at
+import; each front end loads the catalog itself before serving.
+"""
+import itertools
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+from contextvars import copy_context
+
+from config.config import MODEL_NAME, ASK_BATCH_MAX_QUESTIONS, ASK_BATCH_CONCURRENCY, CONTEXT_STAGE_TIMEOUTS, get_client
+from services import answer_cache
+from services.context_service import gather_context
+from services.conversation_service import build_conversation_context, record_prompt, record_response
+from services.crop_context import get_crop_context
+from services.crop_matcher import find_crops
+from services.intent_router import route, answer_from_data, answer_from_context
+from services.llm_limiter import LLMOverloaded, llm_slot
+from services.session_store import is_session_id, new_session_id, load_session, save_session, empty_session
+from services.tts_service import submit_tts
+from services.weather_service import get_weather_by_location
+from utils import metrics
+from utils.metrics import STAGE_ERRORS, log_event, span
+
+# Incoming X-Request-ID values that are reused as the request ID
+REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# Language text mapping
+LANG_TEXT = {
+    "English": {
+        "title": "KrishiSahay - Your AI Farming Assistant",
+        "subtitle": "Powered by Advanced Agriculture AI",
+        "question_label": "Farmer's Question",
+        "question_placeholder": "Ask me about farming, crops, weather, fertilizers...",
+        "language_label": "Language",
+        "submit": "Submit",
+        "missing_crop": "Please mention the crop name so I can help you.",
+        "new_chat": "New Chat",
+        "chat_history": "Chat History",
+        "settings": "Settings",
+        "help": "Help",
+        "welcome": "Welcome to KrishiSahay",
+        "welcome_desc": "Your AI-Powered Farming Intelligence Assistant",
+        "ask_crops": "Ask about crops",
+        "ask_crops_desc": "Get expert advice on cultivation",
+        "fertilizer_info": "Fertilizer info",
+        "fertilizer_desc": "Learn about fertilizers & nutrients",
+        "crop_rotation": "Crop rotation",
+        "crop_rotation_desc": "Optimize your crop rotation plan",
+        "weather_info": "Weather info",
+        "weather_desc": "Get local weather insights",
+        "send": "Send message (Ctrl+Enter)",
+        "press_ctrl": "Press Ctrl+Enter to send",
+        "thinking": "KrishiSahay is thinking...",
+        "enable_audio": "Enable audio responses",
+        "enable_animations": "Enable animations",
+        "error": "Error",
+        "unknown_error": "Unknown error occurred",
+        "request_failed": "Request failed",
+        "please_enter": "Please enter a question!"
+    },
+    "Hindi": {
+        "title": "कृषि सहाय - आपका AI कृषि सहायक",
+        "subtitle": "उन्नत कृषि AI द्वारा संचालित",
+        "question_label": "किसान का प्रश्न",
+        "question_placeholder": "मुझसे खेती, फसल, मौसम, उर्वरक के बारे में पूछें...",
+        "language_label": "भाषा",
+        "submit": "जमा करें",
+        "missing_crop": "कृपया फसल का नाम बताएं ताकि मैं आपकी मदद कर सकूं।",
+        "new_chat": "नई बातचीत",
+        "chat_history": "बातचीत का इतिहास",
+        "settings": "सेटिंग्स",
+        "help": "मदद",
+        "welcome": "कृषि सहाय में आपका स्वागत है",
+        "welcome_desc": "आपका AI-संचालित कृषि बुद्धिमत्ता सहायक",
+        "ask_crops": "फसलों के बारे में पूछें",
+        "ask_crops_desc": "खेती पर विशेषज्ञ सलाह प्राप्त करें",
+        "fertilizer_info": "उर्वरक जानकारी",
+        "fertilizer_desc": "उर्वरक और पोषक तत्वों के बारे में जानें",
+        "crop_rotation": "फसल चक्र",
+        "crop_rotation_desc": "अपनी फसल चक्र योजना को अनुकूलित करें",
+        "weather_info": "मौसम की जानकारी",
+        "weather_desc": "स्थानीय मौसम की जानकारी प्राप्त करें",
+        "send": "संदेश भेजें (Ctrl+Enter)",
+        "press_ctrl": "भेजने के लिए Ctrl+Enter दबाएं",
+        "thinking": "कृषि सहाय सोच रहा है...",
+        "enable_audio": "ऑडियो प्रतिक्रिया सक्षम करें",
+        "enable_animations": "एनिमेशन सक्षम करें",
+        "error": "त्रुटि",
+        "unknown_error": "अज्ञात त्रुटि हुई",
+        "request_failed": "अनुरोध विफल",
+        "please_enter": "कृपया एक प्रश्न दर्ज करें!"
+    }
+}
+
+
+def clean_text_for_audio(text):
+    """Clean text for better text-to-speech readability"""
+    # Replace ranges like "60-75" with "60 to 75"
+    text = re.sub(r'(\d+)\s*-\s*(\d+)', r'\1 to \2', text)
+    
+    # Remove extra spaces
+    text = re.sub(r'\s+', ' ', text)
+    
+    return text.strip()
+
+
+def resolve_session(data, question):
+    """Session id and stored session for a request.
+
+    Clients send only `session_id`; a `chat_history` list is accepted to
+    resume a conversation the server no longer has, and replaces the
+    stored messages.
+    """
+    session_id = data.get('session_id')
+    if not is_session_id(session_id):
+        session_id = new_session_id()
+
+    chat_history = data.get('chat_history')
+    if not chat_history:
+        return session_id, load_session(session_id)
+
+    messages = [
+        {'type': 'user' if msg.get('type') == 'user' else 'assistant', 'content': str(msg.get('content', ''))}
+        for msg in chat_history if isinstance(msg, dict)
+    ]
+    # Older clients include the current question as the last message
+    if messages and messages[-1] == {'type': 'user', 'content': question}:
+        messages.pop()
+    return session_id, save_session(session_id, messages)
+
+
+def build_prompt(question, language, session, crop_found, client_ip):
+    """Gather context for a question and build the Gemini prompt;
+    crop_found is detect_crop(question), computed once per request.
+
+    Returns (prompt, answer_key); answer_key is None when the question
+    depends on earlier turns of the conversation and so cannot be cached.
+    """
+    # One CropContext from the catalog snapshot; location and weather are fetched in parallel
+    context = gather_context(crop_found, language, client_ip)
+    return compose_prompt(question, language, session, crop_found, context)
+
+
+def detect_crop(question):
+    """The first crop named in the question (one pass over it), or None"""
+    crops_found = find_crops(question)
+    return crops_found[0] if crops_found else None
+
+
+def is_standalone(question, crop_found):
+    """True when a question does not depend on earlier turns: it asks about
+    the weather, or names its crop and asks for a routed intent. Its answer
+    is then the same in any conversation."""
+    intent = route(question).name
+    return intent == "weather" or (crop_found is not None and intent is not None)
+
+
+def compose_prompt(question, language, session, crop_found, context):
+    """Build the Gemini prompt from gathered context; see build_prompt"""
+    # Earlier turns from the session, capped by token budget; standalone
+    # questions leave them out so their answers can be cached and shared
+    conversation_context = ""
+    if not is_standalone(question, crop_found):
+        conversation_context = build_conversation_context(session['messages'], session['summary'])
+    
+    crop_context = context["crop"].for_model() if "crop" in context else ""
+    weather_text, weather = context.get("weather", (None, None))
+    weather_data = weather_text or "Weather data not available."
+    
+    # Create prompt for Gemini with conversation context
+    if crop_context:
+        prompt = f"""
+        You are an expert agricultural advisor. Answer questions directly and practically.
+        
+        {conversation_context}
+        
+        Crop Information: {crop_context}
+        
+        Current Weather: {weather_data}
+        
+        Farmer's Question: {question}
+        
+        LANGUAGE: You MUST respond ONLY in {language}. Do not mix languages. Every word must be in {language}.
+        
+        INSTRUCTIONS:
+        - Provide direct, practical advice without any greetings or flowery language.
+        - Do not start with "Namaste", "Hello", or any cultural greetings.
+        - Write in simple, easy-to-understand language.
+        - Format as continuous paragraphs without bullet points.
+        - This will be converted to audio, so keep it natural and conversational.
+        - Reference previous conversation if relevant to maintain context.
+        - Keep response to 2-3 paragraphs maximum.
+        """
+    else:
+        prompt = f"""
+        You are an expert agricultural advisor. Answer questions directly and practically.
+        
+        {conversation_context}
+        
+        Current Location Weather: {weather_data}
+        
+        Farmer's Question: {question}
+        
+        LANGUAGE: You MUST respond ONLY in {language}. Do not mix languages. Every word must be in {language}.
+        
+        INSTRUCTIONS:
+        - Provide direct, practical advice without any greetings or flowery language.
+        - Do not start with "Namaste", "Hello", or any cultural greetings.
+        - Write in simple, easy-to-understand language.
+        - Format as continuous paragraphs without bullet points.
+        - This will be converted to audio, so keep it natural and conversational.
+        - Reference previous conversation if relevant to maintain context.
+        - Keep response to 2-3 paragraphs maximum.
+        """
+    
+    answer_key = None
+    if not conversation_context:
+        answer_key = answer_cache.make_key(question, crop_found, language, weather)
+    return prompt, answer_key
+
+
+def direct_answer(question, language, crop_found, client_ip):
+    """Template answer for confident weather, price, fertilizer and rotation
+    questions, or None when the question needs the model"""
+    answer, _ = answer_from_data(route(question), crop_found, language, client_ip)
+    return answer
+
+
+def audio_fields(answer, language):
+    """Queue audio for an answer and describe where the client can poll for it"""
+    audio_job_id = submit_tts(clean_text_for_audio(answer), language)
+    return {
+        'audio_job_id': audio_job_id,
+        'audio_status_url': f'/audio/status/{audio_job_id}' if audio_job_id else None
+    }
+
+
+def sse_event(event, data):
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def generate_answer(prompt):
+    """One Gemini call, admitted by the LLM limiter"""
+    record_prompt(prompt)
+    with llm_slot(), span('llm'):
+        response = get_client().models.generate_content(model=MODEL_NAME, contents=prompt)
+    record_response(response.text)
+    return response.text
+
+
+def stream_answer(prompt):
+    """Text chunks of one streamed Gemini call; admission is up to the caller (see admitted_stream)"""
+    record_prompt(prompt)
+    parts = []
+    started = time.perf_counter()
+    with span('llm'):
+        for chunk in get_client().models.generate_content_stream(model=MODEL_NAME, contents=prompt):
+            if chunk.text:
+                if not parts:
+                    metrics.STAGE_SECONDS.observe(time.perf_counter() - started, stage='llm_first_token')
+                parts.append(chunk.text)
+                yield chunk.text
+    record_response(''.join(parts))
+
+
+def admitted_stream(prompt):
+    """stream_answer holding an admission slot until the stream ends"""
+    with llm_slot():
+        yield from stream_answer(prompt)
+
+
+def started_stream(chunks):
+    """chunks, once the first one has arrived, so a model call that cannot
+    start (LLMOverloaded) fails before the response does"""
+    chunks = iter(chunks)
+    for first in chunks:
+        return itertools.chain([first], chunks)
+    return iter(())
+
+
+def batch_error(data):
+    """(message, status) when a batch request cannot be accepted, else None"""
+    questions = data.get('questions') if isinstance(data, dict) else None
+    if not isinstance(questions, list) or not questions:
+        return 'questions must be a non-empty list', 400
+    if len(questions) > ASK_BATCH_MAX_QUESTIONS:
+        return f'At most {ASK_BATCH_MAX_QUESTIONS} questions per batch', 413
+    return None
+
+
+def batch_entry_error(entry):
+    """Why a batch entry cannot be answered, or None"""
+    if not isinstance(entry, dict):
+        return 'Each entry must be an object'
+    question, language, location = entry.get('question'), entry.get('language'), entry.get('location')
+    if question is not None and not isinstance(question, str):
+        return 'question must be a string'
+    if not (question or '').strip():
+        return 'Question cannot be empty'
+    # Checked as a string first: a list or object cannot be looked up in LANG_TEXT
+    if language not in (None, '') and not (isinstance(language, str) and language in LANG_TEXT):
+        return f"language must be one of: {', '.join(LANG_TEXT)}"
+    if location is not None and not isinstance(location, str):
+        return 'location must be a string'
+    return None
+
+
+def ndjson_line(result):
+    return json.dumps(result, ensure_ascii=False) + '\n'
+
+
+def _timed_weather(location, language):
+    with span('weather'):
+        return get_weather_by_location(location, language)
+
+
+def _answer_batch_question(question, language, intent, crop, context, weather, weather_deadline):
+    """Answer one distinct batch question from its shared crop context and weather lookup"""
+    if weather is not None:
+        try:
+            context['weather'] = weather.result(timeout=max(weather_deadline - time.monotonic(), 0))
+        except TimeoutError:
+            STAGE_ERRORS.inc(stage='weather', reason='timeout')
+        except Exception as e:
+            STAGE_ERRORS.inc(stage='weather', reason='error')
+            log_event('context_stage_error', stage='weather', error=str(e))
+
+    answer = answer_from_context(intent, crop, language, context)
+    if answer is not None:
+        return answer
+    # Batch questions carry no conversation, so every prompt is cacheable
+    prompt, answer_key = compose_prompt(question, language, empty_session(), crop, context)
+    return answer_cache.get_or_generate(answer_key, lambda: generate_answer(prompt))
+
+
+def _error_outcome(error):
+    """The result fields for a batch question whose answer raised `error`"""
+    if isinstance(error, LLMOverloaded):
+        return {'status': 503, 'error': 'The assistant is busy right now. Please try again shortly.',
+                'retry_after': error.retry_after}
+    return {'status': 500, 'error': f'Error processing request: {str(error)}'}
+
+
+def _batch_results(entries, language, outcome):
+    """One result line per (id, audio) entry sharing an outcome"""
+    for entry_id, audio in entries:
+        result = {'id': entry_id, **outcome}
+        if audio and outcome['status'] == 200:
+            result.update(audio_fields(outcome['answer'], language))
+        yield result
+
+
+def answer_batch(questions):
+    """Answer the entries of a batch request and yield one result per entry
+    as soon as it is ready, each with its own status.
+
+    Identical questions (same text, language and location) are answered
+    once; each crop's context is read once per language and each
+    location's weather fetched once for the whole batch. At most
+    ASK_BATCH_CONCURRENCY questions are worked on at a time, and every
+    model call still goes through the LLM limiter. Batch questions do not
+    use chat sessions.
+    """
+    groups = {}  # (question, language, location) -> [(id, audio)]
+    for index, entry in enumerate(questions):
+        entry_id = entry.get('id', index) if isinstance(entry, dict) else index
+        error = batch_entry_error(entry)
+        if error:
+            yield {'id': entry_id, 'status': 400, 'error': error}
+            continue
+        key = (entry['question'].strip(), entry.get('language') or 'English', (entry.get('location') or '').strip())
+        groups.setdefault(key, []).append((entry_id, bool(entry.get('audio'))))
+    if not groups:
+        return
+
+    executor = ThreadPoolExecutor(max_workers=min(ASK_BATCH_CONCURRENCY, len(groups)), thread_name_prefix='ask-batch')
+    try:
+        # Weather lookups are queued first, so questions never wait on one that has not started
+        weather_deadline = time.monotonic() + CONTEXT_STAGE_TIMEOUTS['weather']
+        weather = {}
+        for _, language, location in groups:
+            if location and (location, language) not in weather:
+                weather[(location, language)] = executor.submit(
+                    copy_context().run, _timed_weather, location, language
+                )
+
+        crop_contexts = {}
+        jobs = {}
+        for key in groups:
+            question, language, location = key
+            intent, crop = route(question), detect_crop(question)
+            context = {}
+            if crop:
+                try:
+                    if (crop, language) not in crop_contexts:
+                        with span('crop'):
+                            crop_contexts[(crop, language)] = get_crop_context(crop, language)
+                    context['crop'] = crop_contexts[(crop, language)]
+                    # Price, fertilizer and rotation templates need nothing else
+                    answer = None if intent.name == 'weather' else answer_from_context(intent, crop, language, context)
+                except Exception as e:
+                    yield from _batch_results(groups[key], language, _error_outcome(e))
+                    continue
+                if answer is not None:
+                    yield from _batch_results(groups[key], language, {'status': 200, 'answer': answer})
+                    continue
+            job = executor.submit(
+                copy_context().run, _answer_batch_question,
+                question, language, intent, crop, context, weather.get((location, language)), weather_deadline,
+            )
+            jobs[job] = key
+
+        for job in as_completed(jobs):
+            try:
+                outcome = {'status': 200, 'answer': job.result()}
+            except Exception as e:
+                outcome = _error_outcome(e)
+            yield from _batch_results(groups[jobs[job]], jobs[job][1], outcome)
+    finally:
+        # Also reached when the client goes away mid-stream
+        executor.shutdown(wait=False, cancel_futures=True)
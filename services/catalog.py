@@ -0,0 +1,363 @@
+"""In-process snapshot of the crop, fertilizer and rotation catalog.
+
+The tables are small and change rarely, so they are loaded once into an
+immutable snapshot and the ``retrieve_*`` services answer from memory.
+Until the database can be reached, the snapshot comes from the local
+Feather files kept by services.catalog_sync, if there are any.
+A new snapshot is built in the background when the current one is older
+than CATALOG_TTL_SECONDS, or immediately when Postgres sends a
+notification on CATALOG_NOTIFY_CHANNEL, and then swapped in atomically.
+"""
+import json
+import os
+import select
+import threading
+import time
+from decimal import Decimal
+from functools import partial
+from types import MappingProxyType
+
+from psycopg2 import errors, sql
+from psycopg2.extras import register_default_json
+
+from config.config import DATABASE_URL, CATALOG_TTL_SECONDS, CATALOG_NOTIFY_CHANNEL
+from config.database import db_connection, get_connection
+from utils.metrics import FALLBACKS, log_event, span
+
+CROP_COLUMNS = (
+    "crop_id",
+    "crop_name",
+    "crop_name_hi",
+    "crop_type",
+    "description",
+    "description_hi",
+    "suitable_climate",
+    "suitable_soil",
+    "ideal_temperature_celsius",
+    "water_requirement",
+    "growing_season",
+    "price_per_kg_inr",
+)
+
+
+class CatalogSnapshot:
+    """Read-only view of the catalog tables, keyed by lowercase crop name"""
+
+    __slots__ = ("crops", "fertilizers", "rotations", "source", "loaded_at")
+
+    def __init__(self, crops, fertilizers, rotations, source):
+        # crops: name -> column mapping
+        # fertilizers: name -> ((fertilizer_name, type, nutrients, stage, price), ...)
+        # rotations: name -> ((next_crop, next_crop_hi, season, reason, soil,
+        #                      pest, gap_days, precautions), ...)
+        self.crops = MappingProxyType(
+            {name: MappingProxyType(dict(row)) for name, row in crops.items()}
+        )
+        self.fertilizers = MappingProxyType(
+            {name: tuple(rows) for name, rows in fertilizers.items()}
+        )
+        self.rotations = MappingProxyType(
+            {name: tuple(rows) for name, rows in rotations.items()}
+        )
+        self.source = source
+        self.loaded_at = time.time()
+
+
+EMPTY_SNAPSHOT = CatalogSnapshot({}, {}, {}, source="fallback")
+
+
+# One round trip for the whole catalog: every crop row with its fertilizers
+# and rotation successors aggregated into JSON arrays
+SNAPSHOT_QUERY = f"""
+    WITH crop_fertilizer_rows AS (
+        SELECT
+            cf.crop_id,
+            json_agg(json_build_array(
+                f.fertilizer_name,
+                f.type,
+                f.nutrients,
+                f.application_stage,
+                f.price_per_kg_inr
+            ) ORDER BY f.fertilizer_id) AS rows
+        FROM crop_fertilizers cf
+        JOIN fertilizers f ON cf.fertilizer_id = f.fertilizer_id
+        GROUP BY cf.crop_id
+    ),
+    crop_rotation_rows AS (
+        SELECT
+            r.current_crop_id AS crop_id,
+            json_agg(json_build_array(
+                next.crop_name,
+                next.crop_name_hi,
+                r.recommended_season,
+                r.rotation_reason,
+                r.soil_nutrient_effect,
+                r.pest_disease_benefit,
+                r.recommended_gap_days,
+                r.special_precautions
+            ) ORDER BY r.rotation_id) AS rows
+        FROM crop_rotation_plan r
+        JOIN crops next ON r.next_crop_id = next.crop_id
+        GROUP BY r.current_crop_id
+    )
+    SELECT {', '.join('c.' + column for column in CROP_COLUMNS)}, f.rows, r.rows
+    FROM crops c
+    LEFT JOIN crop_fertilizer_rows f ON f.crop_id = c.crop_id
+    LEFT JOIN crop_rotation_rows r ON r.crop_id = c.crop_id
+    ORDER BY c.crop_id
+"""
+
+
+# Per-table queries for a database that has not been migrated to the
+# crop_fertilizers association yet: fertilizers are linked through their
+# used_for_crops lists instead, as load_snapshot_from_cache does
+UNMIGRATED_QUERIES = (
+    f"SELECT {', '.join(CROP_COLUMNS)} FROM crops ORDER BY crop_id",
+    """
+        SELECT fertilizer_name, type, nutrients, application_stage, price_per_kg_inr, used_for_crops
+        FROM fertilizers
+        ORDER BY fertilizer_id
+    """,
+    """
+        SELECT
+            lower(trim(c1.crop_name)),
+            c2.crop_name,
+            c2.crop_name_hi,
+            r.recommended_season,
+            r.rotation_reason,
+            r.soil_nutrient_effect,
+            r.pest_disease_benefit,
+            r.recommended_gap_days,
+            r.special_precautions
+        FROM crop_rotation_plan r
+        JOIN crops c1 ON r.current_crop_id = c1.crop_id
+        JOIN crops c2 ON r.next_crop_id = c2.crop_id
+        ORDER BY r.rotation_id
+    """,
+)
+
+
+def link_fertilizers(rows, crop_names):
+    """name -> fertilizer rows, from (fertilizer_name, type, nutrients,
+    stage, price, used_for_crops) rows"""
+    fertilizers = {}
+    for *fertilizer, used_for_crops in rows:
+        names = {name.strip().lower() for name in (used_for_crops or "").split(",")}
+        for name in names & crop_names:
+            fertilizers.setdefault(name, []).append(tuple(fertilizer))
+    return fertilizers
+
+
+def _load_unmigrated(cur):
+    crop_query, fertilizer_query, rotation_query = UNMIGRATED_QUERIES
+    cur.execute(crop_query)
+    crops = {}
+    for row in cur.fetchall():
+        record = dict(zip(CROP_COLUMNS, row))
+        if record["crop_name"]:
+            crops.setdefault(record["crop_name"].strip().lower(), record)
+    cur.execute(fertilizer_query)
+    fertilizers = link_fertilizers(cur.fetchall(), crops.keys())
+    cur.execute(rotation_query)
+    rotations = {}
+    for name, *rotation in cur.fetchall():
+        rotations.setdefault(name, []).append(tuple(rotation))
+    return CatalogSnapshot(crops, fertilizers, rotations, source="database")
+
+
+def load_snapshot_from_database():
+    """Read the catalog tables in a single query over one pooled connection"""
+    with db_connection() as conn:
+        cur = conn.cursor()
+        # Prices inside the JSON arrays come back as Decimal, like the columns
+        register_default_json(cur, loads=partial(json.loads, parse_float=Decimal))
+        try:
+            cur.execute(SNAPSHOT_QUERY)
+        except errors.UndefinedTable as e:
+            conn.rollback()
+            log_event(
+                "catalog_query_error", error=e.diag.message_primary,
+                hint="run python -m config.migrations; loading the tables separately",
+            )
+            return _load_unmigrated(cur)
+        rows = cur.fetchall()
+
+    crops, fertilizers, rotations = {}, {}, {}
+    width = len(CROP_COLUMNS)
+    for row in rows:
+        record = dict(zip(CROP_COLUMNS, row[:width]))
+        if not record["crop_name"]:
+            continue
+        name = record["crop_name"].strip().lower()
+        crops.setdefault(name, record)
+        # Crops sharing a name pool their fertilizers and rotations
+        fertilizer_rows, rotation_rows = row[width:]
+        if fertilizer_rows:
+            fertilizers.setdefault(name, []).extend(map(tuple, fertilizer_rows))
+        if rotation_rows:
+            rotations.setdefault(name, []).extend(map(tuple, rotation_rows))
+
+    return CatalogSnapshot(crops, fertilizers, rotations, source="database")
+
+
+def load_snapshot_from_cache():
+    """Snapshot from the Feather files written by services.catalog_sync, or
+    None if there are none. The sheets carry no rotations, and crops get no
+    crop_id; fertilizers are linked through their used_for_crops lists."""
+    from services.catalog_sync import read_cache
+    crop_rows = read_cache("crops")
+    if crop_rows is None:
+        return None
+    crops = {}
+    for row in crop_rows:
+        record = {column: row.get(column) for column in CROP_COLUMNS}
+        crops.setdefault(record["crop_name"].lower(), record)
+
+    fertilizers = link_fertilizers(
+        (
+            (row["fertilizer_name"], row["type"], row["nutrients"],
+             row["application_stage"], row["price_per_kg_inr"], row["used_for_crops"])
+            for row in read_cache("fertilizers") or ()
+        ),
+        crops.keys(),
+    )
+
+    return CatalogSnapshot(crops, fertilizers, {}, source="local")
+
+
+# Seconds between reload attempts while the database is unreachable
+RETRY_SECONDS = 30
+
+_snapshot = None
+_refresh_lock = threading.Lock()
+_refreshing = False
+# No database load attempted yet, so the first TTL check always starts one
+_last_attempt = float("-inf")
+_last_ok = False
+
+
+def refresh_snapshot():
+    """Load a fresh snapshot and swap it in; keep the old one if loading fails"""
+    global _snapshot, _last_attempt, _last_ok
+    _last_attempt = time.monotonic()
+    try:
+        with span("db_catalog"):
+            snapshot = load_snapshot_from_database()
+    except Exception as e:
+        log_event("catalog_load_error", error=str(e), serving="previous" if _snapshot else "fallback")
+        FALLBACKS.inc(kind="catalog")
+        _last_ok = False
+        if _snapshot is None:
+            _snapshot = _local_snapshot() or EMPTY_SNAPSHOT
+        return _snapshot
+    _last_ok = True
+    _snapshot = snapshot
+    return snapshot
+
+
+def _local_snapshot():
+    try:
+        snapshot = load_snapshot_from_cache()
+    except Exception as e:
+        log_event("catalog_cache_error", error=str(e))
+        return None
+    if snapshot is not None:
+        log_event("catalog_cache_served", crops=len(snapshot.crops))
+    return snapshot
+
+
+def _refresh_in_background():
+    global _refreshing
+    with _refresh_lock:
+        if _refreshing:
+            return
+        _refreshing = True
+
+    def run():
+        global _refreshing
+        try:
+            refresh_snapshot()
+        finally:
+            _refreshing = False
+
+    threading.Thread(target=run, name="catalog-refresh", daemon=True).start()
+
+
+def get_snapshot():
+    """Return the current snapshot without blocking on the database.
+
+    The first call serves the locally synced catalog when there is one and
+    loads the database snapshot in the background; only without it does the
+    first call wait for the database. Afterwards an expired snapshot keeps
+    being served while a replacement loads in the background.
+    """
+    global _snapshot
+    snapshot = _snapshot
+    if snapshot is None:
+        with _refresh_lock:
+            if _snapshot is None:
+                _snapshot = _local_snapshot()
+                if _snapshot is None:
+                    refresh_snapshot()
+        snapshot = _snapshot
+    ttl = CATALOG_TTL_SECONDS if _last_ok else RETRY_SECONDS
+    if time.monotonic() - _last_attempt > ttl:
+        _refresh_in_background()
+    return snapshot
+
+
+def _listen_forever(channel):
+    backoff = 1
+    while True:
+        conn = None
+        try:
+            conn = get_connection()
+            conn.autocommit = True
+            conn.cursor().execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+            backoff = 1
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                if conn.notifies:
+                    conn.notifies.clear()
+                    refresh_snapshot()
+        except Exception as e:
+            log_event("catalog_listener_error", error=str(e), retry_seconds=backoff)
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        time.sleep(backoff)
+        backoff = min(backoff * 2, 60)
+
+
+_listener = None
+
+
+def start_catalog_listener(channel=CATALOG_NOTIFY_CHANNEL):
+    """Refresh the snapshot whenever Postgres sends NOTIFY on channel"""
+    global _listener
+    if _listener is None and channel and DATABASE_URL:
+        _listener = threading.Thread(
+            target=_listen_forever, args=(channel,), name="catalog-listener", daemon=True
+        )
+        _listener.start()
+    return _listener
+
+
+def _reset_after_fork():
+    """The parent's listener and refresh threads do not exist in a forked
+    worker; the snapshot itself is kept (and shared copy-on-write)"""
+    global _refresh_lock, _refreshing, _listener, _last_attempt
+    if _refreshing:
+        # The parent's load never finishes here, so retry on the first request
+        _last_attempt = float("-inf")
+    _refresh_lock = threading.Lock()
+    _refreshing = False
+    _listener = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
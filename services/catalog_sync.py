@@ -0,0 +1,219 @@
+"""Sync the crop and fertilizer sheets into local Feather files and Postgres.
+
+    python -m services.catalog_sync            # fetch, store locally, upsert
+    python -m services.catalog_sync --no-db    # fetch and store locally only
+
+Sheets are fetched with If-None-Match / If-Modified-Since from the last
+successful sync, so an unchanged sheet costs one 304 and no parsing.
+CROP_SHEET_URL / FERTILIZER_SHEET_URL may also be local CSV paths, which
+are compared by modification time (see bench.fixtures --sheets). A changed
+sheet is normalized to the catalog columns (a sheet missing one of them
+fails the sync), written to CATALOG_CACHE_DIR as Feather, and upserted by
+COPYing it into a temporary table and updating/inserting from there in
+one transaction. Rows missing from a
+sheet are left in the database: rotations and sessions refer to them.
+"""
+import argparse
+import io
+import json
+import os
+
+import requests
+from psycopg2 import sql
+
+from config.config import CATALOG_CACHE_DIR, CATALOG_SYNC_TIMEOUT, CROP_SHEET_URL, DATABASE_URL, FERTILIZER_SHEET_URL
+from config.database import db_connection
+from services.catalog import CROP_COLUMNS
+from utils.data_loader import parse_sheet
+
+FERTILIZER_COLUMNS = (
+    "fertilizer_name",
+    "type",
+    "nutrients",
+    "application_stage",
+    "price_per_kg_inr",
+    "used_for_crops",
+)
+
+# name -> (source, key column, columns); upserted in this order so the
+# fertilizer triggers can link to crops added by the same sync
+SHEETS = {
+    "crops": (CROP_SHEET_URL, "crop_name", CROP_COLUMNS[1:]),
+    "fertilizers": (FERTILIZER_SHEET_URL, "fertilizer_name", FERTILIZER_COLUMNS),
+}
+NUMERIC_COLUMNS = ("price_per_kg_inr",)
+STATE_FILE = "sync_state.json"
+
+
+def cache_path(name):
+    return os.path.join(CATALOG_CACHE_DIR, f"{name}.feather")
+
+
+def load_state():
+    try:
+        with open(os.path.join(CATALOG_CACHE_DIR, STATE_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state):
+    path = os.path.join(CATALOG_CACHE_DIR, STATE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+
+def fetch_sheet(source, validators):
+    """(CSV bytes, new validators), or (None, validators) when unchanged"""
+    if not source.startswith(("http://", "https://")):
+        mtime = os.path.getmtime(source)
+        if validators.get("mtime") == mtime:
+            return None, validators
+        with open(source, "rb") as f:
+            return f.read(), {"mtime": mtime}
+
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    response = requests.get(source, headers=headers, timeout=CATALOG_SYNC_TIMEOUT)
+    if response.status_code == 304:
+        return None, validators
+    response.raise_for_status()
+    return response.content, {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+
+
+def normalize_sheet(data, key, columns):
+    """Catalog columns only, one row per (case-insensitive) key, blanks as nulls.
+
+    Raises ValueError if the sheet lacks any of the columns: upserting it
+    would overwrite the stored values with nulls.
+    """
+    import pandas as pd
+    df = parse_sheet(data)
+    missing = [column for column in columns if column not in df.columns]
+    if missing:
+        raise ValueError(f"sheet is missing columns: {', '.join(missing)}")
+    df = df[list(columns)]
+    for column in columns:
+        if column in NUMERIC_COLUMNS:
+            df[column] = pd.to_numeric(df[column], errors="coerce")
+        else:
+            df[column] = df[column].astype("string").str.strip().replace("", pd.NA)
+    df = df[df[key].notna()]
+    df = df[~df[key].str.lower().duplicated()]
+    return df.reset_index(drop=True)
+
+
+def write_cache(name, df):
+    """Replace the Feather file atomically so readers never see half a file"""
+    os.makedirs(CATALOG_CACHE_DIR, exist_ok=True)
+    path = cache_path(name)
+    df.to_feather(path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+
+def read_cache(name):
+    """Rows of a synced sheet as dicts, or None if it has not been synced"""
+    path = cache_path(name)
+    if not os.path.exists(path):
+        return None
+    from pyarrow import feather  # memory-mapped, without going through pandas
+    return feather.read_table(path, memory_map=True).to_pylist()
+
+
+def upsert(cur, table, key, columns, df):
+    """COPY df into a temp table, then update changed rows and insert new
+    ones. The catalog tables have no unique key on the name, so rows are
+    matched on lower(name) rather than with ON CONFLICT. Returns
+    (updated, inserted)."""
+    staging = sql.Identifier(f"{table}_sync")
+    target = sql.Identifier(table)
+    cols = sql.SQL(", ").join(map(sql.Identifier, columns))
+    key_match = sql.SQL("lower(t.{key}) = lower(s.{key})").format(key=sql.Identifier(key))
+
+    cur.execute(sql.SQL(
+        "CREATE TEMP TABLE {staging} ON COMMIT DROP AS SELECT {cols} FROM {target} WITH NO DATA"
+    ).format(staging=staging, cols=cols, target=target))
+    buffer = io.StringIO(df.to_csv(index=False, header=False))
+    cur.copy_expert(
+        sql.SQL("COPY {staging} ({cols}) FROM STDIN WITH (FORMAT csv)").format(staging=staging, cols=cols),
+        buffer,
+    )
+
+    cur.execute(sql.SQL("""
+        UPDATE {target} t SET {assignments}
+        FROM {staging} s
+        WHERE {key_match} AND ({t_cols}) IS DISTINCT FROM ({s_cols})
+    """).format(
+        target=target,
+        staging=staging,
+        key_match=key_match,
+        assignments=sql.SQL(", ").join(
+            sql.SQL("{col} = s.{col}").format(col=sql.Identifier(c)) for c in columns
+        ),
+        t_cols=sql.SQL(", ").join(sql.SQL("t.{}").format(sql.Identifier(c)) for c in columns),
+        s_cols=sql.SQL(", ").join(sql.SQL("s.{}").format(sql.Identifier(c)) for c in columns),
+    ))
+    updated = cur.rowcount
+
+    cur.execute(sql.SQL("""
+        INSERT INTO {target} ({cols})
+        SELECT {cols} FROM {staging} s
+        WHERE NOT EXISTS (SELECT 1 FROM {target} t WHERE {key_match})
+    """).format(target=target, cols=cols, staging=staging, key_match=key_match))
+    return updated, cur.rowcount
+
+
+def sync_catalog(to_database=True, force=False):
+    """Fetch changed sheets, store them locally and upsert them; returns
+    {sheet: "not modified" | (updated, inserted) | rows stored}"""
+    state = load_state()
+    changed = {}
+    results = {}
+    for name, (source, key, columns) in SHEETS.items():
+        # Without the local file a 304 would leave nothing to load
+        validators = state.get(name, {}) if os.path.exists(cache_path(name)) and not force else {}
+        data, validators = fetch_sheet(source, validators)
+        if data is None:
+            results[name] = "not modified"
+            continue
+        changed[name] = (normalize_sheet(data, key, columns), validators)
+
+    # Written once every changed sheet is valid, so a bad sheet fails the
+    # whole sync and leaves the local files as they were
+    for name, (df, _) in changed.items():
+        write_cache(name, df)
+        results[name] = len(df)
+
+    if changed and to_database and DATABASE_URL:
+        with db_connection() as conn:
+            cur = conn.cursor()
+            for name, (df, _) in changed.items():
+                _, key, columns = SHEETS[name]
+                results[name] = upsert(cur, name, key, columns, df)
+
+    # Saved only once everything succeeded, so a failed upsert is retried
+    for name, (_, validators) in changed.items():
+        state[name] = validators
+    if changed:
+        save_state(state)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync the crop and fertilizer sheets")
+    parser.add_argument("--no-db", action="store_true", help="only update the local Feather files")
+    parser.add_argument("--force", action="store_true", help="ignore ETag/Last-Modified and refetch")
+    args = parser.parse_args()
+    for name, result in sync_catalog(to_database=not args.no_db, force=args.force).items():
+        if isinstance(result, tuple):
+            result = f"{result[0]} updated, {result[1]} inserted"
+        elif isinstance(result, int):
+            result = f"{result} rows stored locally"
+        print(f"{name}: {result}")
@@ -0,0 +1,163 @@
+"""Concurrent gathering of the context used to build LLM prompts."""
+import asyncio
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from contextvars import copy_context
+
+from config.config import CONTEXT_BUDGET_SECONDS, CONTEXT_MAX_WORKERS, CONTEXT_STAGE_TIMEOUTS
+from services.crop_context import get_crop_context
+from services.location_service import get_location_from_ip, get_location_from_ip_async
+from services.weather_service import get_weather_by_location, get_weather_by_location_async
+from utils.metrics import STAGE_ERRORS, log_event, span
+
+ALL_STAGES = ("crop", "weather")
+
+_executor = ThreadPoolExecutor(max_workers=CONTEXT_MAX_WORKERS, thread_name_prefix="context")
+
+
+def _timed(stage, fn, *args):
+    with span(stage):
+        return fn(*args)
+
+
+def _submit(stage, fn, *args):
+    """Run fn on the pool as a timed stage of the current request"""
+    return _executor.submit(copy_context().run, _timed, stage, fn, *args)
+
+
+def _deadlines():
+    """deadline(stage) for a gathering that starts now"""
+    started = time.monotonic()
+    budget = started + CONTEXT_BUDGET_SECONDS
+
+    def deadline(stage):
+        return min(started + CONTEXT_STAGE_TIMEOUTS[stage], budget)
+
+    return deadline
+
+
+def _copy_outcome(source, target):
+    try:
+        target.set_result(source.result())
+    except BaseException as e:
+        target.set_exception(e)
+
+
+def _chain_weather(location_future, language):
+    """Future for the weather stage, submitted to the pool only once the
+    location is known so that no worker sits blocked waiting for it"""
+    weather_future = Future()
+    context = copy_context()
+
+    def on_location(done):
+        if not weather_future.set_running_or_notify_cancel():
+            return
+        try:
+            location = done.result()
+        except BaseException as e:
+            weather_future.set_exception(e)
+            return
+        if not location:
+            weather_future.set_result((None, None))
+            return
+        fetch = _executor.submit(context.run, _timed, "weather", get_weather_by_location, location, language)
+        fetch.add_done_callback(lambda fetched: _copy_outcome(fetched, weather_future))
+
+    location_future.add_done_callback(on_location)
+    return weather_future
+
+
+def _crop_stage(crop, language, stages, results):
+    """The CropContext for crop, read inline: it comes from the in-memory snapshot"""
+    if crop and "crop" in stages:
+        try:
+            results["crop"] = _timed("crop", get_crop_context, crop, language)
+        except Exception as e:
+            STAGE_ERRORS.inc(stage="crop", reason="error")
+            log_event("context_stage_error", stage="crop", error=str(e))
+
+
+def gather_context(crop, language, client_ip=None, stages=ALL_STAGES):
+    """Run the requested lookups in parallel and return {stage: result}.
+
+    "crop" is a CropContext (see services.crop_context), "weather" a
+    (text, data) pair. Each stage has its own deadline
+    (CONTEXT_STAGE_TIMEOUTS, measured from the start of the call) and
+    everything is capped at CONTEXT_BUDGET_SECONDS. A stage that fails or
+    misses its deadline is simply absent from the result, so the prompt is
+    built without it. The weather stage starts when the location lookup it
+    depends on finishes, and its deadline covers both.
+    """
+    deadline = _deadlines()
+    futures = {}
+    if "location" in stages or "weather" in stages:
+        futures["location"] = _submit("location", get_location_from_ip, client_ip)
+    if "weather" in stages:
+        futures["weather"] = _chain_weather(futures["location"], language)
+
+    results = {}
+    _crop_stage(crop, language, stages, results)
+    for stage, future in futures.items():
+        if stage not in stages:
+            continue
+        try:
+            results[stage] = future.result(timeout=max(deadline(stage) - time.monotonic(), 0))
+        except TimeoutError:
+            future.cancel()
+            STAGE_ERRORS.inc(stage=stage, reason="timeout")
+            log_event("context_stage_timeout", stage=stage)
+        except Exception as e:
+            STAGE_ERRORS.inc(stage=stage, reason="error")
+            log_event("context_stage_error", stage=stage, error=str(e))
+    return results
+
+
+async def _timed_async(stage, coro):
+    with span(stage):
+        return await coro
+
+
+async def _weather_stage_async(location_task, language):
+    location = await location_task
+    if not location:
+        return None, None
+    return await get_weather_by_location_async(location, language)
+
+
+async def gather_context_async(crop, language, client_ip=None, stages=ALL_STAGES):
+    """gather_context for the ASGI app, with the same stages and deadlines.
+
+    Location and weather are awaited concurrently on the event loop.
+    """
+    deadline = _deadlines()
+    results = {}
+    _crop_stage(crop, language, stages, results)
+
+    tasks = {}
+    if "location" in stages or "weather" in stages:
+        tasks["location"] = asyncio.ensure_future(
+            _timed_async("location", get_location_from_ip_async(client_ip))
+        )
+    if "weather" in stages:
+        tasks["weather"] = asyncio.ensure_future(
+            _timed_async("weather", _weather_stage_async(tasks["location"], language))
+        )
+
+    try:
+        for stage, task in tasks.items():
+            if stage not in stages:
+                continue
+            done, _ = await asyncio.wait({task}, timeout=max(deadline(stage) - time.monotonic(), 0))
+            if not done:
+                STAGE_ERRORS.inc(stage=stage, reason="timeout")
+                log_event("context_stage_timeout", stage=stage)
+                continue
+            try:
+                results[stage] = task.result()
+            except Exception as e:
+                STAGE_ERRORS.inc(stage=stage, reason="error")
+                log_event("context_stage_error", stage=stage, error=str(e))
+    finally:
+        for task in tasks.values():
+            task.cancel()
+    return results
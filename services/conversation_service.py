@@ -0,0 +1,139 @@
+"""Token-budgeted conversation history for LLM prompts.
+
+The most recent turns are kept verbatim up to HISTORY_TOKEN_BUDGET
+(approximate tokens). Older turns are folded into an extractive rolling
+summary capped at HISTORY_SUMMARY_TOKENS. Summaries are cached by a
+chained hash of the turns they cover, so each request only folds the
+turns that have aged out since the previous one.
+"""
+import hashlib
+import re
+
+from config.config import HISTORY_TOKEN_BUDGET, HISTORY_SUMMARY_TOKENS, HISTORY_SUMMARY_CACHE_SIZE
+from utils.cache import TTLCache
+from utils.metrics import CACHE_LOOKUPS, HISTORY_MESSAGES_FOLDED, LLM_PROMPT_TOKENS, LLM_RESPONSE_TOKENS
+
+_SENTENCE_END = re.compile(r"(?<=[.!?।])\s+")
+SUMMARY_LINE_CHARS = 160
+
+_summaries = TTLCache(HISTORY_SUMMARY_CACHE_SIZE, 6 * 3600)
+
+
+def estimate_tokens(text):
+    """Approximate token count: ~4 characters per token for ASCII text,
+    ~2 per token for other scripts such as Devanagari"""
+    if not text:
+        return 0
+    if text.isascii():
+        return len(text) // 4 + 1
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return ascii_chars // 4 + (len(text) - ascii_chars) // 2 + 1
+
+
+def is_user_message(msg):
+    return (msg.get("type") or msg.get("role")) == "user"
+
+
+def format_message(msg):
+    role = "Farmer" if is_user_message(msg) else "KrishiSahay Assistant"
+    return f"{role}: {msg.get('content', '')}"
+
+
+def _summary_line(msg):
+    """First sentence of a message, shortened to one summary line"""
+    content = " ".join(str(msg.get("content", "")).split())
+    sentence = _SENTENCE_END.split(content, 1)[0]
+    if len(sentence) > SUMMARY_LINE_CHARS:
+        sentence = sentence[:SUMMARY_LINE_CHARS].rsplit(" ", 1)[0] + "…"
+    prefix = "Farmer asked" if is_user_message(msg) else "Advised"
+    return f"{prefix}: {sentence}"
+
+
+def _fold(lines, msg):
+    """Add one message to a summary, dropping the oldest lines over budget"""
+    lines = lines + (_summary_line(msg),)
+    while len(lines) > 1 and sum(estimate_tokens(line) for line in lines) > HISTORY_SUMMARY_TOKENS:
+        lines = lines[1:]
+    return lines
+
+
+def fold_summary(lines, messages):
+    """Fold messages into existing summary lines"""
+    lines = tuple(lines)
+    for msg in messages:
+        lines = _fold(lines, msg)
+    return lines
+
+
+def _prefix_digests(messages, base):
+    """digests[i] identifies the base summary plus messages[:i + 1]"""
+    digests = []
+    digest = hashlib.sha256("\n".join(base).encode("utf-8")).digest()
+    for msg in messages:
+        digest = hashlib.sha256(digest + format_message(msg).encode("utf-8")).digest()
+        digests.append(digest)
+    return digests
+
+
+def summarize(messages, base=()):
+    """Summary lines for messages on top of base, extending the longest
+    cached prefix summary"""
+    base = tuple(base)
+    if not messages:
+        return base
+    digests = _prefix_digests(messages, base)
+    start, lines = 0, base
+    for i in range(len(digests) - 1, -1, -1):
+        cached = _summaries.get(digests[i])
+        if cached is not None:
+            start, lines = i + 1, cached
+            break
+    CACHE_LOOKUPS.inc(cache="history_summary", result="hit" if start else "miss")
+
+    lines = fold_summary(lines, messages[start:])
+    if start < len(messages):
+        HISTORY_MESSAGES_FOLDED.inc(len(messages) - start)
+        _summaries.set(digests[-1], lines)
+    return lines
+
+
+def split_history(messages):
+    """Split messages into (older, recent) with recent under the token budget"""
+    used = 0
+    split = len(messages)
+    for i in range(len(messages) - 1, -1, -1):
+        used += estimate_tokens(format_message(messages[i]))
+        if used > HISTORY_TOKEN_BUDGET:
+            break
+        split = i
+    return messages[:split], messages[split:]
+
+
+def build_conversation_context(messages, summary=()):
+    """Prompt section for earlier turns: a summary of older turns followed by
+    the recent turns verbatim. `summary` holds lines for turns that are no
+    longer in `messages`. Empty string when there is no history."""
+    if not messages and not summary:
+        return ""
+    older, recent = split_history(messages)
+    sections = []
+    summary = summarize(older, summary)
+    if summary:
+        sections.append("Summary of earlier conversation:\n" + "\n".join(f"- {line}" for line in summary))
+    if recent:
+        sections.append("Previous conversation:\n" + "\n\n".join(format_message(msg) for msg in recent))
+    return "\n\n".join(sections) + "\n"
+
+
+def record_prompt(prompt):
+    """Record the approximate token count of a prompt sent to the LLM"""
+    tokens = estimate_tokens(prompt)
+    LLM_PROMPT_TOKENS.observe(tokens)
+    return tokens
+
+
+def record_response(answer):
+    """Record the approximate token count of an LLM response"""
+    tokens = estimate_tokens(answer)
+    LLM_RESPONSE_TOKENS.observe(tokens)
+    return tokens
@@ -0,0 +1,128 @@
+"""Everything the prompt needs to know about one crop.
+
+The crop details, its fertilizers and its rotation successors are read
+from the same catalog snapshot (itself loaded in one query, see
+services.catalog), so they are always consistent with each other. Both
+front ends build their prompts from a CropContext.
+
+A CropContext holds records only; text is rendered from them by
+for_model() and by the intent router's templates, with the format_*
+helpers below.
+"""
+from services.catalog import get_snapshot
+from services.crop_rotation_service import retrieve_crop_rotation_info
+from services.crop_service import retrieve_crop_info
+from services.fertilizer_service import retrieve_fertilizer_info
+
+# (crop record field, English label, Hindi label)
+CROP_INFO_LABELS = (
+    ("name", "Crop", "फसल"),
+    ("type", "Crop type", "फसल प्रकार"),
+    ("description", "Description", "विवरण"),
+    ("climate", "Suitable climate", "उपयुक्त जलवायु"),
+    ("soil", "Suitable soil", "उपयुक्त मिट्टी"),
+    ("temp", "Ideal temperature (°C)", "आदर्श तापमान (°C)"),
+    ("water", "Water requirement", "पानी की आवश्यकता"),
+    ("season", "Growing season", "उगाने का मौसम"),
+    ("price", "Market price (₹/kg)", "बाज़ार मूल्य (₹/किलो)"),
+)
+
+# (rotation record field, English label, Hindi label)
+ROTATION_LABELS = (
+    ("next_crop", "Next crop", "अगली फसल"),
+    ("season", "Season", "मौसम"),
+    ("reason", "Reason", "कारण"),
+    ("soil_effect", "Soil effect", "मिट्टी पर प्रभाव"),
+    ("pest_benefit", "Pest/Disease benefit", "कीट/रोग लाभ"),
+    ("gap_days", "Gap (days)", "अंतराल (दिन)"),
+    ("precautions", "Precautions", "सावधानियाँ"),
+)
+
+
+def localized(record, field, language):
+    """record[field], or its `<field>_hi` variant for Hindi when there is one"""
+    if language == "Hindi" and record.get(f"{field}_hi"):
+        return record[f"{field}_hi"]
+    return record.get(field)
+
+
+def _labelled(record, labels, language):
+    lines = []
+    for field, english, hindi in labels:
+        value = localized(record, field, language)
+        if value not in (None, ""):
+            lines.append(f"{hindi if language == 'Hindi' else english}: {value}")
+    return "\n".join(lines)
+
+
+def format_crop_info(info, language):
+    return _labelled(info, CROP_INFO_LABELS, language)
+
+
+def _fertilizer_line(fertilizer):
+    line = f"- {fertilizer['name']}" + (f" ({fertilizer['type']})" if fertilizer["type"] else "")
+    details = [f"Nutrients: {fertilizer['nutrients']}"] if fertilizer["nutrients"] else []
+    if fertilizer["stage"]:
+        details.append(f"Stage: {fertilizer['stage']}")
+    if fertilizer["price"] is not None:
+        details.append(f"Price: ₹{fertilizer['price']}/kg")
+    return line + (": " + ", ".join(details) if details else "")
+
+
+def format_fertilizers(fertilizers):
+    return "\n".join(_fertilizer_line(fertilizer) for fertilizer in fertilizers)
+
+
+def format_rotations(rotations, language):
+    return "\n\n".join(_labelled(rotation, ROTATION_LABELS, language) for rotation in rotations)
+
+
+class CropContext:
+    """Crop details, fertilizers and rotations for one crop in one language"""
+
+    __slots__ = ("crop", "language", "info", "fertilizers", "fertilizer_advice", "rotations", "source")
+
+    def __init__(self, crop, language, info, fertilizers, fertilizer_advice, rotations, source):
+        self.crop = crop
+        self.language = language
+        # info: crop record (see services.crop_service) or None
+        self.info = info
+        # fertilizers: fertilizer records, empty when the catalog has none;
+        # fertilizer_advice: fallback text for crops without records, or None
+        self.fertilizers = fertilizers
+        self.fertilizer_advice = fertilizer_advice
+        # rotations: rotation records (see services.crop_rotation_service), possibly empty
+        self.rotations = rotations
+        # "database", "local" or "fallback"
+        self.source = source
+
+    def fertilizer_text(self):
+        """The fertilizer records as a list, else the fallback advice, else None"""
+        if self.fertilizers:
+            return format_fertilizers(self.fertilizers)
+        return self.fertilizer_advice
+
+    def for_model(self):
+        """The crop section of the prompt"""
+        info = format_crop_info(self.info, self.language) if self.info else "Not available."
+        rotations = format_rotations(self.rotations, self.language) if self.rotations else None
+        return "\n    ".join([
+            f"Crop Information for {self.crop}:",
+            f"Basic Info:\n{info}",
+            f"Fertilizer Requirements:\n{self.fertilizer_text() or 'No specific fertilizer data available.'}",
+            f"Crop Rotation Tips:\n{rotations or 'No crop rotation data available.'}",
+        ])
+
+
+def get_crop_context(crop, language):
+    snapshot = get_snapshot()
+    fertilizers, fertilizer_advice = retrieve_fertilizer_info(crop, snapshot)
+    return CropContext(
+        crop,
+        language,
+        retrieve_crop_info(crop, snapshot),
+        fertilizers,
+        fertilizer_advice,
+        retrieve_crop_rotation_info(crop, snapshot),
+        snapshot.source,
+    )
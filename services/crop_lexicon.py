@@ -0,0 +1,31 @@
+"""Hindi and romanized names for common crops, used for local crop detection.
+
+Keys are the English crop names used by the catalog (lowercase); values
+are the Devanagari names and the romanized spellings farmers commonly
+type. Chandrabindu/anusvara and nukta variants need not be listed twice:
+the crop matcher normalizes them.
+"""
+
+CROP_LEXICON = {
+    "rice": ["धान", "चावल", "dhan", "dhaan", "chawal", "chaval", "paddy"],
+    "wheat": ["गेहूं", "गेंहू", "gehun", "gehu", "gehoon", "gehoo", "genhu"],
+    "maize": ["मक्का", "मकई", "भुट्टा", "makka", "makai", "bhutta", "corn"],
+    "barley": ["जौ", "jau"],
+    "sorghum": ["ज्वार", "jowar", "jwar", "juar"],
+    "pearl millet": ["बाजरा", "bajra", "bajara", "bajri"],
+    "finger millet": ["रागी", "मंडुआ", "ragi", "mandua"],
+    "potato": ["आलू", "aloo", "alu"],
+    "banana": ["केला", "kela"],
+    "cotton": ["कपास", "kapas", "kapaas"],
+    "sugarcane": ["गन्ना", "ईख", "ganna", "ikh", "ganne"],
+    "groundnut": ["मूंगफली", "moongphali", "mungfali", "moongfali", "peanut"],
+    "mustard": ["सरसों", "सरसो", "sarson", "sarso", "sarsoon"],
+    "soybean": ["सोयाबीन", "soyabean", "soya"],
+    "tomato": ["टमाटर", "tamatar", "tamater"],
+    "onion": ["प्याज", "pyaz", "pyaaz", "pyaj", "kanda"],
+    "chickpea": ["चना", "chana"],
+    "pigeon pea": ["अरहर", "तुअर", "arhar", "tur", "toor"],
+    "lentil": ["मसूर", "masoor", "masur"],
+    "brinjal": ["बैंगन", "baingan", "baigan", "eggplant"],
+    "chilli": ["मिर्च", "mirch", "mirchi"],
+}
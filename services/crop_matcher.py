@@ -0,0 +1,118 @@
+"""Single-pass crop name detection for farmer questions."""
+import re
+import threading
+
+from services.catalog import get_snapshot
+from services.crop_lexicon import CROP_LEXICON
+from services.crop_service import FALLBACK_CROPS
+
+TOKEN_PATTERN = re.compile(r"[\wऀ-ॿ]+")
+# Spelling variants folded together: chandrabindu -> anusvara, nukta dropped
+DEVANAGARI_VARIANTS = str.maketrans({"\u0901": "\u0902", "\u093c": None})
+# Romanized names are matched as whole words only. Single-word names shorter
+# than MIN_ALIAS_LENGTH are ignored, and ones shorter than MIN_PLURAL_LENGTH
+# ("tur", "alu", "jau", "ikh") get no plural forms, so only the exact word matches
+MIN_ALIAS_LENGTH = 3
+MIN_PLURAL_LENGTH = 4
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens (Latin and Devanagari)"""
+    return TOKEN_PATTERN.findall(text.lower().translate(DEVANAGARI_VARIANTS))
+
+
+def plural_forms(word):
+    """Common English plural spellings of a word"""
+    if not word.isascii():
+        return []
+    forms = [word + "s"]
+    if word.endswith(("s", "x", "ch", "sh", "o")):
+        forms.append(word + "es")
+    if word.endswith("y") and len(word) > 1 and word[-2] not in "aeiou":
+        forms.append(word[:-1] + "ies")
+    return forms
+
+
+class CropMatcher:
+    """Phrase index mapping crop names (and their variants) to a canonical crop"""
+
+    def __init__(self, names):
+        # names: iterable of (canonical_crop, alias) pairs
+        self.phrases = {}
+        self.max_len = 1
+        for crop, alias in names:
+            self.add(crop, alias)
+
+    def add(self, crop, alias):
+        tokens = tokenize(alias or "")
+        if not tokens or (len(tokens) == 1 and tokens[0].isascii() and len(tokens[0]) < MIN_ALIAS_LENGTH):
+            return
+        crop = crop.lower()
+        variants = [tokens]
+        if len(tokens[-1]) >= MIN_PLURAL_LENGTH:
+            variants += [tokens[:-1] + [p] for p in plural_forms(tokens[-1])]
+        for variant in variants:
+            self.phrases.setdefault(tuple(variant), crop)
+            self.max_len = max(self.max_len, len(variant))
+
+    def find_all(self, text):
+        """Return every crop mentioned in text, in order of first mention"""
+        tokens = tokenize(text)
+        found = []
+        i = 0
+        while i < len(tokens):
+            step = 1
+            for n in range(min(self.max_len, len(tokens) - i), 0, -1):
+                crop = self.phrases.get(tuple(tokens[i:i + n]))
+                if crop:
+                    if crop not in found:
+                        found.append(crop)
+                    step = n
+                    break
+            i += step
+        return found
+
+    def find_first(self, text):
+        found = self.find_all(text)
+        return found[0] if found else None
+
+
+def load_catalog_names(snapshot):
+    """Crop names from the catalog snapshot, the fallback data and the
+    Hindi/romanized lexicon"""
+    names = []
+    for key, crop in FALLBACK_CROPS.items():
+        names += [(key, key), (key, crop["name"]), (key, crop["name_hi"])]
+    for key, crop in snapshot.crops.items():
+        names += [(key, crop["crop_name"]), (key, crop["crop_name_hi"])]
+
+    # Lexicon entries map to the catalog crop sharing any of their names
+    known = {tuple(tokenize(alias or "")): key for key, alias in names}
+    for key, aliases in CROP_LEXICON.items():
+        crop = key
+        for alias in [key] + aliases:
+            crop = known.get(tuple(tokenize(alias)), crop)
+        names += [(crop, alias) for alias in [key] + aliases]
+    return names
+
+
+_matcher = None
+_matcher_snapshot = None
+_lock = threading.Lock()
+
+
+def get_crop_matcher():
+    """Return the shared matcher, rebuilding it whenever the catalog snapshot changes"""
+    global _matcher, _matcher_snapshot
+    snapshot = get_snapshot()
+    if snapshot is not _matcher_snapshot:
+        with _lock:
+            if snapshot is not _matcher_snapshot:
+                _matcher = CropMatcher(load_catalog_names(snapshot))
+                _matcher_snapshot = snapshot
+    return _matcher
+
+
+def find_crops(text):
+    """Every crop mentioned in text, without any database I/O"""
+    return get_crop_matcher().find_all(text)
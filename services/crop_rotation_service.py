@@ -1,4 +1,5 @@
-from config.database import get_connection
+from services.catalog import get_snapshot
+from utils.metrics import FALLBACKS
 
 # Fallback crop rotation data
 FALLBACK_ROTATIONS = {
@@ -52,103 +53,22 @@ FALLBACK_ROTATIONS = {
     ]
 }
 
-def retrieve_crop_rotation_info(crop_name, language):
-    try:
-        conn = get_connection()
-        cur = conn.cursor()
+# Fields of a rotation record, in the order of the catalog snapshot's rotation rows
+ROTATION_FIELDS = (
+    "next_crop", "next_crop_hi", "season", "reason", "soil_effect", "pest_benefit", "gap_days", "precautions",
+)
 
-        # First get crop_id of current crop
-        cur.execute("""
-            SELECT crop_id
-            FROM crops
-            WHERE lower(crop_name) = %s
-        """, (crop_name.lower(),))
 
-        row = cur.fetchone()
-        if not row:
-            conn.close()
-            raise Exception("Crop not found in database")
-
-        crop_id = row[0]
-
-        # Get rotation info
-        cur.execute("""
-            SELECT
-                c2.crop_name,
-                c2.crop_name_hi,
-                r.recommended_season,
-                r.rotation_reason,
-                r.soil_nutrient_effect,
-                r.pest_disease_benefit,
-                r.recommended_gap_days,
-                r.special_precautions
-            FROM public.crop_rotation_plan r
-            JOIN crops c2 ON r.next_crop_id = c2.crop_id
-            WHERE r.current_crop_id = %s
-        """, (crop_id,))
-
-        rows = cur.fetchall()
-        conn.close()
-
-        if rows:
-            if language == "Hindi":
-                return "\n".join(
-                    f"""
-अगली फसल: {r[1]}
-मौसम: {r[2]}
-कारण: {r[3]}
-मिट्टी पर प्रभाव: {r[4]}
-कीट/रोग लाभ: {r[5]}
-अंतराल (दिन): {r[6]}
-सावधानियाँ: {r[7]}
-"""
-                    for r in rows
-                )
-            else:
-                return "\n".join(
-                    f"""
-Next crop: {r[0]}
-Season: {r[2]}
-Reason: {r[3]}
-Soil effect: {r[4]}
-Pest/Disease benefit: {r[5]}
-Gap (days): {r[6]}
-Precautions: {r[7]}
-"""
-                    for r in rows
-                )
-    except Exception as e:
-        print(f"Database error: {e}. Using fallback data.")
+def retrieve_crop_rotation_info(crop_name, snapshot=None):
+    """Rotation records (see ROTATION_FIELDS) for the crop; empty when there are none"""
+    rows = (snapshot or get_snapshot()).rotations.get(crop_name.lower())
+    if rows:
+        return [dict(zip(ROTATION_FIELDS, row)) for row in rows]
     
     # Fallback to local data
     crop_lower = crop_name.lower()
     if crop_lower in FALLBACK_ROTATIONS:
-        rotations = FALLBACK_ROTATIONS[crop_lower]
-        if language == "Hindi":
-            return "\n".join(
-                f"""
-अगली फसल: {r['next_crop_hi']}
-मौसम: {r['season']}
-कारण: {r['reason']}
-मिट्टी पर प्रभाव: {r['soil_effect']}
-कीट/रोग लाभ: {r['pest_benefit']}
-अंतराल (दिन): {r['gap_days']}
-सावधानियाँ: {r['precautions']}
-"""
-                for r in rotations
-            )
-        else:
-            return "\n".join(
-                f"""
-Next crop: {r['next_crop']}
-Season: {r['season']}
-Reason: {r['reason']}
-Soil effect: {r['soil_effect']}
-Pest/Disease benefit: {r['pest_benefit']}
-Gap (days): {r['gap_days']}
-Precautions: {r['precautions']}
-"""
-                for r in rotations
-            )
+        FALLBACKS.inc(kind="rotation")
+        return [dict(rotation) for rotation in FALLBACK_ROTATIONS[crop_lower]]
     
-    return "No crop rotation data available."
+    return []
@@ -1,4 +1,5 @@
-from config.database import get_connection
+from services.catalog import get_snapshot
+from utils.metrics import FALLBACKS
 
 # Fallback crop data
 FALLBACK_CROPS = {
@@ -69,87 +70,31 @@ FALLBACK_CROPS = {
     }
 }
 
-def retrieve_crop_info(crop_name, language):
-    try:
-        conn = get_connection()
-        cur = conn.cursor()
+# Crop record field -> catalog column; records have the same fields as FALLBACK_CROPS
+CROP_INFO_COLUMNS = {
+    "name": "crop_name",
+    "name_hi": "crop_name_hi",
+    "type": "crop_type",
+    "description": "description",
+    "description_hi": "description_hi",
+    "climate": "suitable_climate",
+    "soil": "suitable_soil",
+    "temp": "ideal_temperature_celsius",
+    "water": "water_requirement",
+    "season": "growing_season",
+    "price": "price_per_kg_inr",
+}
 
-        if language == "Hindi":
-            cur.execute("""
-                SELECT
-                    crop_name_hi,
-                    crop_type,
-                    description_hi,
-                    suitable_climate,
-                    suitable_soil,
-                    ideal_temperature_celsius,
-                    water_requirement,
-                    growing_season,
-                    price_per_kg_inr
-                FROM crops
-                WHERE lower(crop_name) = %s
-            """, (crop_name.lower(),))
-        else:
-            cur.execute("""
-                SELECT
-                    crop_name,
-                    crop_type,
-                    description,
-                    suitable_climate,
-                    suitable_soil,
-                    ideal_temperature_celsius,
-                    water_requirement,
-                    growing_season,
-                    price_per_kg_inr
-                FROM crops
-                WHERE lower(crop_name) = %s
-            """, (crop_name.lower(),))
 
-        row = cur.fetchone()
-        conn.close()
-        
-        if row:
-            return row
-    except Exception as e:
-        print(f"Database error: {e}. Using fallback data.")
+def retrieve_crop_info(crop_name, snapshot=None):
+    """Crop record (see CROP_INFO_COLUMNS) with None for blank fields, or None"""
+    crop = (snapshot or get_snapshot()).crops.get(crop_name.lower())
+    if crop:
+        return {field: None if crop[column] == "" else crop[column] for field, column in CROP_INFO_COLUMNS.items()}
     
     # Fallback to local data
     crop_lower = crop_name.lower()
     if crop_lower in FALLBACK_CROPS:
-        crop = FALLBACK_CROPS[crop_lower]
-        if language == "Hindi":
-            return (crop["name_hi"], crop["type"], crop["description_hi"], 
-                   crop["climate"], crop["soil"], crop["temp"], 
-                   crop["water"], crop["season"], crop["price"])
-        else:
-            return (crop["name"], crop["type"], crop["description"],
-                   crop["climate"], crop["soil"], crop["temp"],
-                   crop["water"], crop["season"], crop["price"])
-
-    if not row:
-        return None
-
-    if language == "Hindi":
-        return f"""
-फसल: {row[0]}
-फसल प्रकार: {row[1]}
-विवरण: {row[2]}
-उपयुक्त जलवायु: {row[3]}
-उपयुक्त मिट्टी: {row[4]}
-आदर्श तापमान (°C): {row[5]}
-पानी की आवश्यकता: {row[6]}
-उगाने का मौसम: {row[7]}
-बाज़ार मूल्य (₹/किलो): {row[8]}
-"""
-    else:
-        return f"""
-Crop: {row[0]}
-Crop type: {row[1]}
-Description: {row[2]}
-Suitable climate: {row[3]}
-Suitable soil: {row[4]}
-Ideal temperature (°C): {row[5]}
-Water requirement: {row[6]}
-Growing season: {row[7]}
-Market price (₹/kg): {row[8]}
-"""
+        FALLBACKS.inc(kind="crop")
+        return dict(FALLBACK_CROPS[crop_lower])
+    return None
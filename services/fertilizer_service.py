@@ -1,4 +1,5 @@
-from config.database import get_connection
+from services.catalog import get_snapshot
+from utils.metrics import FALLBACKS
 
 # Fallback fertilizer data
 FALLBACK_FERTILIZERS = {
@@ -9,37 +10,21 @@ FALLBACK_FERTILIZERS = {
     "sugarcane": "For sugarcane, apply high doses of Nitrogen (200-250 kg/hectare) and Phosphate (100-120 kg/hectare). FYM 25-30 tons/hectare improves soil health."
 }
 
-def retrieve_fertilizer_info(crop_name):
-    try:
-        conn = get_connection()
-        cur = conn.cursor()
+# Fields of a fertilizer record, in the order of the catalog snapshot's fertilizer rows
+FERTILIZER_FIELDS = ("name", "type", "nutrients", "stage", "price")
 
-        cur.execute("""
-            SELECT
-                fertilizer_name,
-                type,
-                nutrients,
-                application_stage,
-                price_per_kg_inr
-            FROM fertilizers
-            WHERE lower(used_for_crops) LIKE %s
-        """, (f"%{crop_name.lower()}%",))
 
-        rows = cur.fetchall()
-        conn.close()
-
-        if rows:
-            return "\n".join(
-                f"- {r[0]} ({r[1]}): Nutrients: {r[2]}, "
-                f"Stage: {r[3]}, Price: ₹{r[4]}/kg"
-                for r in rows
-            )
-    except Exception as e:
-        print(f"Database error: {e}. Using fallback data.")
+def retrieve_fertilizer_info(crop_name, snapshot=None):
+    """(fertilizer records, fallback advice text or None); the records are
+    empty when the catalog has none for the crop"""
+    rows = (snapshot or get_snapshot()).fertilizers.get(crop_name.lower())
+    if rows:
+        return [dict(zip(FERTILIZER_FIELDS, row)) for row in rows], None
     
     # Fallback to local data
     crop_lower = crop_name.lower()
     if crop_lower in FALLBACK_FERTILIZERS:
-        return FALLBACK_FERTILIZERS[crop_lower]
+        FALLBACKS.inc(kind="fertilizer")
+        return [], FALLBACK_FERTILIZERS[crop_lower]
     
-    return "No specific fertilizer data available."
+    return [], None
@@ -0,0 +1,216 @@
+"""Intent routing for farmer questions, shared by both front ends.
+
+All English and Hindi keyword patterns are compiled into one regular
+expression, so a question is scanned once. Each intent gets a confidence
+score from its strong and weak keyword hits, reduced when the question
+also looks open-ended ("why", "how", pests, diseases) or matches another
+intent. Weather is further reduced by planting and crop-care keywords,
+and never answered from a template when a crop is named. Confident structured intents (current weather, market price,
+fertilizer dose, next rotation crop) are answered from service data with
+templates; everything else goes to the model.
+"""
+import re
+from collections import namedtuple
+
+from config.config import INTENT_MIN_CONFIDENCE
+from services.context_service import gather_context, gather_context_async
+from services.crop_context import format_rotations, localized
+
+Intent = namedtuple("Intent", ["name", "confidence", "scores"])
+
+# intent -> (strong patterns, weak patterns); Latin patterns match whole
+# words, Devanagari ones match anywhere (combining vowel signs break \b).
+# Where patterns overlap the earlier intent wins, so rotation precedes planting.
+INTENT_PATTERNS = {
+    "weather": (
+        [r"weather", r"forecast", r"temperature", r"humidity", r"rain\w*",
+         "मौसम", "तापमान", "नमी", "बारिश", "वर्षा"],
+        [r"climate", r"wind", r"today", r"tomorrow",
+         "जलवायु", "हवा", "आज", "कल"],
+    ),
+    "price": (
+        [r"price", r"prices", r"market rate", r"mandi", r"bhav", r"daam",
+         "भाव", "दाम", "कीमत", "मूल्य", "मंडी"],
+        [r"rate", r"cost", r"sell\w*", r"per kg",
+         "बेच", "किलो"],
+    ),
+    "fertilizer": (
+        [r"fertili[sz]er\w*", r"urea", r"dap", r"npk", r"potash", r"khad",
+         "खाद", "उर्वरक", "यूरिया", "डीएपी", "पोटाश"],
+        [r"dose", r"dosage", r"nutrient\w*", r"manure", r"how much", r"kg per \w+",
+         "मात्रा", "कितना", "कितनी", "पोषक"],
+    ),
+    "rotation": (
+        [r"rotation", r"next crop", r"(?:(?:should|can) i )?(?:grow|sow|plant) after", r"after harvesting",
+         "फसल चक्र", "अगली फसल", "के बाद कौन", "के बाद क्या"],
+        [r"after", r"next season", "बाद", "अगले मौसम"],
+    ),
+    "planting": (
+        [r"can i (?:plant|grow|sow)", r"should i (?:plant|grow|sow)", r"planting", r"sowing",
+         "बो सकता", "बो सकती", "उगाना ठीक", "बुवाई"],
+        [r"plant", r"sow", "बोना", "उगा"],
+    ),
+}
+
+# Markers of questions that need reasoning rather than a lookup
+OPEN_ENDED_PATTERNS = [
+    r"why", r"how(?! much| many)", r"explain", r"disease\w*", r"pest\w*", r"problem\w*",
+    r"yellow\w*", r"best way", r"compare", r"difference",
+    "क्यों", "कैसे", "समझा", "रोग", "कीट", "समस्या", "पीला", "पीली",
+]
+
+STRONG_WEIGHT = 0.7
+WEAK_WEIGHT = 0.3
+OPEN_ENDED_PENALTY = 0.4
+# Weather words in a planting or crop-care question ("can I sow wheat if it
+# rains tomorrow?") are conditions on the advice, not a forecast request
+CROP_ADVICE_INTENTS = ("planting", "fertilizer", "rotation")
+CROP_ADVICE_PENALTY = 0.4
+
+# Intents that can be answered from service data, and the context they need
+STRUCTURED_STAGES = {
+    "weather": ("weather",),
+    "price": ("crop",),
+    "fertilizer": ("crop",),
+    "rotation": ("crop",),
+}
+CROP_INTENTS = ("price", "fertilizer", "rotation")
+
+
+def _alternative(pattern):
+    if pattern.isascii():
+        return rf"\b(?:{pattern})\b"
+    return pattern
+
+
+def _compile():
+    groups = []
+    for intent, (strong, weak) in INTENT_PATTERNS.items():
+        groups.append(f"(?P<{intent}__strong>{'|'.join(map(_alternative, strong))})")
+        groups.append(f"(?P<{intent}__weak>{'|'.join(map(_alternative, weak))})")
+    groups.append(f"(?P<open__ended>{'|'.join(map(_alternative, OPEN_ENDED_PATTERNS))})")
+    return re.compile("|".join(groups))
+
+
+_PATTERN = _compile()
+
+
+def route(question):
+    """Classify a question in one pass; returns Intent(name, confidence, scores).
+
+    `name` is None when no intent keyword matched.
+    """
+    scores = dict.fromkeys(INTENT_PATTERNS, 0.0)
+    open_ended = 0
+    for match in _PATTERN.finditer(question.lower()):
+        intent, strength = match.lastgroup.split("__")
+        if intent == "open":
+            open_ended += 1
+        else:
+            scores[intent] += STRONG_WEIGHT if strength == "strong" else WEAK_WEIGHT
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    (name, best), (_, runner_up) = ranked[0], ranked[1]
+    if best == 0:
+        return Intent(None, 0.0, scores)
+    confidence = min(best, 1.0) - runner_up / 2 - OPEN_ENDED_PENALTY * open_ended
+    if name == "weather" and any(scores[advice] for advice in CROP_ADVICE_INTENTS):
+        confidence -= CROP_ADVICE_PENALTY
+    return Intent(name, round(max(confidence, 0.0), 2), scores)
+
+
+def is_confident(intent, name=None):
+    """True when the intent (optionally a specific one) clears INTENT_MIN_CONFIDENCE"""
+    if name is not None and intent.name != name:
+        return False
+    return intent.name is not None and intent.confidence >= INTENT_MIN_CONFIDENCE
+
+
+def _price_answer(crop_info, language):
+    name, price = localized(crop_info, "name", language), crop_info["price"]
+    if price is None:
+        return None
+    if language == "Hindi":
+        return (f"{name} का बाज़ार मूल्य लगभग ₹{price} प्रति किलो है। "
+                "मंडी और मौसम के अनुसार दाम बदलते रहते हैं।")
+    return (f"The market price of {name} is about ₹{price} per kg. "
+            "Prices vary by mandi and season.")
+
+
+def _fertilizer_answer(crop, crop_context, language):
+    # Fertilizer data is English only; Hindi answers go through the model
+    fertilizer_info = crop_context.fertilizer_text()
+    if language == "Hindi" or not fertilizer_info:
+        return None
+    return f"Recommended fertilizers for {crop.title()}:\n{fertilizer_info}"
+
+
+def _rotation_answer(crop, crop_context, language):
+    if not crop_context.rotations:
+        return None
+    rotation_info = format_rotations(crop_context.rotations, language)
+    if language == "Hindi":
+        name = localized(crop_context.info, "name", language) if crop_context.info else crop
+        return f"{name} के बाद उगाने के लिए सुझाई गई फसलें:\n{rotation_info}"
+    return f"Crops to grow after {crop.title()}:\n{rotation_info}"
+
+
+def render_answer(intent_name, crop, language, context):
+    """Template answer for a structured intent from gathered context, or None
+    when the data needed is missing"""
+    if intent_name == "weather":
+        weather_text, _ = context.get("weather", (None, None))
+        return weather_text.strip() if weather_text else None
+    crop_context = context.get("crop")
+    if crop_context is None:
+        return None
+    if intent_name == "price":
+        return _price_answer(crop_context.info, language) if crop_context.info else None
+    if intent_name == "fertilizer":
+        return _fertilizer_answer(crop, crop_context, language)
+    if intent_name == "rotation":
+        return _rotation_answer(crop, crop_context, language)
+    return None
+
+
+def _needs_model(intent, crop):
+    if not is_confident(intent) or intent.name not in STRUCTURED_STAGES:
+        return True
+    if intent.name == "weather":
+        # Weather asked about a crop is advice, not a forecast
+        return bool(crop)
+    return intent.name in CROP_INTENTS and not crop
+
+
+def answer_from_context(intent, crop, language, context):
+    """Template answer from context the caller already gathered (crop and
+    weather stages), or None when the question should go to the model"""
+    if _needs_model(intent, crop):
+        return None
+    return render_answer(intent.name, crop, language, context)
+
+
+def answer_from_data(intent, crop, language, client_ip=None):
+    """Answer a confident structured intent without the model.
+
+    Returns (answer, context), or (None, None) when the question should
+    go to the model instead.
+    """
+    if _needs_model(intent, crop):
+        return None, None
+    context = gather_context(crop, language, client_ip, stages=STRUCTURED_STAGES[intent.name])
+    answer = render_answer(intent.name, crop, language, context)
+    if answer is None:
+        return None, None
+    return answer, context
+
+
+async def answer_from_data_async(intent, crop, language, client_ip=None):
+    """answer_from_data for the ASGI app"""
+    if _needs_model(intent, crop):
+        return None, None
+    context = await gather_context_async(crop, language, client_ip, stages=STRUCTURED_STAGES[intent.name])
+    answer = render_answer(intent.name, crop, language, context)
+    if answer is None:
+        return None, None
+    return answer, context
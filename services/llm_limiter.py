@@ -0,0 +1,255 @@
+"""Admission control for Gemini calls.
+
+Each model gets one limiter per process: at most LLM_MAX_CONCURRENCY calls
+in flight, started no faster than a token bucket of LLM_RATE_PER_SECOND
+(bursting to LLM_BURST). These budgets are for the whole server, so with
+several worker processes each limiter gets 1/LLM_PROCESS_COUNT of them
+(see set_process_count). Callers that cannot start right away wait in a
+FIFO queue of at most LLM_MAX_QUEUE entries for up to LLM_QUEUE_TIMEOUT
+seconds; beyond that they get LLMOverloaded, which the front ends turn
+into a 503 with Retry-After. Only model calls go through here, so
+template answers and cache hits are never queued.
+
+Threads and asyncio tasks share the same limiter: thread waiters block on
+an Event, task waiters on an asyncio.Event woken through their loop.
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+from config.config import (
+    MODEL_NAME,
+    LLM_MAX_CONCURRENCY,
+    LLM_RATE_PER_SECOND,
+    LLM_BURST,
+    LLM_MAX_QUEUE,
+    LLM_QUEUE_TIMEOUT,
+    LLM_PROCESS_COUNT,
+)
+from utils.metrics import LLM_IN_FLIGHT, LLM_QUEUE_LENGTH, LLM_QUEUE_SECONDS, LLM_REJECTIONS
+
+
+class LLMOverloaded(Exception):
+    """The model is saturated; retry after `retry_after` seconds"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Gemini admission rejected ({reason}); retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _ThreadWaiter:
+    def __init__(self):
+        self._event = threading.Event()
+
+    def wake(self):
+        self._event.set()
+
+    def wait(self, timeout):
+        self._event.wait(timeout)
+        self._event.clear()
+
+
+class _TaskWaiter:
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+
+    def wake(self):
+        self._loop.call_soon_threadsafe(self._event.set)
+
+    async def wait(self, timeout):
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._event.clear()
+
+
+class LLMLimiter:
+    """Concurrency limit plus token bucket with a bounded FIFO wait queue"""
+
+    def __init__(self, model, max_concurrency, rate, burst, max_queue, queue_timeout):
+        self.model = model
+        self.max_concurrency = max(max_concurrency, 1)
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._active = 0
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._waiters = deque()
+
+    def _take(self, waiter):
+        """Start a call if `waiter` (None: a new arrival) is next in line.
+
+        Returns 0 on success, seconds until the next token, or None when
+        the caller must wait to be woken. Called with the lock held.
+        """
+        if self._waiters and self._waiters[0] is not waiter:
+            return None
+        if self._active >= self.max_concurrency:
+            return None
+        if self.rate > 0:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+            self._refilled_at = now
+            if self._tokens < 1:
+                return (1 - self._tokens) / self.rate
+            self._tokens -= 1
+        self._active += 1
+        if waiter is not None:
+            self._waiters.popleft()
+            self._wake_next()
+        LLM_IN_FLIGHT.set(self._active, model=self.model)
+        LLM_QUEUE_LENGTH.set(len(self._waiters), model=self.model)
+        return 0
+
+    def _wake_next(self):
+        if self._waiters:
+            self._waiters[0].wake()
+
+    def _retry_after(self):
+        backlog = len(self._waiters) + self._active
+        per_second = self.rate if self.rate > 0 else self.max_concurrency / max(self.queue_timeout, 1)
+        return max(1, math.ceil(backlog / per_second))
+
+    def _reject(self, reason):
+        LLM_REJECTIONS.inc(model=self.model, reason=reason)
+        return LLMOverloaded(reason, self._retry_after())
+
+    def _enqueue(self, waiter):
+        """Join the queue or raise LLMOverloaded if it is full (lock held)"""
+        if len(self._waiters) >= self.max_queue:
+            raise self._reject("queue_full")
+        self._waiters.append(waiter)
+        LLM_QUEUE_LENGTH.set(len(self._waiters), model=self.model)
+
+    def _leave(self, waiter):
+        """Give up a place in the queue (lock held)"""
+        was_first = self._waiters and self._waiters[0] is waiter
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            return
+        if was_first:
+            self._wake_next()
+        LLM_QUEUE_LENGTH.set(len(self._waiters), model=self.model)
+
+    def acquire(self):
+        """Block until a call may start, or raise LLMOverloaded"""
+        with self._lock:
+            if self._take(None) == 0:
+                LLM_QUEUE_SECONDS.observe(0, model=self.model)
+                return
+            waiter = _ThreadWaiter()
+            self._enqueue(waiter)
+
+        started = time.monotonic()
+        deadline = started + self.queue_timeout
+        while True:
+            with self._lock:
+                delay = self._take(waiter)
+                if delay == 0:
+                    LLM_QUEUE_SECONDS.observe(time.monotonic() - started, model=self.model)
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._leave(waiter)
+                    raise self._reject("timeout")
+            waiter.wait(min(delay or remaining, remaining))
+
+    async def acquire_async(self):
+        """acquire() for asyncio tasks; waits without blocking the event loop"""
+        with self._lock:
+            if self._take(None) == 0:
+                LLM_QUEUE_SECONDS.observe(0, model=self.model)
+                return
+            waiter = _TaskWaiter()
+            self._enqueue(waiter)
+
+        started = time.monotonic()
+        deadline = started + self.queue_timeout
+        try:
+            while True:
+                with self._lock:
+                    delay = self._take(waiter)
+                    if delay == 0:
+                        LLM_QUEUE_SECONDS.observe(time.monotonic() - started, model=self.model)
+                        return
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._leave(waiter)
+                        raise self._reject("timeout")
+                await waiter.wait(min(delay or remaining, remaining))
+        except asyncio.CancelledError:
+            with self._lock:
+                self._leave(waiter)
+            raise
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+            LLM_IN_FLIGHT.set(self._active, model=self.model)
+            self._wake_next()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "model": self.model,
+                "in_flight": self._active,
+                "queued": len(self._waiters),
+                "tokens": round(self._tokens, 2),
+                "rejected_queue_full": LLM_REJECTIONS.value(model=self.model, reason="queue_full"),
+                "rejected_timeout": LLM_REJECTIONS.value(model=self.model, reason="timeout"),
+            }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+_process_count = max(LLM_PROCESS_COUNT, 1)
+
+
+def set_process_count(count):
+    """Split the budgets of limiters created from now on over `count` processes"""
+    global _process_count
+    _process_count = max(count, 1)
+
+
+def get_limiter(model=MODEL_NAME):
+    limiter = _limiters.get(model)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(model)
+            if limiter is None:
+                limiter = _limiters[model] = LLMLimiter(
+                    model, LLM_MAX_CONCURRENCY // _process_count, LLM_RATE_PER_SECOND / _process_count,
+                    LLM_BURST // _process_count, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT,
+                )
+    return limiter
+
+
+@contextmanager
+def llm_slot(model=MODEL_NAME):
+    """Hold an admission slot for one model call"""
+    limiter = get_limiter(model)
+    limiter.acquire()
+    try:
+        yield
+    finally:
+        limiter.release()
+
+
+@asynccontextmanager
+async def llm_slot_async(model=MODEL_NAME):
+    limiter = get_limiter(model)
+    await limiter.acquire_async()
+    try:
+        yield
+    finally:
+        limiter.release()
@@ -1,39 +1,190 @@
+import asyncio
+import ipaddress
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
 import requests
+from config.config import (
+    LOCATION_PROVIDERS,
+    LOCATION_TIMEOUT,
+    LOCATION_CACHE_SIZE,
+    LOCATION_CACHE_TTL,
+    LOCATION_NEGATIVE_TTL,
+    TRUSTED_PROXY_COUNT,
+)
+from utils.aio import http_client
+from utils.cache import TTLCache
+from utils.metrics import FALLBACKS, span
+
+DEFAULT_LOCATION = "Delhi, India"
+
+# Provider URL templates; "{ip}" is dropped to geolocate the server itself
+PROVIDERS = LOCATION_PROVIDERS or [
+    "https://ipapi.co/{ip}/json/",
+    "http://ip-api.com/json/{ip}",
+    "https://ipinfo.io/{ip}/json",
+]
+
+_cache = TTLCache(LOCATION_CACHE_SIZE, LOCATION_CACHE_TTL, name="location")
+_executor = ThreadPoolExecutor(max_workers=4 * len(PROVIDERS), thread_name_prefix="geoip")
+
+
+def client_ip_from_request(forwarded_for, remote_addr):
+    """Public IP of the farmer, honouring X-Forwarded-For from our proxies.
+
+    Each of the TRUSTED_PROXY_COUNT proxies appends the address it saw, so
+    the client is that many entries from the right; anything further left
+    came from the client and could be forged. Without the header (or with
+    fewer entries than proxies) the peer address is used. Returns None for
+    private, loopback and otherwise non-routable addresses, in which case
+    the server's own location is used.
+    """
+    candidate = remote_addr or ""
+    hops = [ip.strip() for ip in (forwarded_for or "").split(",") if ip.strip()]
+    if TRUSTED_PROXY_COUNT and len(hops) >= TRUSTED_PROXY_COUNT:
+        candidate = hops[-TRUSTED_PROXY_COUNT]
+    try:
+        ip = ipaddress.ip_address(candidate)
+    except ValueError:
+        return None
+    return str(ip) if ip.is_global else None
+
+
+def _cache_key(client_ip):
+    """Nearby clients share a cache entry: /24 for IPv4, /48 for IPv6"""
+    if not client_ip:
+        return "server"
+    ip = ipaddress.ip_address(client_ip)
+    prefix = 24 if ip.version == 4 else 48
+    return str(ipaddress.ip_network(f"{client_ip}/{prefix}", strict=False))
+
+
+def _provider_url(template, client_ip):
+    if client_ip:
+        return template.format(ip=client_ip)
+    return template.replace("{ip}/", "").replace("{ip}", "")
+
+
+def _parse_location(data):
+    city = (
+        data.get("city")
+        or data.get("town")
+        or data.get("regionName")
+    )
+
+    country = (
+        data.get("country_name")
+        or data.get("country")
+    )
+
+    if city:
+        return f"{city}, {country or 'India'}"
+    return None
+
+
+def _lookup(url, cancelled):
+    if cancelled.is_set():
+        return None
+
+    r = requests.get(url, timeout=LOCATION_TIMEOUT)
+    if r.status_code != 200:
+        return None
+
+    return _parse_location(r.json())
+
+
+async def _lookup_async(url):
+    r = await http_client().get(url, timeout=LOCATION_TIMEOUT)
+    if r.status_code != 200:
+        return None
+
+    return _parse_location(r.json())
+
+
+def _race_providers(client_ip):
+    """Query all providers at once and return the first usable answer"""
+    cancelled = threading.Event()
+    pending = {
+        _executor.submit(_lookup, _provider_url(template, client_ip), cancelled)
+        for template in PROVIDERS
+    }
+    deadline = time.monotonic() + LOCATION_TIMEOUT
+    try:
+        while pending:
+            remaining = max(deadline - time.monotonic(), 0)
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                try:
+                    location = future.result()
+                except Exception:
+                    continue
+                if location:
+                    return location
+    finally:
+        # Losers still running finish in the background; their results are ignored
+        cancelled.set()
+        for future in pending:
+            future.cancel()
+    return None
+
+
+async def _race_providers_async(client_ip):
+    """_race_providers on the event loop; the losing requests are cancelled"""
+    loop = asyncio.get_running_loop()
+    pending = {
+        asyncio.ensure_future(_lookup_async(_provider_url(template, client_ip)))
+        for template in PROVIDERS
+    }
+    deadline = loop.time() + LOCATION_TIMEOUT
+    try:
+        while pending:
+            remaining = max(deadline - loop.time(), 0)
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                if task.exception() is None and task.result():
+                    return task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+    return None
+
+
+def _remember(key, location):
+    """Cache a provider's answer and return the location to use"""
+    if location:
+        _cache.set(key, location)
+        return location
+    # FINAL HARD FALLBACK (never return None); cached briefly so a
+    # provider outage does not cost every request the full timeout
+    _cache.set(key, DEFAULT_LOCATION, ttl=LOCATION_NEGATIVE_TTL)
+    return DEFAULT_LOCATION
+
+
+def get_location_from_ip(client_ip=None):
+    key = _cache_key(client_ip)
+    location = _cache.get(key)
+    if not location:
+        with span("location_api"):
+            location = _remember(key, _race_providers(client_ip))
+
+    if location == DEFAULT_LOCATION:
+        FALLBACKS.inc(kind="location")
+    return location
+
+
+async def get_location_from_ip_async(client_ip=None):
+    """get_location_from_ip for the ASGI app"""
+    key = _cache_key(client_ip)
+    location = _cache.get(key)
+    if not location:
+        with span("location_api"):
+            location = _remember(key, await _race_providers_async(client_ip))
 
-def get_location_from_ip():
-    services = [
-        # Service 1
-        "https://ipapi.co/json/",
-        # Service 2
-        "http://ip-api.com/json/",
-        # Service 3
-        "https://ipinfo.io/json"
-    ]
-
-    for url in services:
-        try:
-            r = requests.get(url, timeout=3)
-            if r.status_code != 200:
-                continue
-
-            data = r.json()
-
-            city = (
-                data.get("city")
-                or data.get("town")
-                or data.get("regionName")
-            )
-
-            country = (
-                data.get("country_name")
-                or data.get("country")
-            )
-
-            if city:
-                return f"{city}, {country or 'India'}"
-
-        except Exception:
-            continue
-
-    # FINAL HARD FALLBACK (never return None)
-    return "Delhi, India"
+    if location == DEFAULT_LOCATION:
+        FALLBACKS.inc(kind="location")
+    return location
@@ -0,0 +1,227 @@
+"""Server-side chat sessions, so clients send only the new question.
+
+A session holds the recent messages of one conversation plus summary
+lines for the turns that have been trimmed from it. Each session keeps at
+most SESSION_MAX_MESSAGES messages and SESSION_MAX_CHARS characters;
+older turns are folded into the summary. Sessions expire after
+SESSION_IDLE_TTL seconds without use.
+
+SESSION_BACKEND selects the store: "memory" (per process, LRU bounded by
+SESSION_MAX_SESSIONS), "sqlite" (SESSION_DB file shared by the workers on
+one host) or "postgres" (the chat_sessions table, shared by all hosts).
+"""
+import json
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+
+from config.config import (
+    SESSION_BACKEND,
+    SESSION_DB,
+    SESSION_IDLE_TTL,
+    SESSION_MAX_SESSIONS,
+    SESSION_MAX_MESSAGES,
+    SESSION_MAX_CHARS,
+)
+from config.database import db_connection, execute_prepared, prepare
+from services.conversation_service import fold_summary
+from utils.cache import TTLCache
+from utils.metrics import SESSION_OPERATIONS, log_event
+
+SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{16,64}$")
+# Expired rows in the shared backends are purged once every this many writes
+PURGE_EVERY = 200
+
+
+def new_session_id():
+    return secrets.token_urlsafe(18)
+
+
+def is_session_id(session_id):
+    return isinstance(session_id, str) and bool(SESSION_ID.match(session_id))
+
+
+def empty_session():
+    return {"summary": [], "messages": []}
+
+
+def cap_messages(messages, summary=()):
+    """Trim messages to the per-session limits, folding dropped ones into
+    the summary. Returns (messages, summary)."""
+    messages = list(messages)
+    total = sum(len(str(msg.get("content", ""))) for msg in messages)
+    dropped = 0
+    while dropped < len(messages) and (
+        len(messages) - dropped > SESSION_MAX_MESSAGES or total > SESSION_MAX_CHARS
+    ):
+        total -= len(str(messages[dropped].get("content", "")))
+        dropped += 1
+    if dropped:
+        summary = fold_summary(summary, messages[:dropped])
+    return messages[dropped:], list(summary)
+
+
+class _MemoryBackend:
+    def __init__(self):
+        self._cache = TTLCache(SESSION_MAX_SESSIONS, SESSION_IDLE_TTL)
+
+    def load(self, session_id):
+        return self._cache.get(session_id)
+
+    def save(self, session_id, session):
+        self._cache.set(session_id, session)
+
+    def delete(self, session_id):
+        self._cache.pop(session_id)
+
+
+class _SQLiteBackend:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chat_sessions (
+                    session_id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS chat_sessions_last_used ON chat_sessions (last_used)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def reset_connections(self):
+        """Forget connections inherited across fork; SQLite connections must
+        not be used by two processes"""
+        self._local = threading.local()
+
+    def load(self, session_id):
+        row = self._connect().execute(
+            "SELECT data FROM chat_sessions WHERE session_id = ? AND last_used > ?",
+            (session_id, time.time() - SESSION_IDLE_TTL),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, session_id, session):
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO chat_sessions (session_id, data, last_used) VALUES (?, ?, ?)",
+                (session_id, json.dumps(session, ensure_ascii=False), now),
+            )
+            self._writes += 1
+            if self._writes % PURGE_EVERY == 0:
+                conn.execute("DELETE FROM chat_sessions WHERE last_used <= ?", (now - SESSION_IDLE_TTL,))
+
+    def delete(self, session_id):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,))
+
+
+class _PostgresBackend:
+    """Sessions in the chat_sessions table (see config/migrations.py)"""
+
+    LOAD = prepare("chat_session_load", """
+        SELECT data FROM chat_sessions
+        WHERE session_id = %s AND updated_at > now() - make_interval(secs => %s)
+    """)
+    SAVE = prepare("chat_session_save", """
+        INSERT INTO chat_sessions (session_id, data, updated_at)
+        VALUES (%s, %s::jsonb, now())
+        ON CONFLICT (session_id) DO UPDATE
+        SET data = EXCLUDED.data, updated_at = EXCLUDED.updated_at
+    """)
+    PURGE = prepare("chat_session_purge", """
+        DELETE FROM chat_sessions WHERE updated_at <= now() - make_interval(secs => %s)
+    """)
+    DELETE = prepare("chat_session_delete", "DELETE FROM chat_sessions WHERE session_id = %s")
+
+    def __init__(self):
+        self._writes = 0
+
+    def load(self, session_id):
+        with db_connection() as conn:
+            cur = conn.cursor()
+            execute_prepared(cur, self.LOAD, (session_id, SESSION_IDLE_TTL))
+            row = cur.fetchone()
+        return row[0] if row else None
+
+    def save(self, session_id, session):
+        with db_connection() as conn:
+            cur = conn.cursor()
+            execute_prepared(cur, self.SAVE, (session_id, json.dumps(session, ensure_ascii=False)))
+            self._writes += 1
+            if self._writes % PURGE_EVERY == 0:
+                execute_prepared(cur, self.PURGE, (SESSION_IDLE_TTL,))
+
+    def delete(self, session_id):
+        with db_connection() as conn:
+            execute_prepared(conn.cursor(), self.DELETE, (session_id,))
+
+
+def _create_backend():
+    if SESSION_BACKEND == "sqlite":
+        return _SQLiteBackend(SESSION_DB)
+    if SESSION_BACKEND == "postgres":
+        return _PostgresBackend()
+    return _MemoryBackend()
+
+
+_backend = _create_backend()
+if isinstance(_backend, _SQLiteBackend):
+    os.register_at_fork(after_in_child=_backend.reset_connections)
+def load_session(session_id):
+    """The stored session, or an empty one if it is unknown or expired"""
+    try:
+        session = _backend.load(session_id)
+    except Exception as e:
+        SESSION_OPERATIONS.inc(operation="load", result="error")
+        log_event("session_store_error", operation="load", error=str(e))
+        return empty_session()
+    if session is None:
+        SESSION_OPERATIONS.inc(operation="load", result="miss")
+        return empty_session()
+    SESSION_OPERATIONS.inc(operation="load", result="ok")
+    return session
+
+
+def save_session(session_id, messages, summary=()):
+    """Store a session's messages, trimmed to the per-session limits"""
+    messages, summary = cap_messages(messages, summary)
+    session = {"summary": summary, "messages": messages}
+    try:
+        _backend.save(session_id, session)
+        SESSION_OPERATIONS.inc(operation="save", result="ok")
+    except Exception as e:
+        SESSION_OPERATIONS.inc(operation="save", result="error")
+        log_event("session_store_error", operation="save", error=str(e))
+    return session
+
+
+def append_turn(session_id, session, question, answer):
+    """Add a question and its answer to a loaded session and store it"""
+    messages = session["messages"] + [
+        {"type": "user", "content": question},
+        {"type": "assistant", "content": answer},
+    ]
+    return save_session(session_id, messages, session["summary"])
+
+
+def delete_session(session_id):
+    try:
+        _backend.delete(session_id)
+    except Exception as e:
+        log_event("session_store_error", operation="delete", error=str(e))
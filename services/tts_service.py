@@ -0,0 +1,302 @@
+"""Text-to-speech synthesis with a content-addressed audio store.
+
+Audio is stored in TTS_SPOOL_DIR under a hash of the language and the
+cleaned text, so a repeated answer is served from disk without another
+TTS call. The store is kept under TTS_CACHE_MAX_BYTES by evicting the
+least recently used files. New audio is synthesized on a bounded
+background worker pool.
+"""
+import hashlib
+import importlib
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from config.config import (
+    TTS_WORKERS,
+    TTS_MAX_QUEUE,
+    TTS_JOB_HISTORY,
+    TTS_SPOOL_DIR,
+    TTS_CACHE_MAX_BYTES,
+    TTS_SYNTHESIZER,
+)
+from utils.metrics import (
+    CACHE_LOOKUPS,
+    TTS_EVICTIONS,
+    TTS_JOB_OUTCOMES,
+    TTS_JOBS,
+    TTS_QUEUE_SECONDS,
+    TTS_SYNTHESIS_SECONDS,
+    span,
+)
+
+AUDIO_FILENAME = re.compile(r"^[0-9a-f]{64}\.mp3$")
+
+os.makedirs(TTS_SPOOL_DIR, exist_ok=True)
+
+
+def audio_key(text, language):
+    return hashlib.sha256(f"{language}\0{text}".encode("utf-8")).hexdigest()
+
+
+def audio_path(key):
+    return os.path.join(TTS_SPOOL_DIR, f"{key}.mp3")
+
+
+def is_audio_filename(filename):
+    return bool(AUDIO_FILENAME.match(filename))
+
+
+# A queued job leaves a marker in the shared audio store until it finishes,
+# so any worker can tell a job still in progress from a lost or unknown
+# one. Markers older than this (left by a worker that died) are ignored.
+PENDING_MARKER_MAX_AGE = 300
+
+
+def _pending_path(key):
+    return os.path.join(TTS_SPOOL_DIR, f"{key}.pending")
+
+
+def _mark_pending(key):
+    try:
+        with open(_pending_path(key), "w"):
+            pass
+    except OSError:
+        pass
+
+
+def _clear_pending(key):
+    try:
+        os.remove(_pending_path(key))
+    except FileNotFoundError:
+        pass
+
+
+def _is_pending(key):
+    try:
+        return time.time() - os.path.getmtime(_pending_path(key)) < PENDING_MARKER_MAX_AGE
+    except OSError:
+        return False
+
+
+def gtts_synthesize(text, language, path):
+    from gtts import gTTS  # imported on first synthesis to keep startup fast
+
+    lang_code = "hi" if language == "Hindi" else "en"
+    tts = gTTS(text=text, lang=lang_code)
+    tts.save(path)
+
+
+def load_synthesizer(spec):
+    """Resolve a "module:function" synthesizer, or gTTS when spec is empty"""
+    if not spec:
+        return gtts_synthesize
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+
+synthesize = load_synthesizer(TTS_SYNTHESIZER)
+
+
+def _touch(path):
+    """Mark a stored file as recently used; False if it has been evicted"""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+# Running size of the audio store, so a write does not rescan the directory.
+# Other worker processes write to the same directory, so the total is
+# resynced from a scan when it passes the budget or every STORE_RESCAN_SECONDS.
+STORE_RESCAN_SECONDS = 60
+_store_bytes = None
+_store_scanned_at = 0.0
+_store_lock = threading.Lock()
+
+
+def _scan_store():
+    """([(mtime, size, path)], total bytes) for the stored audio files"""
+    entries = []
+    total = 0
+    with os.scandir(TTS_SPOOL_DIR) as it:
+        for entry in it:
+            if not is_audio_filename(entry.name):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+    return entries, total
+
+
+def _enforce_budget(added):
+    """Count `added` new bytes and, once the store is over its budget,
+    delete least recently used audio until it fits"""
+    global _store_bytes, _store_scanned_at
+    with _store_lock:
+        fresh = time.monotonic() - _store_scanned_at < STORE_RESCAN_SECONDS
+        if _store_bytes is not None and fresh:
+            _store_bytes += added
+            if _store_bytes <= TTS_CACHE_MAX_BYTES:
+                return
+
+        entries, total = _scan_store()
+        _store_scanned_at = time.monotonic()
+        if total > TTS_CACHE_MAX_BYTES:
+            entries.sort()
+            for _, size, path in entries:
+                if total <= TTS_CACHE_MAX_BYTES:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    TTS_EVICTIONS.inc()
+                except FileNotFoundError:
+                    pass
+        _store_bytes = total
+
+
+def text_to_speech(text, language):
+    """Convert text to speech and return the path of the stored mp3"""
+    path = audio_path(audio_key(text, language))
+    if _touch(path):
+        CACHE_LOOKUPS.inc(cache="tts_audio", result="hit")
+        return path
+
+    CACHE_LOOKUPS.inc(cache="tts_audio", result="miss")
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with span("tts"):
+            synthesize(text, language, tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    _enforce_budget(os.path.getsize(path))
+    return path
+
+
+class TTSJob:
+    __slots__ = ("job_id", "status", "path", "error", "created_at", "started_at",
+                 "finished_at", "done")
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.status = "queued"
+        self.path = None
+        self.error = None
+        self.created_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        return {"job_id": self.job_id, "status": self.status, "error": self.error}
+
+
+_executor = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="tts")
+_jobs = OrderedDict()
+_lock = threading.Lock()
+_queued = 0
+
+
+def _run(job, text, language):
+    global _queued
+    with _lock:
+        _queued -= 1
+        TTS_JOBS.set(_queued, state="queued")
+    TTS_JOBS.inc(state="running")
+    job.started_at = time.monotonic()
+    TTS_QUEUE_SECONDS.observe(job.started_at - job.created_at)
+    job.status = "running"
+    try:
+        job.path = text_to_speech(text, language)
+        job.status = "ready"
+    except Exception as e:
+        job.error = str(e)
+        job.status = "failed"
+    job.finished_at = time.monotonic()
+
+    _clear_pending(job.job_id)
+    TTS_JOBS.dec(state="running")
+    TTS_SYNTHESIS_SECONDS.observe(job.finished_at - job.started_at, status=job.status)
+    TTS_JOB_OUTCOMES.inc(outcome="completed" if job.status == "ready" else "failed")
+    job.done.set()
+
+
+def submit_tts(text, language):
+    """Queue text for synthesis and return its job id, or None if the queue is full.
+
+    The job id is the audio's content hash: audio already in the store is
+    ready immediately, and identical text already queued shares that job.
+    """
+    global _queued
+    key = audio_key(text, language)
+    if _touch(audio_path(key)):
+        CACHE_LOOKUPS.inc(cache="tts_audio", result="hit")
+        return key
+
+    with _lock:
+        job = _jobs.get(key)
+        # A ready job whose file has since been evicted is synthesized again
+        if job is not None and (
+            job.status in ("queued", "running")
+            or (job.status == "ready" and os.path.exists(audio_path(key)))
+        ):
+            return key
+        if _queued >= TTS_MAX_QUEUE:
+            TTS_JOB_OUTCOMES.inc(outcome="rejected")
+            return None
+        job = TTSJob(key)
+        _jobs[key] = job
+        while len(_jobs) > TTS_JOB_HISTORY:
+            _jobs.popitem(last=False)
+        _queued += 1
+        TTS_JOBS.set(_queued, state="queued")
+    _mark_pending(key)
+    _executor.submit(_run, job, text, language)
+    return key
+
+
+# Seconds between checks for the audio file of a job run by another worker
+STATUS_POLL_SECONDS = 0.25
+
+
+def get_audio_status(job_id, wait=0):
+    """Status dict for a job, waiting up to `wait` seconds for it to finish.
+
+    Audio found in the store counts as ready even when the job ran in
+    another worker process, and a job another worker has queued but not
+    finished is reported as "pending". Returns None for malformed ids and
+    for jobs no worker is working on (lost in a restart, or never
+    submitted).
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+    if job is not None:
+        if wait > 0:
+            job.done.wait(wait)
+        status = job.to_dict()
+    elif AUDIO_FILENAME.match(f"{job_id}.mp3"):
+        deadline = time.monotonic() + wait
+        ready = os.path.exists(audio_path(job_id))
+        while not ready and _is_pending(job_id) and time.monotonic() < deadline:
+            time.sleep(min(STATUS_POLL_SECONDS, max(deadline - time.monotonic(), 0)))
+            ready = os.path.exists(audio_path(job_id))
+        if not ready and not _is_pending(job_id):
+            return None
+        status = {"job_id": job_id, "status": "ready" if ready else "pending", "error": None}
+    else:
+        return None
+
+    if status["status"] == "ready":
+        status["filename"] = f"{job_id}.mp3"
+    return status
@@ -1,44 +1,185 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
-from config.config import WEATHER_API_KEY
+from requests.adapters import HTTPAdapter
+from config.config import (
+    WEATHER_API_KEY,
+    WEATHER_API_URL,
+    WEATHER_TIMEOUT,
+    WEATHER_CACHE_SIZE,
+    WEATHER_CACHE_TTL,
+    WEATHER_STALE_TTL,
+    WEATHER_NEGATIVE_TTL,
+)
+from utils.aio import http_client, run_in_background
+from utils.cache import AsyncSingleFlight, TTLCache, SingleFlight
+from utils.metrics import CACHE_LOOKUPS, STAGE_ERRORS, span
 
-def get_weather_by_location(location, language):
-    if not WEATHER_API_KEY:
-        return None, None
+# Entries live for the fresh window plus the stale window; within the stale
+# window they are still served while a background refresh runs.
+_cache = TTLCache(WEATHER_CACHE_SIZE, WEATHER_CACHE_TTL + WEATHER_STALE_TTL)
+_flight = SingleFlight("weather")
+_async_flight = AsyncSingleFlight("weather")
+_refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="weather-refresh")
+
+
+def _new_session():
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+    session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+    return session
+
+
+def _reset_after_fork():
+    """A forked worker must not share the parent's keep-alive sockets"""
+    global _session
+    _session = _new_session()
+
+
+_session = _new_session()
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def normalize_city(location):
+    return " ".join(location.split(",")[0].split()).lower()
+
+
+def _parse_weather(city, data):
+    return {
+        "city": city,
+        "temp": data["main"]["temp"],
+        "humidity": data["main"]["humidity"],
+        "wind": data["wind"]["speed"],
+        "desc": data["weather"][0]["description"]
+    }
 
-    city = location.split(",")[0].strip()
 
-    url = "https://api.openweathermap.org/data/2.5/weather"
-    params = {
+def _weather_params(city):
+    return {
         "q": city,
         "appid": WEATHER_API_KEY,
         "units": "metric"
     }
 
+
+def _fetch_weather(city):
+    """Call OpenWeather; returns the weather dict, or None if unavailable"""
+    try:
+        with span("weather_api"):
+            r = _session.get(WEATHER_API_URL, params=_weather_params(city), timeout=WEATHER_TIMEOUT)
+        if r.status_code != 200:
+            STAGE_ERRORS.inc(stage="weather_api", reason=f"http_{r.status_code}")
+            return None
+
+        return _parse_weather(city, r.json())
+    except Exception:
+        STAGE_ERRORS.inc(stage="weather_api", reason="error")
+        return None
+
+
+async def _fetch_weather_async(city):
+    """_fetch_weather over the shared httpx.AsyncClient"""
     try:
-        r = requests.get(url, params=params, timeout=5)
+        with span("weather_api"):
+            r = await http_client().get(WEATHER_API_URL, params=_weather_params(city), timeout=WEATHER_TIMEOUT)
         if r.status_code != 200:
-            return None, None
+            STAGE_ERRORS.inc(stage="weather_api", reason=f"http_{r.status_code}")
+            return None
+
+        return _parse_weather(city, r.json())
+    except Exception:
+        STAGE_ERRORS.inc(stage="weather_api", reason="error")
+        return None
+
+
+def _cache_result(key, weather):
+    """Cache a fetch result as (weather, fetched_at, next refresh attempt).
+
+    A failed revalidation keeps serving the stale value until it expires
+    and only delays the next attempt by WEATHER_NEGATIVE_TTL; a failure
+    with nothing to fall back on is cached as a short negative entry.
+    """
+    now = time.monotonic()
+    if weather:
+        _cache.set(key, (weather, now, now))
+        return weather
+    entry = _cache.get(key)
+    if entry is not None and entry[0] is not None:
+        stale, fetched_at, _ = entry
+        remaining = fetched_at + WEATHER_CACHE_TTL + WEATHER_STALE_TTL - now
+        if remaining > 0:
+            _cache.set(key, (stale, fetched_at, now + WEATHER_NEGATIVE_TTL), ttl=remaining)
+            return stale
+    _cache.set(key, (None, now, now), ttl=WEATHER_NEGATIVE_TTL)
+    return None
 
-        data = r.json()
 
-        weather_data = {
-            "city": city,
-            "temp": data["main"]["temp"],
-            "humidity": data["main"]["humidity"],
-            "wind": data["wind"]["speed"],
-            "desc": data["weather"][0]["description"]
-        }
+def _refresh(key, city):
+    """Fetch once per key, however many callers are waiting, and cache the result"""
+    return _flight.do(key, lambda: _cache_result(key, _fetch_weather(city)))
 
-        if language == "Hindi":
-            text = f"""
+
+async def _refresh_async(key, city):
+    async def load():
+        return _cache_result(key, await _fetch_weather_async(city))
+
+    return await _async_flight.do(key, load)
+
+
+def _cached_weather(key):
+    """("hit" | "stale" | "miss", weather) from the cache; stale entries
+    whose last revalidation failed count as hits until the next attempt"""
+    entry = _cache.get(key)
+    if entry is None:
+        CACHE_LOOKUPS.inc(cache="weather", result="miss")
+        return "miss", None
+    weather, fetched_at, retry_at = entry
+    now = time.monotonic()
+    if weather is None or now - fetched_at <= WEATHER_CACHE_TTL:
+        CACHE_LOOKUPS.inc(cache="weather", result="hit")
+        return "hit", weather
+    CACHE_LOOKUPS.inc(cache="weather", result="stale")
+    return ("stale" if now >= retry_at else "hit"), weather
+
+
+def _get_weather_data(city):
+    key = normalize_city(city)
+    state, weather = _cached_weather(key)
+    if state == "stale":
+        # Serve it now and revalidate in the background
+        if not _flight.in_flight(key):
+            _refresher.submit(_refresh, key, city)
+    if state != "miss":
+        return weather
+    return _refresh(key, city)
+
+
+async def _get_weather_data_async(city):
+    key = normalize_city(city)
+    state, weather = _cached_weather(key)
+    if state == "stale" and not _async_flight.in_flight(key):
+        run_in_background(_refresh_async(key, city))
+    if state != "miss":
+        return weather
+    return await _refresh_async(key, city)
+
+
+def _weather_text(city, weather, language):
+    """(text, weather_data) for the prompt and templates"""
+    weather_data = dict(weather, city=city)
+
+    if language == "Hindi":
+        text = f"""
 📍 स्थान: {city}
 🌡️ तापमान: {weather_data['temp']}°C
 💧 नमी: {weather_data['humidity']}%
 💨 हवा की गति: {weather_data['wind']} m/s
 🌦️ मौसम: {weather_data['desc']}
 """
-        else:
-            text = f"""
+    else:
+        text = f"""
 📍 Location: {city}
 🌡️ Temperature: {weather_data['temp']}°C
 💧 Humidity: {weather_data['humidity']}%
@@ -46,7 +187,29 @@ def get_weather_by_location(location, language):
 🌦️ Weather: {weather_data['desc']}
 """
 
-        return text, weather_data
+    return text, weather_data
 
-    except Exception:
+
+def get_weather_by_location(location, language):
+    if not WEATHER_API_KEY:
+        return None, None
+
+    city = location.split(",")[0].strip()
+
+    weather = _get_weather_data(city)
+    if not weather:
+        return None, None
+    return _weather_text(city, weather, language)
+
+
+async def get_weather_by_location_async(location, language):
+    """get_weather_by_location for the ASGI app"""
+    if not WEATHER_API_KEY:
+        return None, None
+
+    city = location.split(",")[0].strip()
+
+    weather = await _get_weather_data_async(city)
+    if not weather:
         return None, None
+    return _weather_text(city, weather, language)
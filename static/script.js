@@ -1,6 +1,10 @@
 // State Management
 let chatHistory = [];
 let currentChat = [];
+// Server-side session for the current chat; saved chats are resumed by
+// sending their messages once with the next question
+let currentSessionId = null;
+let resumeHistory = false;
 let isDarkMode = localStorage.getItem('darkMode') === 'true';
 let animationsEnabled = localStorage.getItem('animationsEnabled') !== 'false';
 let audioEnabled = localStorage.getItem('audioEnabled') !== 'false';
@@ -134,6 +138,8 @@ function startNewChat() {
     }
     
     currentChat = [];
+    currentSessionId = null;
+    resumeHistory = false;
     
     // Determine language for welcome section
     const isHindi = currentLanguage === 'Hindi';
@@ -187,6 +193,8 @@ function startNewChat() {
 function loadChat(index) {
     if (chatHistory[index]) {
         currentChat = chatHistory[index].messages;
+        currentSessionId = chatHistory[index].sessionId || null;
+        resumeHistory = true;
         displayMessages();
     }
 }
@@ -248,64 +256,77 @@ async function askQuestion() {
     document.getElementById('messagesWrapper').appendChild(loadingDiv);
     scrollToBottom();
 
+    let bubble = null;
+
     try {
-        const response = await fetch('/api/ask', {
+        const response = await fetch('/api/ask/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify({
-                question: question,
-                language: language,
-                chat_history: currentChat.map(msg => ({
-                    type: msg.type,
-                    content: msg.content
-                }))
-            })
+            body: JSON.stringify(requestBody(question, language))
         });
 
-        const data = await response.json();
+        if (!response.ok) {
+            const data = await response.json();
+            throw new Error(data.error || 'Unknown error occurred');
+        }
+
+        // Render tokens as they arrive
+        let answer = '';
+        let done = null;
+
+        await readEventStream(response, (event, data) => {
+            if (event === 'token') {
+                if (!bubble) {
+                    loadingDiv.remove();
+                    bubble = appendStreamingMessage();
+                }
+                answer += data.text;
+                bubble.textContent = answer;
+                scrollToBottom();
+            } else if (event === 'done') {
+                done = data;
+            } else if (event === 'error') {
+                throw new Error(data.error);
+            }
+        });
+
+        if (!done) {
+            throw new Error('Response ended unexpectedly');
+        }
 
-        // Remove loading indicator
         loadingDiv.remove();
 
-        if (response.ok) {
-            // Add assistant message
-            currentChat.push({
-                type: 'assistant',
-                content: data.answer,
-                timestamp: new Date()
-            });
+        currentSessionId = done.session_id;
+        resumeHistory = false;
+
+        // Add assistant message
+        currentChat.push({
+            type: 'assistant',
+            content: done.answer,
+            timestamp: new Date()
+        });
 
+        if (!bubble) {
             displayMessages();
+        }
 
-            // Handle audio if enabled
-            if (data.audio_url) {
-                const audioSection = document.getElementById('audioSection');
-                const audioPlayer = document.getElementById('audioPlayer');
-                audioPlayer.src = data.audio_url;
-                audioSection.style.display = 'block';
-                
-                // Store current audio URL for download
-                window.currentAudioUrl = data.audio_url;
-                
-                // Auto-play if enabled
-                if (audioEnabled) {
-                    audioPlayer.play().catch(err => console.log('Audio play failed:', err));
-                }
-            }
+        // Audio is synthesized in the background; attach it once ready
+        if (done.audio_status_url) {
+            waitForAudio(done.audio_status_url);
+        }
 
-            // Save to chat history (updates existing or creates new)
-            saveChatToHistory();
+        // Save to chat history (updates existing or creates new)
+        saveChatToHistory();
 
-            scrollToBottom();
-        } else {
-            showError('Error: ' + (data.error || 'Unknown error occurred'));
-            currentChat.pop(); // Remove failed message
-        }
+        scrollToBottom();
     } catch (error) {
         console.error('Error:', error);
         loadingDiv.remove();
+        if (bubble) {
+            bubble.parentElement.remove(); // Drop the partial answer
+        }
         showError('Request failed: ' + error.message);
         currentChat.pop(); // Remove failed message
     }
@@ -315,6 +336,109 @@ async function askQuestion() {
     }
 }
 
+// Only the new question travels with the session id; earlier messages are
+// sent just once, when resuming a saved chat
+function requestBody(question, language) {
+    const body = {
+        question: question,
+        language: language,
+        session_id: currentSessionId
+    };
+    if (resumeHistory) {
+        body.chat_history = currentChat.slice(0, -1).map(msg => ({
+            type: msg.type,
+            content: msg.content
+        }));
+    }
+    return body;
+}
+
+// Read a Server-Sent Events response body, calling onEvent(event, data) per message
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) {
+            break;
+        }
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = 'message';
+            const dataLines = [];
+            frame.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    event = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    dataLines.push(line.slice(5).trim());
+                }
+            });
+            if (dataLines.length) {
+                onEvent(event, JSON.parse(dataLines.join('\n')));
+            }
+        }
+    }
+}
+
+// Add an empty assistant bubble that streamed text is written into
+function appendStreamingMessage() {
+    const msgDiv = document.createElement('div');
+    msgDiv.className = 'message assistant';
+    msgDiv.innerHTML = '<div class="message-bubble"></div>';
+    document.getElementById('messagesWrapper').appendChild(msgDiv);
+    return msgDiv.querySelector('.message-bubble');
+}
+
+// Long-poll the audio status endpoint until the answer's audio is ready
+async function waitForAudio(statusUrl) {
+    const deadline = Date.now() + 120000;
+    while (Date.now() < deadline) {
+        let status;
+        try {
+            const response = await fetch(`${statusUrl}?wait=20`);
+            if (!response.ok) {
+                return;
+            }
+            status = await response.json();
+        } catch (error) {
+            console.log('Audio status failed:', error);
+            return;
+        }
+
+        if (status.status === 'ready') {
+            attachAudio(status.audio_url);
+            return;
+        }
+        if (status.status === 'failed') {
+            console.log('Audio synthesis failed:', status.error);
+            return;
+        }
+    }
+}
+
+// Show the audio player for an answer
+function attachAudio(audioUrl) {
+    const audioSection = document.getElementById('audioSection');
+    const audioPlayer = document.getElementById('audioPlayer');
+    audioPlayer.src = audioUrl;
+    audioSection.style.display = 'block';
+
+    // Store current audio URL for download
+    window.currentAudioUrl = audioUrl;
+
+    // Auto-play if enabled
+    if (audioEnabled) {
+        audioPlayer.play().catch(err => console.log('Audio play failed:', err));
+    }
+}
+
 // Display messages
 function displayMessages() {
     const wrapper = document.getElementById('messagesWrapper');
@@ -371,6 +495,7 @@ function saveChatToHistory() {
         chatHistory[existingIndex] = {
             title: title,
             messages: JSON.parse(JSON.stringify(currentChat)), // Deep copy
+            sessionId: currentSessionId,
             timestamp: new Date()
         };
     } else {
@@ -378,6 +503,7 @@ function saveChatToHistory() {
         chatHistory.push({
             title: title,
             messages: JSON.parse(JSON.stringify(currentChat)), // Deep copy
+            sessionId: currentSessionId,
             timestamp: new Date()
         });
     }
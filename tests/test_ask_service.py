@@ -0,0 +1,88 @@
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+from services import answer_cache, ask_service
+from services.ask_service import answer_batch
+
+
+def results_by_id(questions):
+    return {result['id']: result for result in answer_batch(questions)}
+
+
+@pytest.mark.parametrize("entry, error", [
+    ("What is the price of rice?", "Each entry must be an object"),
+    ({"question": ""}, "Question cannot be empty"),
+    ({"question": "   "}, "Question cannot be empty"),
+    ({"question": ["price of rice"]}, "question must be a string"),
+    ({"question": "price of rice", "language": ["x"]}, "language must be one of: English, Hindi"),
+    ({"question": "price of rice", "language": {"name": "Hindi"}}, "language must be one of: English, Hindi"),
+    ({"question": "price of rice", "language": "Tamil"}, "language must be one of: English, Hindi"),
+    ({"question": "price of rice", "location": 411001}, "location must be a string"),
+])
+def test_invalid_entries_get_their_own_400(entry, error):
+    results = results_by_id([entry, {"id": "ok", "question": "What is the price of rice?"}])
+    assert results[0] == {'id': 0, 'status': 400, 'error': error}
+    assert results["ok"]["status"] == 200
+
+
+def test_crop_context_failure_is_reported_per_question(monkeypatch):
+    def broken(crop, language):
+        raise RuntimeError("catalog unavailable")
+    monkeypatch.setattr(ask_service, "get_crop_context", broken)
+
+    results = results_by_id([
+        {"id": "a", "question": "What is the price of rice?"},
+        {"id": "b", "question": "What is the price of rice?"},
+    ])
+    for entry_id in ("a", "b"):
+        assert results[entry_id]['status'] == 500
+        assert "catalog unavailable" in results[entry_id]['error']
+
+
+def test_standalone_question_is_cached_on_later_turns(monkeypatch):
+    monkeypatch.setattr(answer_cache, "_memory", answer_cache.TTLCache(8, 60))
+    monkeypatch.setattr(answer_cache, "_disk", None)
+    question = "What is the price of rice?"
+    first_turn = {'messages': [], 'summary': []}
+    second_turn = {'messages': [
+        {'type': 'user', 'content': 'How do I control pests in wheat?'},
+        {'type': 'assistant', 'content': 'Use neem oil early in the season.'},
+    ], 'summary': []}
+
+    _, first_key = ask_service.compose_prompt(question, "English", first_turn, "Rice", {})
+    answer_cache.store(first_key, "Rice sells for ₹38/kg.")
+    prompt, second_key = ask_service.compose_prompt(question, "English", second_turn, "Rice", {})
+    assert answer_cache.lookup(second_key) == "Rice sells for ₹38/kg."
+    assert "neem oil" not in prompt
+
+    follow_up = "Why does that happen?"
+    prompt, key = ask_service.compose_prompt(follow_up, "English", second_turn, None, {})
+    assert key is None
+    assert "neem oil" in prompt
+
+
+def test_shared_stream_takes_one_admission_slot(monkeypatch):
+    admitted = []
+
+    @contextmanager
+    def llm_slot():
+        admitted.append(threading.current_thread().name)
+        yield
+
+    monkeypatch.setattr(ask_service, "llm_slot", llm_slot)
+    release = threading.Event()
+
+    def stream_answer(prompt):
+        release.wait(2)
+        yield "Rice sells for ₹38/kg."
+
+    monkeypatch.setattr(ask_service, "stream_answer", stream_answer)
+    key = answer_cache.make_key("When should I sell my rice?", "Rice", "English", None)
+    streams = [
+        answer_cache.stream_or_join(key, lambda: ask_service.admitted_stream("prompt")) for _ in range(3)
+    ]
+    release.set()
+    assert ["".join(ask_service.started_stream(chunks)) for chunks in streams] == ["Rice sells for ₹38/kg."] * 3
+    assert admitted == ["stream-flight"]
@@ -0,0 +1,161 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from services import catalog, catalog_sync
+from services.catalog import CatalogSnapshot, get_snapshot, load_snapshot_from_cache
+
+SHEETS = os.path.join(os.path.dirname(__file__), "fixtures", "sheets")
+
+
+def sheet(name):
+    return os.path.join(SHEETS, name)
+
+
+def read(name):
+    with open(sheet(name), "rb") as f:
+        return f.read()
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(catalog_sync, "CATALOG_CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def sheet_server():
+    """Serves crops.csv with an ETag and answers a matching If-None-Match with 304"""
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_seen.append(dict(self.headers))
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = read("crops.csv")
+            self.send_response(200)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Last-Modified", "Sun, 18 Oct 2026 06:00:00 GMT")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/crops.csv", requests_seen
+    server.shutdown()
+
+
+@pytest.fixture
+def synced_sheets(cache_dir, monkeypatch):
+    monkeypatch.setitem(catalog_sync.SHEETS, "crops", (sheet("crops.csv"),) + catalog_sync.SHEETS["crops"][1:])
+    monkeypatch.setitem(
+        catalog_sync.SHEETS, "fertilizers",
+        (sheet("fertilizers.csv"),) + catalog_sync.SHEETS["fertilizers"][1:],
+    )
+    return cache_dir
+
+
+def test_fetch_sheet_sends_validators_and_handles_304(sheet_server):
+    url, requests_seen = sheet_server
+    data, validators = catalog_sync.fetch_sheet(url, {})
+    assert data == read("crops.csv")
+    assert validators == {"etag": '"v1"', "last_modified": "Sun, 18 Oct 2026 06:00:00 GMT"}
+
+    assert catalog_sync.fetch_sheet(url, validators) == (None, validators)
+    assert requests_seen[-1]["If-None-Match"] == '"v1"'
+    assert requests_seen[-1]["If-Modified-Since"] == "Sun, 18 Oct 2026 06:00:00 GMT"
+
+
+def test_fetch_sheet_compares_local_files_by_mtime(tmp_path):
+    path = tmp_path / "crops.csv"
+    path.write_bytes(read("crops.csv"))
+    data, validators = catalog_sync.fetch_sheet(str(path), {})
+    assert data == read("crops.csv")
+    assert catalog_sync.fetch_sheet(str(path), validators) == (None, validators)
+
+    os.utime(path, (validators["mtime"] + 10, validators["mtime"] + 10))
+    data, _ = catalog_sync.fetch_sheet(str(path), validators)
+    assert data == read("crops.csv")
+
+
+def test_normalize_sheet():
+    _, key, columns = catalog_sync.SHEETS["crops"]
+    df = catalog_sync.normalize_sheet(read("crops.csv"), key, columns)
+    assert list(df.columns) == list(columns)
+    # Stripped, deduplicated case-insensitively (first row wins), nameless rows dropped
+    assert list(df["crop_name"]) == ["Rice", "Wheat"]
+    assert df["description"][0] == "Staple grain grown in flooded fields"
+    assert df["description_hi"].isna().all()
+    assert df["price_per_kg_inr"][0] == 38
+    assert df["price_per_kg_inr"].isna()[1]
+
+
+def test_normalize_sheet_rejects_missing_columns():
+    _, key, columns = catalog_sync.SHEETS["crops"]
+    with pytest.raises(ValueError, match="price_per_kg_inr"):
+        catalog_sync.normalize_sheet(read("crops_missing_price.csv"), key, columns)
+
+
+def test_sync_with_a_missing_column_writes_nothing(cache_dir, monkeypatch):
+    monkeypatch.setitem(catalog_sync.SHEETS, "crops", (sheet("crops.csv"),) + catalog_sync.SHEETS["crops"][1:])
+    monkeypatch.setitem(
+        catalog_sync.SHEETS, "fertilizers",
+        (sheet("crops_missing_price.csv"),) + catalog_sync.SHEETS["fertilizers"][1:],
+    )
+    with pytest.raises(ValueError):
+        catalog_sync.sync_catalog(to_database=False)
+    assert os.listdir(cache_dir) == []
+
+
+def test_load_snapshot_from_cache(synced_sheets):
+    assert load_snapshot_from_cache() is None
+
+    assert catalog_sync.sync_catalog(to_database=False) == {"crops": 2, "fertilizers": 3}
+    assert catalog_sync.sync_catalog(to_database=False) == {"crops": "not modified", "fertilizers": "not modified"}
+
+    snapshot = load_snapshot_from_cache()
+    assert snapshot.source == "local"
+    assert sorted(snapshot.crops) == ["rice", "wheat"]
+    assert snapshot.crops["wheat"]["crop_name_hi"] == "गेहूं"
+    assert snapshot.crops["wheat"]["crop_id"] is None
+    assert [row[0] for row in snapshot.fertilizers["rice"]] == ["Urea"]
+    assert [row[0] for row in snapshot.fertilizers["wheat"]] == ["Urea", "DAP"]
+    assert snapshot.rotations == {}
+
+
+def test_startup_serves_the_local_catalog_without_waiting_for_the_database(synced_sheets, monkeypatch):
+    catalog_sync.sync_catalog(to_database=False)
+    database_snapshot = CatalogSnapshot({}, {}, {}, source="database")
+    release = threading.Event()
+    loaded_by = []
+
+    def load_from_database():
+        loaded_by.append(threading.current_thread().name)
+        release.wait(2)
+        return database_snapshot
+
+    monkeypatch.setattr(catalog, "load_snapshot_from_database", load_from_database)
+    monkeypatch.setattr(catalog, "_snapshot", None)
+    monkeypatch.setattr(catalog, "_last_attempt", float("-inf"))
+    monkeypatch.setattr(catalog, "_last_ok", False)
+
+    snapshot = get_snapshot()
+    assert snapshot.source == "local"
+    assert sorted(snapshot.crops) == ["rice", "wheat"]
+
+    release.set()
+    deadline = time.monotonic() + 2
+    while get_snapshot() is not database_snapshot:
+        assert time.monotonic() < deadline, "database snapshot never swapped in"
+        time.sleep(0.005)
+    assert loaded_by == ["catalog-refresh"]
@@ -0,0 +1,37 @@
+import pytest
+
+from services.catalog import EMPTY_SNAPSHOT
+from services.crop_matcher import CropMatcher, load_catalog_names
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return CropMatcher(load_catalog_names(EMPTY_SNAPSHOT))
+
+
+@pytest.mark.parametrize("question, crops", [
+    ("tur dal price today", ["pigeon pea"]),
+    ("alu ki fasal me kya daalein", ["potato"]),
+    ("jau kab boyein", ["barley"]),
+    ("ikh ki kheti", ["sugarcane"]),
+    ("kanda ka bhav", ["onion"]),
+    ("गेहूं के बाद चना", ["wheat", "chickpea"]),
+    ("growing onions and tomatoes", ["onion", "tomato"]),
+])
+def test_finds_crops(matcher, question, crops):
+    assert matcher.find_all(question) == crops
+
+
+@pytest.mark.parametrize("question", [
+    "Will it rain in the future?",
+    "Turn the soil on Saturday",
+    "Is turmeric good value?",
+    "My cow has jaundice",
+    "The salukis ate the seeds",
+    "Kandahar weather",
+    "Ikhtiyar is my village",
+    "How many turs of water?",
+    "alus and jaus",
+])
+def test_short_aliases_match_whole_words_only(matcher, question):
+    assert matcher.find_all(question) == []
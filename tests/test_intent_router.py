@@ -0,0 +1,67 @@
+import pytest
+
+from services.crop_context import get_crop_context
+from services.intent_router import answer_from_context, is_confident, route
+
+WEATHER = ("\n📍 Location: Pune\n🌡️ Temperature: 28°C\n", {"city": "Pune", "temp": 28})
+
+
+@pytest.mark.parametrize("question", [
+    "What is the weather today?",
+    "Will it rain tomorrow?",
+    "आज मौसम कैसा रहेगा",
+    "कल बारिश होगी क्या",
+])
+def test_weather_questions(question):
+    assert is_confident(route(question), "weather")
+
+
+@pytest.mark.parametrize("question, crop", [
+    ("Can I plant rice tomorrow if it rains?", "rice"),
+    ("Should I sow wheat before the rain?", "wheat"),
+    ("Will it rain tomorrow? I want to sow", None),
+    ("How much urea before the rain?", None),
+    ("कल बारिश होगी क्या मैं गेहूं बो सकता हूं", "wheat"),
+    ("बारिश के बाद क्या मैं धान बो सकती हूं", "rice"),
+])
+def test_planting_questions_do_not_get_the_weather_template(question, crop):
+    intent = route(question)
+    assert not is_confident(intent, "weather")
+    assert answer_from_context(intent, crop, "English", {"weather": WEATHER}) is None
+
+
+def test_weather_template_is_refused_when_a_crop_is_named():
+    intent = route("Weather forecast for my wheat field today")
+    assert is_confident(intent, "weather")
+    assert answer_from_context(intent, "wheat", "English", {"weather": WEATHER}) is None
+    assert answer_from_context(intent, None, "English", {"weather": WEATHER}) == WEATHER[0].strip()
+
+
+@pytest.mark.parametrize("language", ["English", "Hindi"])
+def test_rotation_without_data_goes_to_the_model(language):
+    intent = route("What should I grow after okra?")
+    assert is_confident(intent, "rotation")
+    context = {"crop": get_crop_context("okra", language)}
+    assert answer_from_context(intent, "okra", language, context) is None
+
+
+def test_rotation_with_data_is_answered():
+    intent = route("What should I grow after rice?")
+    context = {"crop": get_crop_context("rice", "English")}
+    assert "Wheat" in answer_from_context(intent, "rice", "English", context)
+
+
+def test_crop_context_holds_records():
+    context = get_crop_context("rice", "Hindi")
+    assert isinstance(context.info, dict) and context.info["name"]
+    assert all(isinstance(rotation, dict) for rotation in context.rotations)
+    assert f"फसल: {context.info['name_hi'] or context.info['name']}" in context.for_model()
+
+
+def test_unknown_crop_has_empty_context_and_no_template_answer():
+    context = get_crop_context("okra", "English")
+    assert (context.info, context.fertilizers, context.fertilizer_advice, context.rotations) == (None, [], None, [])
+    assert "No crop rotation data available." in context.for_model()
+    intent = route("Which fertilizer for okra?")
+    assert is_confident(intent, "fertilizer")
+    assert answer_from_context(intent, "okra", "English", {"crop": context}) is None
@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from services import llm_limiter
+from services.llm_limiter import LLMLimiter, LLMOverloaded
+
+
+def limiter(name, max_queue=10, queue_timeout=5.0):
+    """One call at a time and no rate limit, so only release() lets waiters in"""
+    return LLMLimiter(f"test-{name}", 1, 0, 1, max_queue, queue_timeout)
+
+
+def wait_for_queue(limiter, length):
+    deadline = time.monotonic() + 2
+    while limiter.stats()["queued"] < length:
+        assert time.monotonic() < deadline, "waiter never queued"
+        time.sleep(0.005)
+
+
+def test_full_queue_is_rejected():
+    busy = limiter("queue-full", max_queue=1)
+    busy.acquire()
+    waiter = threading.Thread(target=lambda: (busy.acquire(), busy.release()))
+    waiter.start()
+    wait_for_queue(busy, 1)
+
+    with pytest.raises(LLMOverloaded) as rejected:
+        busy.acquire()
+    assert rejected.value.reason == "queue_full"
+    assert rejected.value.retry_after >= 1
+    assert busy.stats()["rejected_queue_full"] == 1
+
+    busy.release()
+    waiter.join(2)
+    assert busy.stats()["in_flight"] == 0
+
+
+def test_wait_times_out():
+    busy = limiter("timeout", queue_timeout=0.2)
+    busy.acquire()
+    started = time.monotonic()
+    with pytest.raises(LLMOverloaded) as rejected:
+        busy.acquire()
+    assert rejected.value.reason == "timeout"
+    assert 0.2 <= time.monotonic() - started < 1.0
+    stats = busy.stats()
+    assert stats["rejected_timeout"] == 1
+    assert stats["queued"] == 0
+
+
+def test_waiters_are_admitted_in_arrival_order():
+    busy = limiter("fifo")
+    busy.acquire()
+    admitted = []
+
+    def call(number):
+        busy.acquire()
+        admitted.append(number)
+        busy.release()
+
+    threads = []
+    for number in range(5):
+        thread = threading.Thread(target=call, args=(number,))
+        thread.start()
+        threads.append(thread)
+        wait_for_queue(busy, number + 1)
+
+    busy.release()
+    for thread in threads:
+        thread.join(2)
+    assert admitted == [0, 1, 2, 3, 4]
+
+
+def test_budgets_are_split_over_processes(monkeypatch):
+    monkeypatch.setattr(llm_limiter, "_limiters", {})
+    monkeypatch.setattr(llm_limiter, "LLM_MAX_CONCURRENCY", 32)
+    monkeypatch.setattr(llm_limiter, "LLM_RATE_PER_SECOND", 10.0)
+    monkeypatch.setattr(llm_limiter, "LLM_BURST", 20)
+    monkeypatch.setattr(llm_limiter, "_process_count", 1)
+    llm_limiter.set_process_count(4)
+
+    split = llm_limiter.get_limiter("test-split")
+    assert (split.max_concurrency, split.rate, split.burst) == (8, 2.5, 5)
@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+import pytest
+
+from bench.stubs import StubSettings, start_stub_server
+from services import location_service
+from utils.aio import close_http_client
+
+
+@pytest.fixture
+def geo_stub():
+    """Start a geolocation stub with the given latency; returns its /geo URL template"""
+    servers = []
+
+    def start(latency=0.05, error_rate=0.0):
+        settings = StubSettings(latencies={"geo": latency}, error_rates={"geo": error_rate})
+        server, base_url = start_stub_server(settings)
+        servers.append(server)
+        return f"{base_url}/geo/{{ip}}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(location_service, "_cache", location_service.TTLCache(100, 60))
+
+
+def race(client_ip, use_async):
+    if not use_async:
+        return location_service._race_providers(client_ip)
+
+    async def run():
+        try:
+            return await location_service._race_providers_async(client_ip)
+        finally:
+            await close_http_client()
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_fastest_provider_wins(geo_stub, monkeypatch, use_async):
+    monkeypatch.setattr(location_service, "PROVIDERS", [geo_stub(latency=2.0), geo_stub(latency=0.05)])
+    started = time.monotonic()
+    location = race("8.8.8.8", use_async)
+    assert location and location.endswith(", India")
+    assert time.monotonic() - started < 1.0
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_failing_provider_is_skipped(geo_stub, monkeypatch, use_async):
+    monkeypatch.setattr(location_service, "PROVIDERS", [geo_stub(error_rate=1.0), geo_stub(latency=0.2)])
+    assert race("8.8.8.8", use_async).endswith(", India")
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_race_gives_up_at_the_timeout(geo_stub, monkeypatch, use_async):
+    monkeypatch.setattr(location_service, "PROVIDERS", [geo_stub(latency=3.0)])
+    monkeypatch.setattr(location_service, "LOCATION_TIMEOUT", 0.3)
+    started = time.monotonic()
+    assert race("8.8.8.8", use_async) is None
+    assert time.monotonic() - started < 1.0
+
+
+def test_failed_lookup_falls_back_and_is_cached(geo_stub, monkeypatch):
+    monkeypatch.setattr(location_service, "PROVIDERS", [geo_stub(error_rate=1.0)])
+    assert location_service.get_location_from_ip("8.8.8.8") == location_service.DEFAULT_LOCATION
+    monkeypatch.setattr(location_service, "PROVIDERS", [geo_stub()])
+    # Same /24: served from the negative cache entry without asking the providers
+    assert location_service.get_location_from_ip("8.8.8.9") == location_service.DEFAULT_LOCATION
+
+
+@pytest.mark.parametrize("forwarded_for, remote_addr, proxies, expected", [
+    ("1.2.3.4", "10.0.0.1", 1, "1.2.3.4"),
+    # A client-supplied entry left of the one our proxy appended is ignored
+    ("9.9.9.9, 1.2.3.4", "10.0.0.1", 1, "1.2.3.4"),
+    ("9.9.9.9, 1.2.3.4, 10.0.0.2", "10.0.0.1", 2, "1.2.3.4"),
+    ("9.9.9.9", "1.2.3.4", 0, "1.2.3.4"),
+    (None, "1.2.3.4", 1, "1.2.3.4"),
+    ("1.2.3.4", "10.0.0.1", 2, None),
+    ("192.168.1.5", "10.0.0.1", 1, None),
+    ("not-an-ip", "10.0.0.1", 1, None),
+])
+def test_client_ip_from_request(monkeypatch, forwarded_for, remote_addr, proxies, expected):
+    monkeypatch.setattr(location_service, "TRUSTED_PROXY_COUNT", proxies)
+    assert location_service.client_ip_from_request(forwarded_for, remote_addr) == expected
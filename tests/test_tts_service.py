@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+from services import tts_service
+from services.tts_service import get_audio_status
+
+JOB_ID = "0" * 64
+
+
+@pytest.fixture
+def spool_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tts_service, "TTS_SPOOL_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_unknown_job_is_missing(spool_dir):
+    assert get_audio_status(JOB_ID) is None
+    assert get_audio_status("../etc/passwd") is None
+
+
+def test_job_queued_by_another_worker_is_pending(spool_dir):
+    (spool_dir / f"{JOB_ID}.pending").touch()
+    assert get_audio_status(JOB_ID)["status"] == "pending"
+
+    (spool_dir / f"{JOB_ID}.mp3").write_bytes(b"ID3")
+    status = get_audio_status(JOB_ID)
+    assert status["status"] == "ready"
+    assert status["filename"] == f"{JOB_ID}.mp3"
+
+
+def test_stale_pending_marker_is_ignored(spool_dir):
+    marker = spool_dir / f"{JOB_ID}.pending"
+    marker.touch()
+    stale = os.path.getmtime(marker) - tts_service.PENDING_MARKER_MAX_AGE - 1
+    os.utime(marker, (stale, stale))
+    assert get_audio_status(JOB_ID, wait=1) is None
@@ -0,0 +1,48 @@
+"""Shared asyncio plumbing for the ASGI app (asgi_app.py)."""
+import asyncio
+import os
+
+from config.config import ASYNC_HTTP_MAX_CONNECTIONS
+
+_client = None
+_background = set()
+
+
+def _reset_after_fork():
+    global _client, _background
+    _client = None
+    _background = set()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def http_client():
+    """Process-wide httpx.AsyncClient, created on first use inside the event loop"""
+    global _client
+    if _client is None:
+        import httpx
+
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=ASYNC_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=ASYNC_HTTP_MAX_CONNECTIONS // 2,
+            ),
+            timeout=10,
+        )
+    return _client
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def run_in_background(coro):
+    """Start a fire-and-forget task, keeping a reference until it finishes"""
+    task = asyncio.ensure_future(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return task
@@ -0,0 +1,270 @@
+"""Small thread-safe in-memory caches shared by the services.
+
+Caches and flights given a `name` count their lookups and coalesced
+calls in utils.metrics under that name.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from contextvars import copy_context
+
+from utils.metrics import CACHE_LOOKUPS, COALESCED_CALLS
+
+
+class TTLCache:
+    """LRU cache whose entries expire after a per-entry time-to-live"""
+
+    def __init__(self, maxsize, ttl, name=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+    def _count(self, result):
+        if self.name:
+            CACHE_LOOKUPS.inc(cache=self.name, result=result)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self._count("miss")
+                return default
+            self._data.move_to_end(key)
+            self._count("hit")
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class _Flight:
+    """Base of the flights: counts callers that joined a call in flight"""
+
+    def _joined(self):
+        if self.name:
+            COALESCED_CALLS.inc(cache=self.name)
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(_Flight):
+    """Collapse concurrent calls for the same key into one execution"""
+
+    def __init__(self, name=None):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.name = name
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self._joined()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+
+class AsyncSingleFlight(_Flight):
+    """SingleFlight for coroutines running on one event loop.
+
+    The first caller's coroutine runs as its own task, so it completes for
+    the others even if that caller is cancelled (e.g. the client went away).
+    """
+
+    def __init__(self, name=None):
+        self._calls = {}
+        self.name = name
+
+    def _finished(self, key, task):
+        self._calls.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # mark retrieved when every waiter has gone
+
+    async def do(self, key, fn):
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: self._finished(key, t))
+        else:
+            self._joined()
+        return await asyncio.shield(task)
+
+    def in_flight(self, key):
+        return key in self._calls
+
+
+class _Stream:
+    __slots__ = ("chunks", "done", "error", "changed", "task")
+
+    def __init__(self, changed):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.changed = changed
+        self.task = None
+
+
+class StreamFlight(_Flight):
+    """SingleFlight for streamed results: one producer per key, shared by
+    every concurrent caller.
+
+    The producer runs on its own thread, so it completes even if the caller
+    that started it goes away. Each caller replays the chunks produced so
+    far and then follows the stream as it grows.
+    """
+
+    def __init__(self, name=None):
+        self._streams = {}
+        self._lock = threading.Lock()
+        self.name = name
+
+    def stream(self, key, produce):
+        """Iterator over the chunks of produce() for key"""
+        with self._lock:
+            shared = self._streams.get(key)
+            leader = shared is None
+            if leader:
+                shared = self._streams[key] = _Stream(threading.Condition())
+            else:
+                self._joined()
+        if leader:
+            threading.Thread(
+                target=copy_context().run, args=(self._produce, key, shared, produce),
+                name="stream-flight", daemon=True,
+            ).start()
+        return self._follow(shared)
+
+    def _produce(self, key, shared, produce):
+        try:
+            for chunk in produce():
+                with shared.changed:
+                    shared.chunks.append(chunk)
+                    shared.changed.notify_all()
+        except BaseException as e:
+            shared.error = e
+        finally:
+            with self._lock:
+                del self._streams[key]
+            with shared.changed:
+                shared.done = True
+                shared.changed.notify_all()
+
+    @staticmethod
+    def _follow(shared):
+        position = 0
+        while True:
+            with shared.changed:
+                while position == len(shared.chunks) and not shared.done:
+                    shared.changed.wait()
+                chunks = shared.chunks[position:]
+                done = shared.done
+            position += len(chunks)
+            yield from chunks
+            if done:
+                if shared.error is not None:
+                    raise shared.error
+                return
+
+
+class AsyncStreamFlight(_Flight):
+    """StreamFlight for async generators on one event loop; the producer
+    runs as its own task"""
+
+    def __init__(self, name=None):
+        self._streams = {}
+        self.name = name
+
+    def stream(self, key, produce):
+        """Async iterator over the chunks of produce() for key"""
+        shared = self._streams.get(key)
+        if shared is None:
+            shared = self._streams[key] = _Stream(asyncio.Event())
+            shared.task = asyncio.ensure_future(self._produce(key, shared, produce))
+        else:
+            self._joined()
+        return self._follow(shared)
+
+    def _notify(self, shared):
+        changed, shared.changed = shared.changed, asyncio.Event()
+        changed.set()
+
+    async def _produce(self, key, shared, produce):
+        try:
+            async for chunk in produce():
+                shared.chunks.append(chunk)
+                self._notify(shared)
+        except BaseException as e:
+            shared.error = e
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            del self._streams[key]
+            shared.done = True
+            self._notify(shared)
+
+    @staticmethod
+    async def _follow(shared):
+        position = 0
+        while True:
+            changed = shared.changed
+            chunks = shared.chunks[position:]
+            done = shared.done
+            position += len(chunks)
+            for chunk in chunks:
+                yield chunk
+            if done:
+                if shared.error is not None:
+                    raise shared.error
+                return
+            await changed.wait()
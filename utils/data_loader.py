@@ -1,7 +1,8 @@
-import pandas as pd
+import io
 
-def load_sheet(url):
-    df = pd.read_csv(url)
+
+def normalize_columns(df):
+    """Sheet headers as column names: "Crop Name" -> "crop_name" """
     df.columns = (
         df.columns
         .str.strip()
@@ -9,3 +10,14 @@ def load_sheet(url):
         .str.replace(" ", "_")
     )
     return df
+
+
+def parse_sheet(data):
+    """DataFrame from downloaded CSV bytes"""
+    import pandas as pd  # only needed here; keeps pandas out of app startup
+    return normalize_columns(pd.read_csv(io.BytesIO(data)))
+
+
+def load_sheet(url):
+    import pandas as pd
+    return normalize_columns(pd.read_csv(url))
@@ -0,0 +1,267 @@
+"""Request-scoped timing spans and process metrics in Prometheus text format.
+
+Counters, gauges and histograms live in a process-wide registry that
+`render()` writes in the Prometheus exposition format. `span(stage)`
+times a block into the stage latency histogram and into the current
+request's span list, which is logged with its request ID when the
+request finishes. Request state is held in context variables; code that
+hands work to a thread pool should submit `copy_context().run` so spans
+from worker threads land in the right request.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+_request_id = contextvars.ContextVar("request_id", default=None)
+_spans = contextvars.ContextVar("spans", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labels, key)} {value}" for key, value in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    @contextmanager
+    def track(self, **labels):
+        """Count the block as in progress while it runs"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = self._header()
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                labels = _format_labels(self.labels, key, [f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "krishisahay_stage_seconds", "Latency of each request stage", labels=("stage",)
+)
+STAGE_ERRORS = Counter(
+    "krishisahay_stage_errors_total", "Stages that raised or missed their deadline", labels=("stage", "reason")
+)
+FALLBACKS = Counter(
+    "krishisahay_fallbacks_total", "Answers built from fallback data instead of the live source", labels=("kind",)
+)
+REQUEST_SECONDS = Histogram(
+    "krishisahay_request_seconds", "HTTP request latency", labels=("endpoint", "status")
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "krishisahay_requests_in_flight", "HTTP requests currently being served", labels=("endpoint",)
+)
+LLM_IN_FLIGHT = Gauge(
+    "krishisahay_llm_in_flight", "Gemini calls in progress", labels=("model",)
+)
+LLM_QUEUE_LENGTH = Gauge(
+    "krishisahay_llm_queue_length", "Requests waiting for a Gemini slot", labels=("model",)
+)
+LLM_QUEUE_SECONDS = Histogram(
+    "krishisahay_llm_queue_wait_seconds", "Time spent waiting for a Gemini slot", labels=("model",)
+)
+LLM_REJECTIONS = Counter(
+    "krishisahay_llm_rejections_total", "Requests turned away by Gemini admission control",
+    labels=("model", "reason")
+)
+CACHE_LOOKUPS = Counter(
+    "krishisahay_cache_lookups_total", "Cache lookups by cache and result (hit, stale or miss)",
+    labels=("cache", "result")
+)
+COALESCED_CALLS = Counter(
+    "krishisahay_coalesced_calls_total", "Calls that joined an identical call already in flight", labels=("cache",)
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "krishisahay_db_pool_connections", "Pooled database connections by state (idle or in_use)", labels=("state",)
+)
+DB_POOL_EVENTS = Counter(
+    "krishisahay_db_pool_events_total",
+    "Database pool events (opened, discarded, healthcheck, wait_timeout)", labels=("event",)
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "krishisahay_db_pool_wait_seconds", "Time to check out a database connection"
+)
+TTS_JOBS = Gauge(
+    "krishisahay_tts_jobs", "Audio jobs waiting for or held by a TTS worker", labels=("state",)
+)
+TTS_JOB_OUTCOMES = Counter(
+    "krishisahay_tts_job_outcomes_total", "Audio jobs by outcome (completed, failed, rejected)", labels=("outcome",)
+)
+TTS_QUEUE_SECONDS = Histogram(
+    "krishisahay_tts_queue_wait_seconds", "Time an audio job waited for a TTS worker"
+)
+TTS_SYNTHESIS_SECONDS = Histogram(
+    "krishisahay_tts_synthesis_seconds", "Time to synthesize one answer's audio", labels=("status",)
+)
+TTS_EVICTIONS = Counter(
+    "krishisahay_tts_evictions_total", "Audio files removed to keep the store within TTS_CACHE_MAX_BYTES"
+)
+SESSION_OPERATIONS = Counter(
+    "krishisahay_session_operations_total", "Chat session store operations by result (ok, miss or error)",
+    labels=("operation", "result")
+)
+HISTORY_MESSAGES_FOLDED = Counter(
+    "krishisahay_history_messages_folded_total", "Older chat messages folded into a conversation summary"
+)
+LLM_PROMPT_TOKENS = Histogram(
+    "krishisahay_llm_prompt_tokens", "Approximate prompt tokens per LLM call", buckets=SIZE_BUCKETS
+)
+LLM_RESPONSE_TOKENS = Histogram(
+    "krishisahay_llm_response_tokens", "Approximate response tokens per LLM call", buckets=SIZE_BUCKETS
+)
+
+
+def _reset_after_fork():
+    """Locks held by another thread at fork time would never be released in the child"""
+    global _registry_lock
+    _registry_lock = threading.Lock()
+    for metric in _registry:
+        metric._lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+def start_request(request_id=None):
+    """Begin a request scope; returns its request ID"""
+    request_id = request_id or uuid.uuid4().hex
+    _request_id.set(request_id)
+    _spans.set([])
+    return request_id
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+def current_spans():
+    """The current request's span list, which later spans keep appending to"""
+    return _spans.get()
+
+
+def request_spans(spans=None):
+    """{stage: total milliseconds} for the spans of a request (default: current)"""
+    totals = {}
+    for stage, seconds in (spans if spans is not None else _spans.get()) or []:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    return {stage: round(seconds * 1000, 1) for stage, seconds in totals.items()}
+
+
+@contextmanager
+def span(stage):
+    """Time a block as one stage of the current request"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        spans = _spans.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+
+def log_event(event, **fields):
+    """Print a structured (JSON) log line tagged with the current request ID"""
+    record = {"event": event, "request_id": _request_id.get(), **fields}
+    print(json.dumps(record, ensure_ascii=False, default=str))
@@ -1,132 +1,65 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory
-import os
-import tempfile
-import google.genai as genai
-from gtts import gTTS
-from config.config import MODEL_NAME, client
-from services.crop_service import retrieve_crop_info
-from services.fertilizer_service import retrieve_fertilizer_info
-from services.crop_rotation_service import retrieve_crop_rotation_info
-from services.location_service import get_location_from_ip
-from services.weather_service import get_weather_by_location
+from flask import Flask, Response, g, render_template, request, jsonify, send_from_directory, stream_with_context
+import time
+from config.config import TTS_SPOOL_DIR, AUDIO_STATUS_MAX_WAIT
+from services.ask_service import (
+    REQUEST_ID, admitted_stream, answer_batch, audio_fields, batch_error, build_prompt, detect_crop,
+    direct_answer, generate_answer, ndjson_line, resolve_session, sse_event, started_stream,
+)
+from services.catalog import get_snapshot, start_catalog_listener
+from services.crop_matcher import get_crop_matcher
+from services.session_store import append_turn
+from services import answer_cache
+from services.llm_limiter import LLMOverloaded
+from services.location_service import client_ip_from_request
+from services.tts_service import get_audio_status, is_audio_filename
+from utils import metrics
 
 app = Flask(__name__, template_folder='templates', static_folder='static')
 
-# Initialize Gemini using the client from config
-
-# Language text mapping
-LANG_TEXT = {
-    "English": {
-        "title": "KrishiSahay - Your AI Farming Assistant",
-        "subtitle": "Powered by Advanced Agriculture AI",
-        "question_label": "Farmer's Question",
-        "question_placeholder": "Ask me about farming, crops, weather, fertilizers...",
-        "language_label": "Language",
-        "submit": "Submit",
-        "missing_crop": "Please mention the crop name so I can help you.",
-        "new_chat": "New Chat",
-        "chat_history": "Chat History",
-        "settings": "Settings",
-        "help": "Help",
-        "welcome": "Welcome to KrishiSahay",
-        "welcome_desc": "Your AI-Powered Farming Intelligence Assistant",
-        "ask_crops": "Ask about crops",
-        "ask_crops_desc": "Get expert advice on cultivation",
-        "fertilizer_info": "Fertilizer info",
-        "fertilizer_desc": "Learn about fertilizers & nutrients",
-        "crop_rotation": "Crop rotation",
-        "crop_rotation_desc": "Optimize your crop rotation plan",
-        "weather_info": "Weather info",
-        "weather_desc": "Get local weather insights",
-        "send": "Send message (Ctrl+Enter)",
-        "press_ctrl": "Press Ctrl+Enter to send",
-        "thinking": "KrishiSahay is thinking...",
-        "enable_audio": "Enable audio responses",
-        "enable_animations": "Enable animations",
-        "error": "Error",
-        "unknown_error": "Unknown error occurred",
-        "request_failed": "Request failed",
-        "please_enter": "Please enter a question!"
-    },
-    "Hindi": {
-        "title": "कृषि सहाय - आपका AI कृषि सहायक",
-        "subtitle": "उन्नत कृषि AI द्वारा संचालित",
-        "question_label": "किसान का प्रश्न",
-        "question_placeholder": "मुझसे खेती, फसल, मौसम, उर्वरक के बारे में पूछें...",
-        "language_label": "भाषा",
-        "submit": "जमा करें",
-        "missing_crop": "कृपया फसल का नाम बताएं ताकि मैं आपकी मदद कर सकूं।",
-        "new_chat": "नई बातचीत",
-        "chat_history": "बातचीत का इतिहास",
-        "settings": "सेटिंग्स",
-        "help": "मदद",
-        "welcome": "कृषि सहाय में आपका स्वागत है",
-        "welcome_desc": "आपका AI-संचालित कृषि बुद्धिमत्ता सहायक",
-        "ask_crops": "फसलों के बारे में पूछें",
-        "ask_crops_desc": "खेती पर विशेषज्ञ सलाह प्राप्त करें",
-        "fertilizer_info": "उर्वरक जानकारी",
-        "fertilizer_desc": "उर्वरक और पोषक तत्वों के बारे में जानें",
-        "crop_rotation": "फसल चक्र",
-        "crop_rotation_desc": "अपनी फसल चक्र योजना को अनुकूलित करें",
-        "weather_info": "मौसम की जानकारी",
-        "weather_desc": "स्थानीय मौसम की जानकारी प्राप्त करें",
-        "send": "संदेश भेजें (Ctrl+Enter)",
-        "press_ctrl": "भेजने के लिए Ctrl+Enter दबाएं",
-        "thinking": "कृषि सहाय सोच रहा है...",
-        "enable_audio": "ऑडियो प्रतिक्रिया सक्षम करें",
-        "enable_animations": "एनिमेशन सक्षम करें",
-        "error": "त्रुटि",
-        "unknown_error": "अज्ञात त्रुटि हुई",
-        "request_failed": "अनुरोध विफल",
-        "please_enter": "कृपया एक प्रश्न दर्ज करें!"
-    }
-}
-
-
-import re
-
-def text_to_speech(text, language):
-    """Convert text to speech"""
-    lang_code = "hi" if language == "Hindi" else "en"
-    tts = gTTS(text=text, lang=lang_code)
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
-    tts.save(tmp.name)
-    return tmp.name
-
-
-def clean_text_for_audio(text):
-    """Clean text for better text-to-speech readability"""
-    # Replace ranges like "60-75" with "60 to 75"
-    text = re.sub(r'(\d+)\s*-\s*(\d+)', r'\1 to \2', text)
-    
-    # Remove extra spaces
-    text = re.sub(r'\s+', ' ', text)
-    
-    return text.strip()
-
-
-def match_crop_name(user_crop, candidates):
-    """Simple crop name matching"""
-    user_crop_lower = user_crop.lower()
-    for candidate in candidates:
-        if user_crop_lower in candidate.lower() or candidate.lower() in user_crop_lower:
-            return candidate
-    return None
-
-
-def get_crop_info_for_model(crop, language):
-    """Get crop information to provide context to the model"""
-    crop_info = retrieve_crop_info(crop, language)
-    fertilizer_info = retrieve_fertilizer_info(crop)
-    rotation_info = retrieve_crop_rotation_info(crop, language)
-    
-    context = f"""
-    Crop Information for {crop}:
-    Basic Info: {crop_info}
-    Fertilizer Requirements: {fertilizer_info}
-    Crop Rotation Tips: {rotation_info}
-    """
-    return context
+# Load the crop catalog and crop-name matcher into memory before serving
+# (under gunicorn, before workers fork). The listener that keeps them fresh
+# is started per worker by gunicorn's post_fork hook, or below when run
+# directly, so the gunicorn master holds no listener thread or connection.
+get_snapshot()
+get_crop_matcher()
+
+
+@app.before_request
+def start_request_metrics():
+    """Assign a request ID (honouring X-Request-ID) and count the request in flight"""
+    incoming = request.headers.get('X-Request-ID', '')
+    g.request_id = metrics.start_request(incoming if REQUEST_ID.match(incoming) else None)
+    g.request_started = time.perf_counter()
+    g.endpoint = request.endpoint or 'unknown'
+    metrics.REQUESTS_IN_FLIGHT.inc(endpoint=g.endpoint)
+
+
+@app.after_request
+def finish_request_metrics(response):
+    """Tag the response with its request ID and, once it has been sent
+    (for streams: once the stream has finished), record its latency and
+    log its stage spans"""
+    response.headers['X-Request-ID'] = g.request_id
+    endpoint, started, spans = g.endpoint, g.request_started, metrics.current_spans()
+    method, path, status = request.method, request.path, response.status_code
+
+    def finish():
+        elapsed = time.perf_counter() - started
+        metrics.REQUESTS_IN_FLIGHT.dec(endpoint=endpoint)
+        metrics.REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, status=status)
+        if endpoint not in ('static', 'prometheus_metrics'):
+            metrics.log_event(
+                'request',
+                request_id=response.headers['X-Request-ID'],
+                method=method,
+                path=path,
+                status=status,
+                duration_ms=round(elapsed * 1000, 1),
+                spans=metrics.request_spans(spans),
+            )
+
+    response.call_on_close(finish)
+    return response
 
 
 @app.route('/')
@@ -135,6 +68,15 @@ def index():
     return render_template('index.html')
 
 
+def overloaded_response(error):
+    """503 telling the client when to retry a request shed by admission control"""
+    response = jsonify({'error': 'The assistant is busy right now. Please try again shortly.',
+                        'retry_after': error.retry_after})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
 @app.route('/api/ask', methods=['POST'])
 def ask_question():
     """API endpoint to process farmer questions"""
@@ -142,107 +84,149 @@ def ask_question():
         data = request.json
         question = data.get('question', '').strip()
         language = data.get('language', 'English')
-        chat_history = data.get('chat_history', [])
         
         if not question:
             return jsonify({'error': 'Question cannot be empty'}), 400
         
-        # Build conversation context from chat history
-        conversation_context = ""
-        if chat_history:
-            conversation_context = "Previous conversation:\n"
-            for msg in chat_history[:-1]:  # Exclude the current question
-                role = "Farmer" if msg['type'] == 'user' else "KrishiSahay Assistant"
-                conversation_context += f"{role}: {msg['content']}\n\n"
+        session_id, session = resolve_session(data, question)
+        client_ip = client_ip_from_request(request.headers.get('X-Forwarded-For'), request.remote_addr)
         
-        # Simple crop detection
-        crop_found = None
-        crop_context = ""
-        for word in question.split():
-            try:
-                crop_info = retrieve_crop_info(word.lower(), language)
-                if crop_info:
-                    crop_found = word.lower()
-                    crop_context = get_crop_info_for_model(crop_found, language)
-                    break
-            except:
-                pass
-        
-        # Get weather data
-        user_location = get_location_from_ip()
-        weather_data = get_weather_by_location(user_location, language)
-        
-        # Create prompt for Gemini with conversation context
-        if crop_context:
-            prompt = f"""
-            You are an expert agricultural advisor. Answer questions directly and practically.
-            
-            {conversation_context}
-            
-            Crop Information: {crop_context}
-            
-            Current Weather: {weather_data}
-            
-            Farmer's Question: {question}
-            
-            LANGUAGE: You MUST respond ONLY in {language}. Do not mix languages. Every word must be in {language}.
-            
-            INSTRUCTIONS:
-            - Provide direct, practical advice without any greetings or flowery language.
-            - Do not start with "Namaste", "Hello", or any cultural greetings.
-            - Write in simple, easy-to-understand language.
-            - Format as continuous paragraphs without bullet points.
-            - This will be converted to audio, so keep it natural and conversational.
-            - Reference previous conversation if relevant to maintain context.
-            - Keep response to 2-3 paragraphs maximum.
-            """
-        else:
-            prompt = f"""
-            You are an expert agricultural advisor. Answer questions directly and practically.
-            
-            {conversation_context}
+        # Structured questions are answered from service data; the rest go to Gemini
+        crop_found = detect_crop(question)
+        answer = direct_answer(question, language, crop_found, client_ip)
+        if answer is None:
+            prompt, answer_key = build_prompt(question, language, session, crop_found, client_ip)
             
-            Current Location Weather: {weather_data}
-            
-            Farmer's Question: {question}
-            
-            LANGUAGE: You MUST respond ONLY in {language}. Do not mix languages. Every word must be in {language}.
-            
-            INSTRUCTIONS:
-            - Provide direct, practical advice without any greetings or flowery language.
-            - Do not start with "Namaste", "Hello", or any cultural greetings.
-            - Write in simple, easy-to-understand language.
-            - Format as continuous paragraphs without bullet points.
-            - This will be converted to audio, so keep it natural and conversational.
-            - Reference previous conversation if relevant to maintain context.
-            - Keep response to 2-3 paragraphs maximum.
-            """
+            # Get response from Gemini, reusing cached answers to repeated questions
+            if answer_key:
+                answer = answer_cache.get_or_generate(answer_key, lambda: generate_answer(prompt))
+            else:
+                answer = generate_answer(prompt)
+        
+        append_turn(session_id, session, question, answer)
+        return jsonify({'answer': answer, 'session_id': session_id, **audio_fields(answer, language)})
+    
+    except LLMOverloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return jsonify({'error': f'Error processing request: {str(e)}'}), 500
+
+
+@app.route('/api/ask/stream', methods=['POST'])
+def ask_question_stream():
+    """Stream the answer as Server-Sent Events while Gemini generates it.
+
+    Emits `token` events with text chunks, then one `done` event with the
+    full answer and its audio job, or an `error` event.
+    """
+    try:
+        data = request.json
+        question = data.get('question', '').strip()
+        language = data.get('language', 'English')
         
-        # Get response from Gemini
-        response = client.models.generate_content(model=MODEL_NAME, contents=prompt)
-        answer = response.text
+        if not question:
+            return jsonify({'error': 'Question cannot be empty'}), 400
         
-        # Clean text for audio
-        cleaned_answer = clean_text_for_audio(answer)
+        session_id, session = resolve_session(data, question)
+        client_ip = client_ip_from_request(request.headers.get('X-Forwarded-For'), request.remote_addr)
         
-        # Generate audio
-        audio_file = text_to_speech(cleaned_answer, language)
+        # Structured questions are answered from service data; the rest go to Gemini
+        crop_found = detect_crop(question)
+        cached = direct_answer(question, language, crop_found, client_ip)
+        prompt, answer_key = (None, None)
+        if cached is None:
+            prompt, answer_key = build_prompt(question, language, session, crop_found, client_ip)
+            if answer_key:
+                cached = answer_cache.lookup(answer_key)
         
-        return jsonify({
-            'answer': answer,
-            'audio_url': f'/audio/{os.path.basename(audio_file)}'
-        })
+        chunks = None
+        if cached is None:
+            # Only the request that starts a model call waits for admission;
+            # joining an identical question already streaming needs no slot
+            if answer_key:
+                chunks = answer_cache.stream_or_join(answer_key, lambda: admitted_stream(prompt))
+            else:
+                chunks = admitted_stream(prompt)
+            chunks = started_stream(chunks)
     
+    except LLMOverloaded as e:
+        return overloaded_response(e)
     except Exception as e:
         return jsonify({'error': f'Error processing request: {str(e)}'}), 500
 
+    def generate():
+        parts = []
+        try:
+            if cached is not None:
+                append_turn(session_id, session, question, cached)
+                yield sse_event('token', {'text': cached})
+                yield sse_event('done', {'answer': cached, 'session_id': session_id, **audio_fields(cached, language)})
+                return
+
+            for text in chunks:
+                parts.append(text)
+                yield sse_event('token', {'text': text})
+            answer = ''.join(parts)
+            append_turn(session_id, session, question, answer)
+            yield sse_event('done', {'answer': answer, 'session_id': session_id, **audio_fields(answer, language)})
+        except Exception as e:
+            yield sse_event('error', {'error': f'Error processing request: {str(e)}'})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/api/ask/batch', methods=['POST'])
+def ask_batch():
+    """Answer many questions at once (SMS/IVR gateways).
+
+    Streams NDJSON: one line per question, in the order they complete,
+    with the question's `id` and its own `status`.
+    """
+    data = request.get_json(silent=True)
+    error = batch_error(data)
+    if error:
+        return jsonify({'error': error[0]}), error[1]
+    lines = (ndjson_line(result) for result in answer_batch(data['questions']))
+    return Response(
+        stream_with_context(lines),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/audio/status/<job_id>')
+def audio_status(job_id):
+    """Report whether an answer's audio is ready; ?wait=N long-polls up to N
+    seconds, capped at AUDIO_STATUS_MAX_WAIT since it holds a server thread"""
+    wait = min(request.args.get('wait', 0, type=float), AUDIO_STATUS_MAX_WAIT)
+    status = get_audio_status(job_id, wait=wait)
+    if status is None:
+        return jsonify({'error': 'Unknown audio job'}), 404
+
+    filename = status.pop('filename', None)
+    if filename:
+        status['audio_url'] = f'/audio/{filename}'
+    return jsonify(status)
 
 
 @app.route('/audio/<filename>')
 def serve_audio(filename):
-    """Serve audio files"""
-    return send_from_directory(tempfile.gettempdir(), filename)
+    """Serve audio files from the TTS audio store only"""
+    if not is_audio_filename(filename):
+        return jsonify({'error': 'Audio not found'}), 404
+    return send_from_directory(TTS_SPOOL_DIR, filename, mimetype='audio/mpeg')
 
 
 if __name__ == '__main__':
+    start_catalog_listener()
     app.run(debug=True, port=5000)